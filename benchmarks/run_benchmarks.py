@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+End-to-end extraction benchmarks
+Drives the extraction pipeline against the local ARM stand-in
+(tests/arm_standin.py) at several cost-row counts and records, per stage,
+the wall time, rows/s, peak RSS and peak Python allocations. Results are
+compared against the committed baselines (benchmarks/baselines.json) and the
+run fails when a stage got slower or hungrier than the regression threshold.
+
+Stages:
+    fetch     get_cost_management_data() - HTTP, paging and JSON parsing
+    estimate  calculate_carbon_estimates()
+    export    export_data() - JSON and CSV writers
+    parquet   ParquetExport of the estimates to the date/subscription partitioned dataset
+    pipeline  run_extraction() end to end
+    stream    run_extraction() end to end in streaming mode (CSV/NDJSON written page by page)
+    grid      estimation with an hourly grid intensity series (a year x 60 regions, loaded from CSV)
+    upload    upload of the exported files (only with --storage-account)
+
+Usage:
+    python benchmarks/run_benchmarks.py                       # 1k, 100k, 1M rows vs baselines
+    python benchmarks/run_benchmarks.py --sizes 1000,100000 --stages estimate,export
+    python benchmarks/run_benchmarks.py --update-baselines    # record new baselines
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import math
+import os
+import platform
+import resource
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARK_DIR, '..', 'src'))
+sys.path.insert(0, os.path.join(BENCHMARK_DIR, '..', 'tests'))
+
+from arm_standin import DEFAULT_SUBSCRIPTION, ArmStandIn
+from azure_carbon_extractor import AzureCarbonExtractor
+import estimation  # noqa: F401 - loads NumPy up front so the estimate stage times the kernel, not the import
+from http_session import ArmSession
+
+BASELINE_FILE = os.path.join(BENCHMARK_DIR, "baselines.json")
+DEFAULT_SIZES = [1_000, 100_000, 1_000_000]
+STAGES = ["fetch", "estimate", "export", "parquet", "pipeline", "stream", "grid", "upload"]
+GRID_REGIONS = 60
+# Metrics checked against the baseline (rows/s follows from seconds), with the absolute
+# change below which a difference is treated as noise
+REGRESSION_METRICS = {"seconds": 0.05, "peakRssMb": 5.0, "allocPeakMb": 1.0}
+# tracemalloc slows Python code down several-fold, so larger sizes are timed only
+DEFAULT_ALLOC_MAX_ROWS = 100_000
+
+
+def _rss_bytes():
+    """Current resident set size (Linux), falling back to the process peak elsewhere"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class RssSampler:
+    """Samples RSS on a background thread; `peak` is the highest value seen while active"""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, _rss_bytes())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = _rss_bytes()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _rss_bytes())
+
+
+def measure(stage, rows, func, trace_allocations=True):
+    """Run func once for time and RSS, and once more under tracemalloc; returns (result, metrics)"""
+    gc.collect()
+    with RssSampler() as rss, contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        result = func()
+        seconds = time.perf_counter() - started
+
+    alloc_peak = None
+    if trace_allocations:
+        gc.collect()
+        tracemalloc.start()
+        with contextlib.redirect_stdout(io.StringIO()):
+            func()
+        alloc_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    metrics = {
+        "rows": rows,
+        "seconds": round(seconds, 4),
+        "rowsPerSecond": round(rows / seconds) if seconds > 0 else None,
+        "peakRssMb": round(rss.peak / 2 ** 20, 1),
+        "allocPeakMb": round(alloc_peak / 2 ** 20, 1) if alloc_peak is not None else None
+    }
+    return result, metrics
+
+
+def _write_grid_csv(path, end, regions=GRID_REGIONS):
+    """A year of hourly intensity readings up to `end` for the stand-in's regions plus filler regions"""
+    import numpy as np
+    names = ["eastus", "westus", "northeurope", "westeurope", "southeastasia"]
+    names += [f"region{i}" for i in range(regions - len(names))]
+    hours = np.datetime64(end.strftime("%Y-%m-%dT00:00:00")) - np.arange(365 * 24)[::-1].astype("timedelta64[h]")
+    stamps = [f"{stamp}Z" for stamp in hours.astype(str)]
+    rng = np.random.default_rng(0)
+    with open(path, "w") as f:
+        f.write("region,timestamp,carbonIntensity\n")
+        for name in names:
+            intensity = rng.uniform(50, 700, len(stamps)).round(1).tolist()
+            f.writelines(f"{name},{stamp},{value}\n" for stamp, value in zip(stamps, intensity))
+
+
+def _extractor(standin, workdir):
+    extractor = AzureCarbonExtractor(subscription_id=DEFAULT_SUBSCRIPTION, http=ArmSession(max_retries=3))
+    extractor.configure(base_url=standin.url,
+                        output_file=os.path.join(workdir, "azure_carbon_data.json"),
+                        csv_file=os.path.join(workdir, "azure_carbon_data.csv"))
+    return extractor
+
+
+def bench_size(target_rows, stages, trace_allocations=True, storage_account=None, container="carbon-benchmarks"):
+    """Benchmark every requested stage at roughly `target_rows` cost rows; returns {stage: metrics}"""
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        probe = AzureCarbonExtractor(subscription_id=DEFAULT_SUBSCRIPTION, http=ArmSession())
+        start, end = probe._cost_period()
+        days = (end.date() - start.date()).days + 1
+        rows_per_day = max(1, math.ceil(target_rows / days))
+        rows = rows_per_day * days
+
+        with ArmStandIn(rows_per_day=rows_per_day, page_size=5000, resources=200) as standin:
+            extractor = _extractor(standin, workdir)
+
+            cost_data, results["fetch"] = measure("fetch", rows, extractor.get_cost_management_data,
+                                                  trace_allocations)
+            with contextlib.redirect_stdout(io.StringIO()):
+                resource_data = extractor.get_resource_data()
+
+            estimates, results["estimate"] = measure(
+                "estimate", rows, lambda: extractor.calculate_carbon_estimates(cost_data, resource_data),
+                trace_allocations)
+
+            if "export" in stages:
+                _, results["export"] = measure(
+                    "export", rows, lambda: extractor.export_data(cost_data, resource_data, None, estimates),
+                    trace_allocations)
+
+            if "parquet" in stages:
+                from columnar_export import ParquetExport
+
+                def export_parquet():
+                    with ParquetExport(os.path.join(workdir, "azure_carbon_parquet"), DEFAULT_SUBSCRIPTION) as export:
+                        export.write(estimates)
+
+                _, results["parquet"] = measure("parquet", rows, export_parquet, trace_allocations)
+
+            if "grid" in stages:
+                from factor_registry import FactorRegistry
+                from grid_intensity import GridIntensity
+                grid_file = os.path.join(workdir, "grid_intensity.csv")
+                _write_grid_csv(grid_file, end)
+
+                def estimate_with_grid():
+                    registry = FactorRegistry.load()
+                    registry.grid_intensity = GridIntensity.load(grid_file, registry)
+                    return estimation.estimate_records(cost_data, registry)
+
+                _, results["grid"] = measure("grid", rows, estimate_with_grid, trace_allocations)
+
+            # Free the stage inputs before the end-to-end run so its RSS isn't inflated by them
+            del cost_data, estimates
+            if "pipeline" in stages:
+                _, results["pipeline"] = measure("pipeline", rows, extractor.run_extraction, trace_allocations)
+            if "stream" in stages:
+                streaming = _extractor(standin, workdir)
+                streaming.streaming = True
+                _, results["stream"] = measure("stream", rows, streaming.run_extraction, trace_allocations)
+
+            if "upload" in stages and storage_account:
+                from upload_to_storage import upload_to_azure_storage
+
+                def upload():
+                    for path in (extractor.output_file, extractor.csv_file):
+                        if not upload_to_azure_storage(path, storage_account, container):
+                            raise RuntimeError(f"Upload of {path} failed")
+
+                _, results["upload"] = measure("upload", rows, upload, trace_allocations=False)
+
+    return {stage: metrics for stage, metrics in results.items() if stage in stages}
+
+
+def compare(results, baselines, threshold):
+    """Regressions as (key, metric, baseline, current) for every metric above baseline x (1 + threshold)"""
+    regressions = []
+    for key, metrics in results.items():
+        baseline = baselines.get(key)
+        if not baseline:
+            continue
+        for metric, noise in REGRESSION_METRICS.items():
+            current = metrics.get(metric)
+            expected = baseline.get(metric)
+            if current is None or not expected:
+                continue
+            if current > expected * (1 + threshold) and current - expected > noise:
+                regressions.append((key, metric, expected, current))
+    return regressions
+
+
+def load_baselines(path=BASELINE_FILE):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f).get("results", {})
+
+
+def save_baselines(results, path=BASELINE_FILE):
+    baselines = load_baselines(path)
+    baselines.update(results)
+    with open(path, "w") as f:
+        json.dump({
+            "recordedAt": datetime.now().isoformat(timespec="seconds"),
+            "machine": f"{platform.system()} {platform.machine()}, Python {platform.python_version()}",
+            "results": dict(sorted(baselines.items()))
+        }, f, indent=2)
+        f.write("\n")
+
+
+def print_results(results, baselines):
+    print(f"{'benchmark':<22}{'seconds':>10}{'rows/s':>12}{'RSS MB':>9}{'alloc MB':>10}{'vs base':>9}")
+    for key, m in results.items():
+        baseline = baselines.get(key, {})
+        change = f"{(m['seconds'] / baseline['seconds'] - 1) * 100:+.0f}%" if baseline.get("seconds") else "new"
+        alloc = m["allocPeakMb"] if m["allocPeakMb"] is not None else "-"
+        print(f"{key:<22}{m['seconds']:>10.3f}{m['rowsPerSecond'] or 0:>12,}{m['peakRssMb']:>9}{alloc:>10}{change:>9}")
+
+
+def run(sizes, stages, threshold=0.25, alloc_max_rows=DEFAULT_ALLOC_MAX_ROWS, update_baselines=False,
+        storage_account=None, baseline_file=BASELINE_FILE):
+    """Run the suite; returns (results, regressions)"""
+    results = {}
+    for size in sizes:
+        print(f"⏱️  Benchmarking {size:,} cost rows...")
+        trace_allocations = size <= alloc_max_rows
+        for stage, metrics in bench_size(size, stages, trace_allocations, storage_account).items():
+            results[f"{stage}@{size}"] = metrics
+
+    baselines = load_baselines(baseline_file)
+    print_results(results, baselines)
+
+    if update_baselines:
+        save_baselines(results, baseline_file)
+        print(f"📌 Baselines updated in {baseline_file}")
+        return results, []
+
+    regressions = compare(results, baselines, threshold)
+    for key, metric, expected, current in regressions:
+        print(f"❌ {key}: {metric} {current} exceeds baseline {expected} by more than {threshold:.0%}")
+    if not regressions:
+        print(f"✅ No regressions beyond {threshold:.0%} of baseline")
+    return results, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the carbon extraction pipeline")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES),
+                        help="Comma-separated cost row counts (default: 1000,100000,1000000)")
+    parser.add_argument("--stages", default="fetch,estimate,export,parquet,pipeline,stream,grid",
+                        help=f"Comma-separated stages out of {','.join(STAGES)}")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Allowed slowdown/growth over baseline before failing (default: 0.25)")
+    parser.add_argument("--alloc-max-rows", type=int, default=DEFAULT_ALLOC_MAX_ROWS,
+                        help="Largest size that also gets a (slow) tracemalloc pass; 0 disables it "
+                             f"(default: {DEFAULT_ALLOC_MAX_ROWS})")
+    parser.add_argument("--update-baselines", action="store_true",
+                        help="Store this run's results as the new baselines")
+    parser.add_argument("--storage-account", help="Also benchmark the upload stage against this storage account")
+    parser.add_argument("--output", help="Write this run's results to a JSON file")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    if args.storage_account and "upload" not in stages:
+        stages.append("upload")
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    results, regressions = run(sizes, stages, args.threshold, args.alloc_max_rows,
+                               args.update_baselines, args.storage_account)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
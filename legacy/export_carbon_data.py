@@ -1,8 +1,12 @@
 import os
+import sys
 import requests
 import json
 from azure.identity import DefaultAzureCredential
 
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from lro_poller import LroPoller
+
 # Constants based on Azure Carbon Optimization API documentation
 # https://learn.microsoft.com/en-us/azure/carbon-optimization/api-export-data
 SUBSCRIPTION_ID = None  # Will be auto-detected or can be set manually
@@ -116,11 +120,16 @@ def extract_carbon_emissions_data(subscription_id=None):
                 return True
             elif response.status_code == 202:
                 print(f"✅ Export request accepted (async operation)")
-                # For async operations, you might need to poll for results
-                location = response.headers.get('Location')
-                if location:
-                    print(f"   Poll URL: {location}")
-                return True
+                # Poll the Location / Azure-AsyncOperation URL until the result is ready
+                poller = LroPoller(requests, headers=headers)
+                operation = poller.add(endpoint['name'], response, method=endpoint['method'], url=endpoint['url'])
+                poller.run()
+                if operation.succeeded:
+                    with open(OUTPUT_FILE, "w") as f:
+                        json.dump(operation.result, f, indent=2)
+                    print(f"✅ Carbon data exported to {OUTPUT_FILE}")
+                    return True
+                print(f"   ❌ Async operation {operation.status}: {operation.error}")
             else:
                 try:
                     error_detail = response.json()
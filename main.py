@@ -26,16 +26,67 @@ from datetime import datetime
 # Add src directory to path for imports
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
-def extract_carbon_data():
+def extract_carbon_data(args):
     """Extract carbon emissions data using the Azure Carbon API"""
     try:
+        from http_session import configure_shared_session
+        from rate_limiter import AdaptiveRateLimiter
         from azure_carbon_extractor import extract_carbon_emissions
         
+        subscription_ids = [s.strip() for s in (args.subscriptions or "").split(",") if s.strip()]
+        fan_out = bool(subscription_ids or args.management_group)
+        
+        # Every concurrent call needs its own pooled connection
+        in_flight = args.workers if fan_out else args.concurrency
+        cache = None
+        if args.cache or args.replay:
+            from response_cache import ResponseCache
+            cache = ResponseCache(args.cache_dir, max_bytes=args.cache_max_mb * 1024 * 1024, replay=args.replay)
+        rate_limiter = None if args.no_rate_limit else AdaptiveRateLimiter(max_rate=args.max_rate)
+        configure_shared_session(pool_maxsize=max(args.pool_size, in_flight), max_retries=args.max_retries,
+                                 cache=cache, rate_limiter=rate_limiter)
+        
         print("🌱 EXTRACTING CARBON EMISSIONS DATA FROM AZURE")
         print("=" * 60)
         
+        # Tuning applied to every AzureCarbonExtractor
+        settings = {
+            "resource_shard_by": args.resource_shards,
+            "cost_days": args.days,
+            "cost_start_date": args.start_date,
+            "cost_chunk_days": args.chunk_days,
+            "incremental": args.incremental,
+            "restatement_days": args.restatement_days,
+            "factors_file": args.factors,
+            "grid_intensity_file": args.grid_intensity,
+            "anomaly_threshold": args.anomaly_threshold,
+            "anomaly_settle_days": args.anomaly_settle_days,
+            "parquet": args.parquet,
+            "streaming": args.stream,
+            "estimation_processes": args.processes
+        }
+        if args.arm_url:
+            settings["base_url"] = args.arm_url.rstrip("/")
+        
         # Extract data
-        success, output_files = extract_carbon_emissions()
+        if fan_out:
+            from multi_subscription import extract_multi_subscription
+            success, output_files = extract_multi_subscription(
+                subscription_ids=subscription_ids,
+                management_group=args.management_group,
+                max_workers=args.workers,
+                tenant_budget=args.tenant_budget,
+                **settings
+            )
+        else:
+            success, output_files = extract_carbon_emissions(concurrency=args.concurrency, **settings)
+        
+        if cache is not None:
+            print(f"📦 Response cache: {cache.stats['hits']} hits, {cache.stats['misses']} misses")
+        if rate_limiter is not None:
+            for family, state in rate_limiter.snapshot().items():
+                print(f"🚦 {family}: {state['requests']} requests at {state['ratePerSecond']}/s, "
+                      f"{state['throttled']} throttled, waited {state['waitedSeconds']:.1f}s")
         
         if success:
             print(f"\n✅ Carbon data extraction successful!")
@@ -116,7 +167,52 @@ def show_status():
     else:
         print("📁 Output directory doesn't exist")
 
+def default_cube_file():
+    """Cube saved by --extract, in the extractors' output directory"""
+    from azure_carbon_extractor import CUBE_FILENAME, OUTPUT_DIR
+    return os.path.join(OUTPUT_DIR, CUBE_FILENAME)
+
+def show_rollup(by, where, cube_file=None):
+    """Roll up or drill down the persisted cost and carbon cube"""
+    try:
+        from rollup_cube import RollupCube, print_rollup
+        
+        cube_file = cube_file or default_cube_file()
+        if not os.path.exists(cube_file):
+            print(f"📁 No rollup cube found at {cube_file}; run --extract first")
+            return False
+        print(f"📊 ROLLUP of {cube_file}")
+        print("=" * 60)
+        print_rollup(RollupCube.load(cube_file), by, where)
+        return True
+    except ValueError as e:
+        print(f"❌ Rollup error: {e}")
+        return False
+
+def show_migrations(args):
+    """Rank region migrations of the persisted cube's workloads by the carbon they would save"""
+    try:
+        from factor_registry import get_registry
+        from migration_simulator import MigrationSimulator, print_scenarios
+        from rollup_cube import RollupCube
+        
+        cube_file = args.cube or default_cube_file()
+        if not os.path.exists(cube_file):
+            print(f"📁 No rollup cube found at {cube_file}; run --extract first")
+            return False
+        simulator = MigrationSimulator(RollupCube.load(cube_file), get_registry(args.factors, args.grid_intensity),
+                                       args.what_if_by, **dict(args.where))
+        print(f"🔀 REGION MIGRATION WHAT-IF ({len(simulator.workloads)} workloads x {len(simulator.targets)} regions)")
+        print("=" * 60)
+        print_scenarios(simulator.ranked(top=args.top), args.what_if_by)
+        return True
+    except ValueError as e:
+        print(f"❌ What-if error: {e}")
+        return False
+
 def main():
+    from cube_filters import parse_filter
+    
     parser = argparse.ArgumentParser(
         description="Azure Carbon Emissions Data Extraction and Upload Tool",
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -124,6 +220,23 @@ def main():
 Examples:
   python main.py --status
   python main.py --extract
+  python main.py --extract --concurrency 8
+  python main.py --extract --management-group my-mg --workers 16
+  python main.py --extract --management-group my-mg --max-rate 5
+  python main.py --extract --start-date 2024-06-01 --chunk-days 7
+  python main.py --extract --incremental
+  python main.py --extract --stream
+  python main.py --extract --management-group my-mg --processes 8
+  python main.py --extract --factors my_factors.json
+  python main.py --extract --grid-intensity grid_intensity/
+  python main.py --extract --incremental --anomaly-threshold 5
+  python main.py --extract --parquet
+  python main.py --rollup resourceGroup --where location=eastus
+  python main.py --what-if --what-if-by serviceName --where location=southeastasia
+  python main.py --rollup serviceName --cube backup/azure_carbon_cube.json
+  python main.py --extract --cache
+  python main.py --extract --replay
+  python main.py --extract --arm-url http://127.0.0.1:8080
   python main.py --extract --upload --storage-account mystorageaccount
   python main.py --upload --storage-account mystorageaccount --container mycontainer
         """
@@ -139,6 +252,72 @@ Examples:
                        help="Container name (default: carbon-emissions)")
     parser.add_argument("--status", action="store_true",
                        help="Show status of current files")
+    parser.add_argument("--pool-size", type=int, default=20,
+                       help="Max pooled HTTP connections to Azure (default: 20)")
+    parser.add_argument("--max-retries", type=int, default=5,
+                       help="Retries for throttled or failed Azure API calls (default: 5)")
+    parser.add_argument("--arm-url",
+                       help="Resource Manager base URL, e.g. a local stand-in (default: $AZURE_ARM_URL or management.azure.com)")
+    parser.add_argument("--max-rate", type=float, default=50.0,
+                       help="Upper bound on requests/second per Azure API family (default: 50)")
+    parser.add_argument("--no-rate-limit", action="store_true",
+                       help="Disable adaptive client-side rate limiting of Azure API calls")
+    parser.add_argument("--concurrency", type=int, default=1,
+                       help="Max concurrent Azure API calls during extraction (default: 1, sequential)")
+    parser.add_argument("--resource-shards", choices=["type", "subscription"],
+                       help="Split the Resource Graph inventory query into parallel shards")
+    parser.add_argument("--days", type=int, default=30,
+                       help="Days of cost data to extract (default: 30)")
+    parser.add_argument("--start-date", type=str,
+                       help="Extract cost data from this date (YYYY-MM-DD), e.g. for backfills")
+    parser.add_argument("--chunk-days", type=int,
+                       help="Query cost data in parallel chunks of this many days (auto-tuned)")
+    parser.add_argument("--incremental", action="store_true",
+                       help="Only extract days since the last run and merge them into existing output")
+    parser.add_argument("--restatement-days", type=int, default=3,
+                       help="Closed days re-queried on incremental runs for late-arriving cost (default: 3)")
+    parser.add_argument("--stream", action="store_true",
+                       help="Stream cost pages through estimation into CSV/NDJSON with flat memory")
+    parser.add_argument("--parquet", action="store_true",
+                       help="Also write estimates to a Parquet dataset partitioned by usage date and subscription")
+    parser.add_argument("--processes", type=int,
+                       help="Estimate and aggregate cost pages on this many worker processes")
+    parser.add_argument("--factors", type=str,
+                       help="Carbon factors registry file (default: $CARBON_FACTORS_FILE or src/carbon_factors.json)")
+    parser.add_argument("--grid-intensity", type=str, metavar="PATH",
+                       help="Hourly grid carbon intensity per region (directory of <region>.csv, CSV or .npz)")
+    parser.add_argument("--anomaly-threshold", type=float, default=3.5,
+                       help="Robust z-score above which a day's service emissions are flagged (default: 3.5)")
+    parser.add_argument("--anomaly-settle-days", type=int, default=3,
+                       help="Only check days at least this old for anomalies, once restatements settle (default: 3)")
+    parser.add_argument("--rollup", type=str, metavar="DIMENSIONS",
+                       help="Roll up the saved cube by comma-separated dimensions (e.g. serviceName,location)")
+    parser.add_argument("--where", action="append", default=[], type=parse_filter, metavar="DIMENSION=VALUE",
+                       help="Drill down: only roll up cube cells with this dimension value (repeatable)")
+    parser.add_argument("--cube", type=str, metavar="PATH",
+                       help="Cube file for --rollup and --what-if (default: the one saved by --extract)")
+    parser.add_argument("--what-if", action="store_true",
+                       help="Rank moves of the saved cube's workloads to other regions by carbon saved")
+    parser.add_argument("--what-if-by", type=str, metavar="DIMENSION",
+                       help="Split what-if workloads by a cube dimension (e.g. serviceName, resourceGroup)")
+    parser.add_argument("--top", type=int, default=20,
+                       help="Number of what-if scenarios to show (default: 20)")
+    parser.add_argument("--cache", action="store_true",
+                       help="Cache Azure API responses on disk and reuse them while fresh")
+    parser.add_argument("--replay", action="store_true",
+                       help="Run entirely from cached responses, without calling Azure")
+    parser.add_argument("--cache-dir", type=str, default=".arm_cache",
+                       help="Response cache directory (default: .arm_cache)")
+    parser.add_argument("--cache-max-mb", type=int, default=512,
+                       help="Evict least recently used responses above this size (default: 512)")
+    parser.add_argument("--subscriptions", type=str,
+                       help="Comma-separated subscription IDs to extract in parallel")
+    parser.add_argument("--management-group", type=str,
+                       help="Extract every subscription under this management group")
+    parser.add_argument("--workers", type=int, default=8,
+                       help="Subscriptions extracted in parallel (default: 8)")
+    parser.add_argument("--tenant-budget", type=int, default=4,
+                       help="Max concurrent Azure requests per tenant (default: 4)")
     
     args = parser.parse_args()
     
@@ -153,6 +332,16 @@ Examples:
         show_status()
         return
     
+    if args.rollup:
+        if not show_rollup(args.rollup, args.where, args.cube):
+            sys.exit(1)
+        return
+    
+    if args.what_if:
+        if not show_migrations(args):
+            sys.exit(1)
+        return
+    
     # Validate arguments
     if args.upload and not args.storage_account:
         print("❌ --storage-account is required when using --upload")
@@ -160,7 +349,7 @@ Examples:
         sys.exit(1)
     
     if not args.extract and not args.upload and not args.status:
-        print("❌ Please specify --extract, --upload, or --status")
+        print("❌ Please specify --extract, --upload, --status, --rollup, or --what-if")
         parser.print_help()
         sys.exit(1)
     
@@ -168,7 +357,7 @@ Examples:
     
     # Extract data if requested
     if args.extract:
-        output_files = extract_carbon_data()
+        output_files = extract_carbon_data(args)
         if not output_files:
             success = False
     
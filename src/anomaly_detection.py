@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Anomaly detection over daily emissions.
+
+Keeps running statistics per (subscription, service) daily carbon series and
+updates them one day at a time, so each run only touches the days it has not
+seen yet instead of rescanning history:
+
+- an exponentially weighted mean and variance (EWMA/EWMV) of the daily total,
+  for the expected level and its typical spread;
+- the last `window` daily totals, from which the median and the median
+  absolute deviation (MAD) are taken. Work per day is bounded by the window,
+  however long the series is.
+
+A day is flagged when its robust z-score, (value - median) / (1.4826 x MAD),
+reaches the threshold once the series has `warmup` days of history. The scale
+never drops below `min_relative_change` of the median, so perfectly flat
+series don't flag rounding noise.
+
+Days on which a known series has no cost rows count as zero, so a service
+that stops emitting shows up as a drop instead of a gap the window skips.
+
+State is persisted (atomically, next to the outputs) and survives between
+runs. Days up to the last one already consumed are skipped, so restated days
+of incremental runs are not fed twice. Only settled days are fed: the caller
+passes the last date whose cost no longer gets restated.
+"""
+
+import json
+import os
+import statistics
+import threading
+from datetime import date as Date, timedelta
+
+STATE_VERSION = 1
+MAD_SCALE = 1.4826
+
+
+class AnomalyDetector:
+    """Incremental EWMA and rolling-MAD anomaly detection per (subscription, service) daily series"""
+
+    def __init__(self, path=None, threshold=3.5, window=28, alpha=0.2, warmup=7, min_relative_change=0.05):
+        self.path = path
+        self.threshold = threshold
+        self.window = window
+        self.alpha = alpha
+        self.warmup = warmup
+        self.min_relative_change = min_relative_change
+        self.lock = threading.Lock()
+        # subscription -> service -> {"lastDate", "count", "ewma", "ewmv", "recent"}
+        self.series = {}
+        if path:
+            self.load()
+
+    def load(self):
+        """Load the state file; a missing or unreadable file starts every series afresh"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Ignoring unreadable anomaly state {self.path}: {e}")
+            return
+        if data.get("version") != STATE_VERSION:
+            print(f"⚠️ Ignoring anomaly state {self.path} with version {data.get('version')}")
+            return
+        self.series = data.get("series", {})
+
+    def save(self):
+        """Write the state atomically so an interrupted run never leaves a corrupt file"""
+        with self.lock:
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump({"version": STATE_VERSION, "window": self.window, "alpha": self.alpha,
+                           "series": self.series}, f, separators=(',', ':'))
+            os.replace(temp_path, self.path)
+
+    def update(self, subscription_id, service, date, value):
+        """Fold one day's total into its series; returns the anomaly dict if the day is flagged, else None"""
+        state = self.series.setdefault(subscription_id or "", {}).setdefault(
+            service, {"lastDate": None, "count": 0, "ewma": 0.0, "ewmv": 0.0, "recent": []})
+        if state["lastDate"] and date <= state["lastDate"]:
+            return None
+
+        anomaly = None
+        recent = state["recent"]
+        if state["count"] >= self.warmup:
+            median = statistics.median(recent)
+            mad = statistics.median(abs(v - median) for v in recent)
+            scale = max(MAD_SCALE * mad, self.min_relative_change * abs(median), 1e-9)
+            score = (value - median) / scale
+            if abs(score) >= self.threshold:
+                anomaly = {
+                    "date": date,
+                    "subscriptionId": subscription_id,
+                    "serviceName": service,
+                    "estimatedCarbonKg": round(value, 4),
+                    "expectedCarbonKg": round(median, 4),
+                    "ewmaCarbonKg": round(state["ewma"], 4),
+                    "ewmStdCarbonKg": round(state["ewmv"] ** 0.5, 4),
+                    "score": round(score, 2),
+                    "direction": "spike" if score > 0 else "drop"
+                }
+
+        if state["count"] == 0:
+            state["ewma"] = value
+        else:
+            diff = value - state["ewma"]
+            increment = self.alpha * diff
+            state["ewma"] += increment
+            state["ewmv"] = (1 - self.alpha) * (state["ewmv"] + diff * increment)
+        recent.append(value)
+        del recent[:-self.window]
+        state["count"] += 1
+        state["lastDate"] = date
+        return anomaly
+
+    def update_cube(self, cube, closed_through=None):
+        """Feed the cube's new daily (subscription, service) totals in date order; returns the flagged days
+
+        Days after `closed_through` (YYYY-MM-DD) may still be restated and
+        are left for a later run. Every series already in the state, or seen
+        in the cube, gets a value for each day from the one after its last
+        consumed day through `closed_through`; days without cost rows are
+        zero. Days before the cube's first date weren't queried and are not
+        filled.
+        """
+        observed = {}
+        for (subscription_id, service, date), totals in cube.rollup("subscriptionId", "serviceName", "date").items():
+            if date:
+                observed.setdefault((subscription_id or "", service), {})[date] = totals["estimatedCarbonKg"]
+        if not observed:
+            return []
+        first = min(min(values) for values in observed.values())
+        last = closed_through or max(max(values) for values in observed.values())
+
+        anomalies = []
+        with self.lock:
+            known = {(subscription_id, service) for subscription_id, services in self.series.items()
+                     for service in services}
+            for subscription_id, service in sorted(known | set(observed)):
+                values = observed.get((subscription_id, service), {})
+                last_date = self.series.get(subscription_id, {}).get(service, {}).get("lastDate")
+                if last_date:
+                    start = (Date.fromisoformat(last_date) + timedelta(days=1)).isoformat()
+                elif values:
+                    start = min(values)
+                else:
+                    continue
+                day = Date.fromisoformat(max(start, first))
+                while day.isoformat() <= last:
+                    date = day.isoformat()
+                    anomaly = self.update(subscription_id, service, date, values.get(date, 0.0))
+                    if anomaly:
+                        anomalies.append(anomaly)
+                    day += timedelta(days=1)
+        anomalies.sort(key=lambda a: abs(a["score"]), reverse=True)
+        return anomalies
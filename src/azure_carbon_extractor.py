@@ -5,36 +5,111 @@ Uses live Azure APIs to extract carbon footprint and sustainability data.
 """
 
 import os
+import re
 import sys
 import json
-import requests
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from datetime import datetime, timedelta
-from azure.identity import DefaultAzureCredential
-import subprocess
+
+from credentials import MANAGEMENT_SCOPE, get_credential_provider, resolve_subscription_id
+from extraction_state import ExtractionState
+from factor_registry import get_registry
+from http_session import arm_base_url, get_shared_session, is_local_endpoint, run_metrics
+
+# Where extract_carbon_emissions and extract_multi_subscription write their output
+OUTPUT_DIR = os.path.join("..", "output")
+CUBE_FILENAME = "azure_carbon_cube.json"
+
+# nextLink of a raw Cost Management response body, read without decoding the rows
+_NEXT_LINK = re.compile(rb'"nextLink"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+# Resource types (as Resource Graph reports them) that carry most of the carbon footprint
+CARBON_RESOURCE_GRAPH_TYPES = [
+    'microsoft.compute/virtualmachines',
+    'microsoft.storage/storageaccounts',
+    'microsoft.containerservice/managedclusters',
+    'microsoft.sql/servers',
+    'microsoft.dbforpostgresql/servers',
+    'microsoft.web/serverfarms',
+    'microsoft.network/loadbalancers'
+]
 
 class AzureCarbonExtractor:
-    def __init__(self, subscription_id=None):
+    def __init__(self, subscription_id=None, http=None):
         self.subscription_id = subscription_id or self._get_subscription_id()
+        self.http = http or get_shared_session()
         self.credential = None
         self.token = None
+        self.base_url = arm_base_url()
+        # Resource Graph paging and sharding
+        self.resource_page_size = 1000
+        self.resource_shard_by = None
+        self.resource_workers = 8
+        self.resource_subscription_batch = 100
+        # Cost Management query window; cost_chunk_days splits it into parallel chunks
+        self.cost_days = 30
+        self.cost_start_date = None
+        self.cost_chunk_days = None
+        self.cost_chunk_workers = 4
+        self.cost_chunk_autotune = True
+        self.cost_chunk_target_seconds = 10.0
+        self.cost_chunk_target_rows = 5000
+        self.cost_chunk_max_days = 31
+        # Incremental runs query from the persisted watermark (minus a restatement window)
+        self.incremental = False
+        self.restatement_days = 3
+        self.state_file = None
+        self.state = None
+        # Carbon factors file; None uses $CARBON_FACTORS_FILE or the bundled registry
+        self.factors_file = None
+        # Hourly grid intensity series (directory, CSV or .npz) replacing the static regional factors
+        self.grid_intensity_file = None
         self.output_file = "azure_carbon_data.json"
         self.csv_file = "azure_carbon_data.csv"
+        # Per-resource estimates CSV; None writes it next to csv_file
+        self.resource_csv_file = None
+        # Streaming runs write estimates page by page to CSV and NDJSON (None: next to output_file)
+        self.streaming = False
+        self.ndjson_file = None
+        # Worker processes that decode, estimate and pre-aggregate cost pages (None: in-process)
+        self.estimation_processes = None
+        # Rollup cube persisted with the outputs; None writes it next to output_file
+        self.cube_file = None
+        self.cube = None
+        # Daily emissions anomaly detection state; None stores it next to output_file
+        self.anomaly_state_file = None
+        self.anomaly_threshold = 3.5
+        # Cost Management restates recent days; only days at least this old are fed to the detector
+        self.anomaly_settle_days = 3
+        self.anomaly_detector = None
+        self.last_anomalies = []
+        # Partitioned Parquet dataset of the estimates (needs pyarrow); None writes it next to output_file
+        self.parquet = False
+        self.parquet_dir = None
         
+    def configure(self, **settings):
+        """Override tuning attributes (e.g. cost_chunk_days=7, resource_shard_by="type")"""
+        for name, value in settings.items():
+            if not hasattr(self, name):
+                raise TypeError(f"Unknown extractor setting: {name}")
+            setattr(self, name, value)
+        return self
+    
     def _get_subscription_id(self):
-        """Auto-detect subscription ID from Azure CLI"""
-        try:
-            result = subprocess.run(['az', 'account', 'show', '--query', 'id', '-o', 'tsv'], 
-                                  capture_output=True, text=True, check=True)
-            return result.stdout.strip()
-        except Exception as e:
-            print(f"⚠️ Could not auto-detect subscription ID: {e}")
-            return None
+        """Auto-detect subscription ID from the environment or the Azure CLI profile"""
+        subscription_id = resolve_subscription_id()
+        if not subscription_id:
+            print("⚠️ Could not auto-detect subscription ID: set AZURE_SUBSCRIPTION_ID or run 'az login'")
+        return subscription_id
             
     def authenticate(self):
         """Authenticate with Azure and get access token"""
         try:
-            self.credential = DefaultAzureCredential()
-            self.token = self.credential.get_token("https://management.azure.com/.default").token
+            self.credential = get_credential_provider()
+            self.token = self.credential.token(MANAGEMENT_SCOPE)
             print("✅ Azure authentication successful")
             return True
         except Exception as e:
@@ -43,23 +118,21 @@ class AzureCarbonExtractor:
             
     def get_headers(self):
         """Get HTTP headers with authentication"""
+        if self.credential is not None:
+            # The shared provider hands back its cached token, refreshed before expiry
+            self.token = self.credential.token(MANAGEMENT_SCOPE)
         return {
             "Authorization": f"Bearer {self.token}",
             "Content-Type": "application/json",
             "Accept": "application/json"
         }
     
-    def get_cost_management_data(self):
-        """Get data from Azure Cost Management API (includes some carbon metrics)"""
-        print("🔍 Querying Azure Cost Management API...")
-        
-        url = f"https://management.azure.com/subscriptions/{self.subscription_id}/providers/Microsoft.CostManagement/query?api-version=2023-11-01"
-        
-        # Query for the last 30 days
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=30)
-        
-        body = {
+    def _cost_query_url(self):
+        return f"{self.base_url}/subscriptions/{self.subscription_id}/providers/Microsoft.CostManagement/query?api-version=2023-11-01"
+    
+    def _cost_query_body(self, start_date, end_date):
+        """Cost Management query body for daily cost grouped by service, location and resource group"""
+        return {
             "type": "ActualCost",
             "timeframe": "Custom",
             "timePeriod": {
@@ -94,61 +167,312 @@ class AzureCarbonExtractor:
                 ]
             }
         }
+    
+    def _load_state(self):
+        """Watermark state, by default stored next to the JSON output"""
+        if self.state is None:
+            path = self.state_file or os.path.join(os.path.dirname(self.output_file), ".extraction_state.json")
+            self.state = ExtractionState(path)
+        return self.state
+    
+    def _cost_period(self):
+        """Start and end dates of the Cost Management query window"""
+        end_date = datetime.now()
+        watermark = self._load_state().get_watermark(self.subscription_id) if self.incremental else None
+        if watermark:
+            # Re-query the last few closed days as well, since late cost keeps arriving
+            start_date = datetime(watermark.year, watermark.month, watermark.day) + timedelta(days=1 - self.restatement_days)
+        elif self.cost_start_date:
+            start_date = datetime.strptime(self.cost_start_date, "%Y-%m-%d")
+        else:
+            start_date = end_date - timedelta(days=self.cost_days)
+        return start_date, end_date
+    
+    def merge_incremental(self, cost_data, carbon_estimates):
+        """Fold this run's window into the previous output; a no-op unless incremental
+        
+        Everything from the start of the queried window onwards is replaced by
+        the new data, everything before it is kept from the previous output.
+        """
+        if not self.incremental or not os.path.exists(self.output_file):
+            return cost_data, carbon_estimates
         
         try:
-            response = requests.post(url, headers=self.get_headers(), json=body)
-            if response.status_code == 200:
-                data = response.json()
-                print(f"✅ Cost Management data retrieved: {len(data.get('properties', {}).get('rows', []))} rows")
-                return data
-            else:
-                print(f"❌ Cost Management API failed: {response.status_code} - {response.text[:200]}")
-                return None
+            with open(self.output_file, 'r') as f:
+                previous = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Could not read previous output, writing a fresh one: {e}")
+            return cost_data, carbon_estimates
+        
+        previous_estimates = previous.get('carbonEstimates') or []
+        previous_cost = previous.get('costManagementData')
+        if cost_data is None:
+            # Nothing new could be queried; keep the previous output intact
+            print("⚠️ No new cost data; keeping the previous output")
+            return previous_cost, previous_estimates
+        
+        since = self._cost_period()[0].strftime("%Y-%m-%d")
+        kept = [e for e in previous_estimates if e.get('date') and e['date'] < since]
+        merged_estimates = sorted(kept + carbon_estimates, key=lambda e: e.get('date', ''))
+        
+        if previous_cost and 'properties' in previous_cost:
+            names = [col['name'] for col in previous_cost['properties'].get('columns', [])]
+            if 'UsageDate' in names:
+                date_index = names.index('UsageDate')
+                since_number = int(since.replace('-', ''))
+                kept_rows = [row for row in previous_cost['properties'].get('rows', []) if row[date_index] < since_number]
+                cost_data = {"properties": {
+                    "columns": cost_data['properties'].get('columns', []),
+                    "rows": kept_rows + cost_data['properties'].get('rows', []),
+                    "nextLink": None
+                }}
+        
+        print(f"🔁 Incremental merge: kept {len(kept)} data points before {since}, added {len(carbon_estimates)}")
+        return cost_data, merged_estimates
+    
+    def advance_watermark(self, cost_data):
+        """Record yesterday as the last fully-closed usage date after a successful incremental run"""
+        if not self.incremental or cost_data is None:
+            return
+        state = self._load_state()
+        state.set_watermark(self.subscription_id, (datetime.now() - timedelta(days=1)).date())
+        state.save()
+    
+    def iter_cost_management_pages(self, body=None):
+        """Yield Cost Management result pages (`properties` dicts with columns and rows)
+        
+        Follows `properties.nextLink` until the result set is exhausted, so only
+        one page of rows is held in memory at a time. Raises RuntimeError if a
+        page cannot be retrieved, since a partial result set would silently
+        under-report cost.
+        """
+        if body is None:
+            body = self._cost_query_body(*self._cost_period())
+        
+        url = self._cost_query_url()
+        while url:
+            response = self.http.post(url, headers=self.get_headers(), json=body)
+            if response.status_code != 200:
+                raise RuntimeError(f"Cost Management API failed: {response.status_code} - {response.text[:200]}")
+            
+            properties = response.json().get('properties', {})
+            yield properties
+            
+            # nextLink already carries the api-version and $skiptoken; the body is re-sent as-is
+            url = properties.get('nextLink')
+    
+    def _query_cost_window(self, window):
+        """Fetch every row for one (start, end) window; returns (columns, rows, seconds)"""
+        started = time.perf_counter()
+        columns = []
+        rows = []
+        for page in self.iter_cost_management_pages(self._cost_query_body(*window)):
+            columns = page.get('columns', columns)
+            rows.extend(page.get('rows', []))
+        
+        # Keep rows within the window in date order so the merged result is too
+        names = [col['name'] for col in columns]
+        if 'UsageDate' in names:
+            date_index = names.index('UsageDate')
+            rows.sort(key=lambda row: row[date_index])
+        return columns, rows, time.perf_counter() - started
+    
+    def _tune_chunk_days(self, chunk_days, windows, results):
+        """Pick the next chunk size from the latency and row count observed per day"""
+        days = sum((end - start).days + 1 for start, end in windows)
+        seconds = sum(result[2] for result in results) / days
+        rows = sum(len(result[1]) for result in results) / days
+        
+        candidates = [self.cost_chunk_max_days]
+        if seconds > 0:
+            candidates.append(self.cost_chunk_target_seconds / seconds)
+        if rows > 0:
+            candidates.append(self.cost_chunk_target_rows / rows)
+        
+        # Move at most 2x per wave so one slow response doesn't collapse the chunk size
+        tuned = min(candidates)
+        tuned = max(chunk_days / 2, min(chunk_days * 2, tuned))
+        return max(1, min(self.cost_chunk_max_days, int(tuned)))
+    
+    def _get_chunked_cost_data(self, start_date, end_date):
+        """Query the period as date chunks in parallel waves and merge them in date order"""
+        chunk_days = max(1, self.cost_chunk_days)
+        cursor = start_date
+        columns = []
+        rows = []
+        chunk_count = 0
+        
+        with ThreadPoolExecutor(max_workers=self.cost_chunk_workers) as pool:
+            while cursor.date() <= end_date.date():
+                windows = []
+                while len(windows) < self.cost_chunk_workers and cursor.date() <= end_date.date():
+                    window_end = min(cursor + timedelta(days=chunk_days - 1), end_date)
+                    windows.append((cursor, window_end))
+                    cursor = window_end + timedelta(days=1)
+                
+                # map() returns results in submission (= date) order
+                results = list(pool.map(self._query_cost_window, windows))
+                for window_columns, window_rows, _ in results:
+                    columns = window_columns or columns
+                    rows.extend(window_rows)
+                chunk_count += len(windows)
+                
+                if self.cost_chunk_autotune:
+                    chunk_days = self._tune_chunk_days(chunk_days, windows, results)
+        
+        print(f"   {chunk_count} date chunks queried (final chunk size: {chunk_days} days)")
+        return {"properties": {"columns": columns, "rows": rows, "nextLink": None}}
+    
+    def iter_cost_management_payloads(self, body=None):
+        """Yield the raw response body of each Cost Management page, leaving the decoding to the caller"""
+        if body is None:
+            body = self._cost_query_body(*self._cost_period())
+        
+        url = self._cost_query_url()
+        while url:
+            response = self.http.post(url, headers=self.get_headers(), json=body)
+            if response.status_code != 200:
+                raise RuntimeError(f"Cost Management API failed: {response.status_code} - {response.text[:200]}")
+            
+            payload = response.content
+            yield payload
+            
+            match = _NEXT_LINK.search(payload)
+            url = json.loads(b'"' + match.group(1) + b'"') if match else None
+    
+    def _cost_windows(self):
+        """(start, end) date windows covering the query period, cost_chunk_days long if set"""
+        start_date, end_date = self._cost_period()
+        if not self.cost_chunk_days:
+            return [(start_date, end_date)]
+        windows = []
+        cursor = start_date
+        while cursor.date() <= end_date.date():
+            window_end = min(cursor + timedelta(days=self.cost_chunk_days - 1), end_date)
+            windows.append((cursor, window_end))
+            cursor = window_end + timedelta(days=1)
+        return windows
+    
+    def aggregate_cost_data(self, estimator):
+        """Estimate and pre-aggregate every cost page on a ParallelEstimator; returns PartialAggregates or None"""
+        print(f"🔍 Querying Azure Cost Management API (estimating on {estimator.processes} processes)...")
+        try:
+            payloads = (payload for window in self._cost_windows()
+                        for payload in self.iter_cost_management_payloads(self._cost_query_body(*window)))
+            aggregates = estimator.aggregate(payloads, self.subscription_id)
+            print(f"✅ Estimated {aggregates.rows} cost rows from {aggregates.pages} pages into "
+                  f"{len(aggregates.cube.cells)} rollup cells")
+            return aggregates
         except Exception as e:
             print(f"❌ Cost Management API error: {e}")
             return None
     
-    def get_resource_data(self):
-        """Get Azure resource data to calculate carbon footprint"""
-        print("🔍 Querying Azure Resource Graph for carbon-relevant resources...")
-        
-        # Use Azure Resource Graph API (correct endpoint)
-        url = "https://management.azure.com/providers/Microsoft.ResourceGraph/resources?api-version=2021-03-01"
+    def iter_cost_pages_streaming(self):
+        """Yield cost pages for the whole period one at a time, date chunk by date chunk if chunked"""
+        for window in self._cost_windows():
+            yield from self.iter_cost_management_pages(self._cost_query_body(*window))
+    
+    def get_cost_management_data(self):
+        """Get data from Azure Cost Management API (includes some carbon metrics)"""
+        print("🔍 Querying Azure Cost Management API...")
         
-        # Resource Graph query to get carbon-relevant resources
-        query = """
+        try:
+            if self.cost_chunk_days:
+                data = self._get_chunked_cost_data(*self._cost_period())
+                print(f"✅ Cost Management data retrieved: {len(data['properties']['rows'])} rows")
+                return data
+            
+            data = None
+            page_count = 0
+            for page in self.iter_cost_management_pages():
+                page_count += 1
+                if data is None:
+                    data = {"properties": {"columns": page.get('columns', []), "rows": [], "nextLink": None}}
+                data['properties']['rows'].extend(page.get('rows', []))
+            
+            print(f"✅ Cost Management data retrieved: {len(data['properties']['rows'])} rows ({page_count} pages)")
+            return data
+        except Exception as e:
+            print(f"❌ Cost Management API error: {e}")
+            return None
+    
+    def _resource_graph_query(self, resource_types):
+        """KQL for carbon-relevant resources of the given (lower-case) types"""
+        type_list = ",\n            ".join(f"'{t}'" for t in resource_types)
+        # `id` must be projected for Resource Graph to page with $skipToken
+        return f"""
         Resources
         | where type in~ (
-            'microsoft.compute/virtualmachines',
-            'microsoft.storage/storageaccounts',
-            'microsoft.containerservice/managedclusters',
-            'microsoft.sql/servers',
-            'microsoft.dbforpostgresql/servers',
-            'microsoft.web/serverfarms',
-            'microsoft.network/loadbalancers'
+            {type_list}
         )
-        | project name, type, location, resourceGroup, subscriptionId, tags
-        | limit 1000
+        | project id, name, type, location, resourceGroup, subscriptionId, tags
         """
+    
+    def _query_resource_graph(self, query, subscriptions):
+        """Run a Resource Graph query, following $skipToken until every row is collected"""
+        url = f"{self.base_url}/providers/Microsoft.ResourceGraph/resources?api-version=2021-03-01"
         
-        request_body = {
-            "subscriptions": [self.subscription_id],
-            "query": query
-        }
+        resources = []
+        skip_token = None
+        while True:
+            options = {"$top": self.resource_page_size, "resultFormat": "objectArray"}
+            if skip_token:
+                options["$skipToken"] = skip_token
+            request_body = {
+                "subscriptions": subscriptions,
+                "query": query,
+                "options": options
+            }
+            
+            response = self.http.post(url, headers=self.get_headers(), json=request_body)
+            if response.status_code != 200:
+                raise RuntimeError(f"{response.status_code} - {response.text[:200]}")
+            
+            data = response.json()
+            resources.extend(data.get('data', []))
+            skip_token = data.get('$skipToken')
+            if not skip_token:
+                return resources
+    
+    def _resource_graph_shards(self, shard_by, subscriptions):
+        """Split the inventory query into independent (query, subscriptions) shards"""
+        if shard_by == "type":
+            return [(self._resource_graph_query([t]), subscriptions) for t in CARBON_RESOURCE_GRAPH_TYPES]
+        
+        query = self._resource_graph_query(CARBON_RESOURCE_GRAPH_TYPES)
+        if shard_by == "subscription":
+            size = max(1, self.resource_subscription_batch)
+            return [(query, subscriptions[i:i + size]) for i in range(0, len(subscriptions), size)]
+        return [(query, subscriptions)]
+    
+    def get_resource_data(self, subscriptions=None, shard_by=None):
+        """Get Azure resource data to calculate carbon footprint
+        
+        Pages through the full Resource Graph result set. With shard_by="type"
+        (one query per resource type) or shard_by="subscription" (batches of
+        `resource_subscription_batch` subscriptions) the shards run in parallel
+        on up to `resource_workers` threads and their results are merged.
+        """
+        print("🔍 Querying Azure Resource Graph for carbon-relevant resources...")
+        
+        subscriptions = subscriptions or [self.subscription_id]
+        shard_by = shard_by or self.resource_shard_by
+        shards = self._resource_graph_shards(shard_by, subscriptions)
         
         try:
-            response = requests.post(url, headers=self.get_headers(), json=request_body)
-            if response.status_code == 200:
-                data = response.json()
-                resources = data.get('data', [])
-                print(f"✅ Resource data retrieved: {len(resources)} carbon-relevant resources")
-                return resources
+            if len(shards) == 1:
+                resources = self._query_resource_graph(*shards[0])
             else:
-                print(f"⚠️ Resource Graph API failed: {response.status_code} - {response.text[:200]}")
-                # Fallback to simpler approach
-                return self.get_resource_data_fallback()
+                resources = []
+                with ThreadPoolExecutor(max_workers=min(self.resource_workers, len(shards))) as pool:
+                    for shard_resources in pool.map(lambda shard: self._query_resource_graph(*shard), shards):
+                        resources.extend(shard_resources)
+            
+            shard_note = f" from {len(shards)} {shard_by} shards" if len(shards) > 1 else ""
+            print(f"✅ Resource data retrieved: {len(resources)} carbon-relevant resources{shard_note}")
+            return resources
         except Exception as e:
-            print(f"⚠️ Resource Graph API error: {e}")
+            print(f"⚠️ Resource Graph API failed: {e}")
             # Fallback to simpler approach
             return self.get_resource_data_fallback()
     
@@ -157,10 +481,10 @@ class AzureCarbonExtractor:
         print("🔄 Trying fallback resource API...")
         
         # Use simple Resource Manager API
-        url = f"https://management.azure.com/subscriptions/{self.subscription_id}/resources?api-version=2021-04-01"
+        url = f"{self.base_url}/subscriptions/{self.subscription_id}/resources?api-version=2021-04-01"
         
         try:
-            response = requests.get(url, headers=self.get_headers())
+            response = self.http.get(url, headers=self.get_headers())
             if response.status_code == 200:
                 data = response.json()
                 all_resources = data.get('value', [])
@@ -186,128 +510,254 @@ class AzureCarbonExtractor:
             print(f"❌ Fallback Resource API error: {e}")
             return []
     
-    def get_sustainability_data(self):
-        """Try to get sustainability/carbon data from various Azure endpoints"""
-        print("🔍 Querying for sustainability data...")
-        
-        sustainability_endpoints = [
+    def _sustainability_endpoints(self):
+        """Sustainability-related endpoints queried for the subscription"""
+        return [
             {
                 "name": "Sustainability Workbook",
-                "url": f"https://management.azure.com/subscriptions/{self.subscription_id}/providers/Microsoft.Insights/workbooks?api-version=2022-04-01",
+                "url": f"{self.base_url}/subscriptions/{self.subscription_id}/providers/Microsoft.Insights/workbooks?api-version=2022-04-01",
                 "params": {"category": "workbook"}
             },
             {
                 "name": "Resource Health",
-                "url": f"https://management.azure.com/subscriptions/{self.subscription_id}/providers/Microsoft.ResourceHealth/availabilityStatuses?api-version=2022-10-01",
+                "url": f"{self.base_url}/subscriptions/{self.subscription_id}/providers/Microsoft.ResourceHealth/availabilityStatuses?api-version=2022-10-01",
                 "params": {}
             },
             {
                 "name": "Advisor Recommendations",
-                "url": f"https://management.azure.com/subscriptions/{self.subscription_id}/providers/Microsoft.Advisor/recommendations?api-version=2020-01-01",
+                "url": f"{self.base_url}/subscriptions/{self.subscription_id}/providers/Microsoft.Advisor/recommendations?api-version=2020-01-01",
                 "params": {}
             }
         ]
+    
+    def _fetch_sustainability_endpoint(self, endpoint):
+        """Query a single sustainability endpoint, returning its JSON or None"""
+        try:
+            url = endpoint["url"]
+            if endpoint["params"]:
+                # Add query parameters
+                params = "&".join([f"{k}={v}" for k, v in endpoint["params"].items()])
+                url += f"&{params}" if "?" in url else f"?{params}"
+            
+            response = self.http.get(url, headers=self.get_headers())
+            if response.status_code == 200:
+                data = response.json()
+                count = len(data.get('value', [])) if isinstance(data, dict) and 'value' in data else 'unknown'
+                print(f"✅ {endpoint['name']}: {response.status_code} ({count} items)")
+                return data
+            else:
+                print(f"⚠️ {endpoint['name']}: {response.status_code} - {response.text[:100]}")
+        except Exception as e:
+            print(f"⚠️ {endpoint['name']} error: {str(e)[:100]}")
+        return None
+    
+    def get_sustainability_data(self):
+        """Try to get sustainability/carbon data from various Azure endpoints"""
+        print("🔍 Querying for sustainability data...")
         
         results = {}
-        for endpoint in sustainability_endpoints:
-            try:
-                url = endpoint["url"]
-                if endpoint["params"]:
-                    # Add query parameters
-                    params = "&".join([f"{k}={v}" for k, v in endpoint["params"].items()])
-                    url += f"&{params}" if "?" in url else f"?{params}"
-                
-                response = requests.get(url, headers=self.get_headers())
-                if response.status_code == 200:
-                    data = response.json()
-                    results[endpoint["name"]] = data
-                    count = len(data.get('value', [])) if isinstance(data, dict) and 'value' in data else 'unknown'
-                    print(f"✅ {endpoint['name']}: {response.status_code} ({count} items)")
-                else:
-                    print(f"⚠️ {endpoint['name']}: {response.status_code} - {response.text[:100]}")
-            except Exception as e:
-                print(f"⚠️ {endpoint['name']} error: {str(e)[:100]}")
+        for endpoint in self._sustainability_endpoints():
+            data = self._fetch_sustainability_endpoint(endpoint)
+            if data is not None:
+                results[endpoint["name"]] = data
         
         return results if results else None
     
     def calculate_carbon_estimates(self, cost_data, resource_data):
-        """Calculate estimated carbon footprint based on cost and resource data"""
+        """Calculate estimated carbon footprint based on cost and resource data
+        
+        `cost_data` is either a full Cost Management response or an iterable of
+        result pages such as `iter_cost_management_pages()` yields.
+        """
         print("🧮 Calculating carbon footprint estimates...")
         
-        # Carbon intensity factors (kg CO2 per USD) - approximate values
-        carbon_factors = {
-            "Microsoft.Compute/virtualMachines": 0.45,  # High compute resources
-            "Microsoft.Storage/storageAccounts": 0.15,   # Storage
-            "Microsoft.ContainerService/managedClusters": 0.55,  # Container orchestration
-            "Microsoft.Sql/servers": 0.25,              # Database services
-            "Microsoft.Web/serverFarms": 0.35,          # App services
-            "default": 0.30                             # Default factor
-        }
+        # Imported here so NumPy isn't loaded for commands that never estimate
+        from estimation import estimate_records
+        
+        # Vectorised over each page when NumPy is installed, per row otherwise
+        carbon_estimates = estimate_records(cost_data, self.registry())
+        
+        print(f"✅ Calculated carbon estimates for {len(carbon_estimates)} data points")
+        return carbon_estimates
+    
+    def registry(self):
+        """Factor registry for this run's factors file and grid intensity series"""
+        return get_registry(self.factors_file, self.grid_intensity_file)
+    
+    def _resource_csv_path(self):
+        return self.resource_csv_file or os.path.join(os.path.dirname(self.csv_file), "azure_carbon_resources.csv")
+    
+    def _cube_path(self):
+        return self.cube_file or os.path.join(os.path.dirname(self.output_file), CUBE_FILENAME)
+    
+    def _anomaly_state_path(self):
+        return self.anomaly_state_file or os.path.join(os.path.dirname(self.output_file), ".anomaly_state.json")
+    
+    def _parquet_path(self):
+        return self.parquet_dir or os.path.join(os.path.dirname(self.output_file), "azure_carbon_parquet")
+    
+    def _parquet_writer(self):
+        """ParquetExport for this subscription's partitions, or None when disabled or pyarrow is missing"""
+        if not self.parquet:
+            return None
+        from columnar_export import ParquetExport, parquet_available
+        if not parquet_available():
+            print("⚠️ pyarrow is not installed; skipping the Parquet export (pip install pyarrow)")
+            return None
+        return ParquetExport(self._parquet_path(), self.subscription_id)
+    
+    def export_parquet(self, carbon_estimates):
+        """Write the estimates to the partitioned Parquet dataset"""
+        writer = self._parquet_writer()
+        if writer is None:
+            return False
+        with writer:
+            writer.write(carbon_estimates)
+        print(f"✅ {writer.rows_written} carbon estimates exported to Parquet dataset {self._parquet_path()}")
+        return True
+    
+    def _ndjson_path(self):
+        return self.ndjson_file or os.path.splitext(self.output_file)[0] + ".ndjson"
+    
+    def attribute_cube(self, cube, resource_data):
+        """Per-resource carbon estimates, joining the cube's resource group cells to the Resource Graph inventory
         
-        # Regional carbon intensity (kg CO2 per kWh) - approximate values
-        regional_factors = {
-            "eastus": 0.45,
-            "westus": 0.35,
-            "northeurope": 0.25,
-            "westeurope": 0.30,
-            "southeastasia": 0.55,
-            "default": 0.40
+        Carbon comes from the cube, so it reflects grid intensity where a
+        series is configured.
+        """
+        from resource_attribution import ResourceAttributor
+        
+        print("🔗 Attributing cost and carbon to individual resources...")
+        groups = cube.rollup("serviceName", "location", "resourceGroup")
+        attributor = ResourceAttributor(resource_data, self.registry())
+        attributor.add_totals({key: totals["costUSD"] for key, totals in groups.items()},
+                              cube.totals()["rows"],
+                              carbon={key: totals["estimatedCarbonKg"] for key, totals in groups.items()})
+        attribution = attributor.results()
+        summary = attribution["summary"]
+        print(f"✅ Attributed ${summary['attributedCostUSD']:.2f} to {summary['attributedResources']} resources "
+              f"(${summary['unattributedCostUSD']:.2f} unattributed)")
+        return attribution
+    
+    def _export_metadata(self):
+        query_start, query_end = self._cost_period()
+        return {
+            "extractionTime": datetime.now().isoformat(),
+            "subscriptionId": self.subscription_id,
+            "dataSource": "Azure Management APIs",
+            "carbonEstimationMethod": "Cost-based with regional and service factors",
+            "carbonFactors": self.registry().describe(),
+            "note": "Carbon estimates are calculated based on cost data and industry factors",
+            "queryPeriod": {
+                "from": query_start.strftime("%Y-%m-%d"),
+                "to": query_end.strftime("%Y-%m-%d"),
+                "incremental": self.incremental
+            },
+            "runMetrics": run_metrics(self.http)
         }
+    
+    def _export_resource_csv(self, attribution):
+        """Write per-resource estimates to CSV"""
+        if not attribution or not attribution["resources"]:
+            return
+        import csv
+        from resource_attribution import RESOURCE_FIELDS
+        with open(self._resource_csv_path(), 'w', newline='') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=RESOURCE_FIELDS)
+            writer.writeheader()
+            writer.writerows(attribution["resources"])
+        print(f"✅ Per-resource estimates exported to {self._resource_csv_path()}")
+    
+    def build_cube(self, cost_data):
+        """Rollup cube of every cost row in `cost_data`"""
+        from estimation import iter_cost_pages
+        from rollup_cube import RollupCube
+        
+        cube = RollupCube()
+        registry = self.registry()
+        for page in iter_cost_pages(cost_data):
+            cube.add_page([col['name'] for col in page.get('columns', [])], page.get('rows', []),
+                          self.subscription_id, registry)
+        return cube
+    
+    def update_cube(self, cost_data, merged_cost_data):
+        """Fold this run's cost rows into the persisted cube
         
-        carbon_estimates = []
+        Incremental runs replace only the cells from the start of the queried
+        window onwards; without a previous cube (or on full runs) the cube is
+        built from the (merged) cost data.
+        """
+        from rollup_cube import RollupCube
         
-        if cost_data and 'properties' in cost_data:
-            rows = cost_data['properties'].get('rows', [])
-            columns = [col['name'] for col in cost_data['properties'].get('columns', [])]
-            
-            for row in rows:
-                row_data = dict(zip(columns, row))
-                
-                service_name = row_data.get('ServiceName', 'Unknown')
-                location = row_data.get('ResourceLocation', 'unknown').lower()
-                cost_usd = float(row_data.get('CostUSD', 0))
-                
-                # Estimate carbon based on service type and cost
-                service_factor = carbon_factors.get(service_name, carbon_factors['default'])
-                regional_factor = regional_factors.get(location, regional_factors['default'])
-                
-                estimated_carbon_kg = cost_usd * service_factor * regional_factor
-                
-                carbon_estimates.append({
-                    "date": row_data.get('Date', ''),
-                    "serviceName": service_name,
-                    "location": location,
-                    "costUSD": cost_usd,
-                    "estimatedCarbonKg": round(estimated_carbon_kg, 4),
-                    "carbonIntensityFactor": service_factor,
-                    "regionalFactor": regional_factor
-                })
+        if not self.incremental or cost_data is None or not os.path.exists(self._cube_path()):
+            return self.build_cube(merged_cost_data)
         
-        print(f"✅ Calculated carbon estimates for {len(carbon_estimates)} data points")
-        return carbon_estimates
+        cube = RollupCube.load(self._cube_path())
+        cube.drop_since(self._cost_period()[0].strftime("%Y-%m-%d"), self.subscription_id)
+        return cube.merge(self.build_cube(cost_data))
     
-    def export_data(self, cost_data, resource_data, sustainability_data, carbon_estimates):
-        """Export all collected data to JSON and CSV files"""
+    def detect_anomalies(self, cube):
+        """Flag unusual daily carbon per subscription and service, updating the persisted detector state
+        
+        Only days not seen by earlier runs are fed to the detector, up to
+        `anomaly_settle_days` ago: more recent days are still being restated
+        and would be consumed half complete. Days after the queried window
+        are never fed, as they would read as zero. The state is written by
+        save_anomaly_state() once the export has succeeded.
+        """
+        from anomaly_detection import AnomalyDetector
+        
+        self.anomaly_detector = AnomalyDetector(self._anomaly_state_path(), threshold=self.anomaly_threshold)
+        settled = datetime.now() - timedelta(days=self.anomaly_settle_days)
+        closed_through = min(settled, self._cost_period()[1]).strftime("%Y-%m-%d")
+        anomalies = self.anomaly_detector.update_cube(cube, closed_through)
+        self.last_anomalies = anomalies
+        if anomalies:
+            print(f"🚨 {len(anomalies)} daily emissions anomalies detected:")
+            for anomaly in anomalies[:5]:
+                print(f"   • {anomaly['date']} {anomaly['serviceName']}: {anomaly['estimatedCarbonKg']:.2f} kg "
+                      f"vs ~{anomaly['expectedCarbonKg']:.2f} kg expected ({anomaly['direction']}, "
+                      f"score {anomaly['score']})")
+        return anomalies
+    
+    def save_anomaly_state(self):
+        if self.anomaly_detector is not None:
+            self.anomaly_detector.save()
+    
+    def export_data(self, cost_data, resource_data, sustainability_data, carbon_estimates, attribution=None,
+                    cube=None):
+        """Export all collected data to JSON and CSV files, and persist the rollup cube
+        
+        `cube` is built from `cost_data` unless given (see update_cube), and
+        `attribution` from the cube unless given. Summary totals come from the
+        cube rather than from another pass over the estimates, and daily
+        anomalies are detected on the cube's new days.
+        """
         print("📄 Exporting data...")
         
+        self.cube = cube if cube is not None else self.build_cube(cost_data)
+        if attribution is None and resource_data:
+            attribution = self.attribute_cube(self.cube, resource_data)
+        totals = self.cube.totals()
+        anomalies = self.detect_anomalies(self.cube)
+        
         # Prepare comprehensive export
         export_data = {
-            "metadata": {
-                "extractionTime": datetime.now().isoformat(),
-                "subscriptionId": self.subscription_id,
-                "dataSource": "Azure Management APIs",
-                "carbonEstimationMethod": "Cost-based with regional and service factors",
-                "note": "Carbon estimates are calculated based on cost data and industry factors"
-            },
+            "metadata": self._export_metadata(),
             "costManagementData": cost_data,
             "resourceData": resource_data,
             "sustainabilityData": sustainability_data,
             "carbonEstimates": carbon_estimates,
+            "resourceEstimates": attribution["resources"] if attribution else [],
+            "anomalies": anomalies,
             "summary": {
-                "totalEstimatedCarbonKg": sum(item['estimatedCarbonKg'] for item in carbon_estimates),
-                "totalCostUSD": sum(item['costUSD'] for item in carbon_estimates),
+                "totalEstimatedCarbonKg": totals["estimatedCarbonKg"],
+                "totalCostUSD": totals["costUSD"],
                 "resourceCount": len(resource_data) if resource_data else 0,
-                "dataPointCount": len(carbon_estimates)
+                "dataPointCount": len(carbon_estimates),
+                "anomalyCount": len(anomalies),
+                "resourceAttribution": attribution["summary"] if attribution else None,
+                "rollups": self.cube.summary("serviceName", "location")
             }
         }
         
@@ -315,80 +765,282 @@ class AzureCarbonExtractor:
         with open(self.output_file, 'w') as f:
             json.dump(export_data, f, indent=2)
         print(f"✅ Data exported to {self.output_file}")
+        self.save_anomaly_state()
+        
+        self.cube.save(self._cube_path())
+        print(f"✅ Rollup cube ({len(self.cube.cells)} cells) saved to {self._cube_path()}")
         
         # Export carbon estimates to CSV
         if carbon_estimates:
             import csv
+            from streaming_export import ESTIMATE_FIELDS
             with open(self.csv_file, 'w', newline='') as csvfile:
-                fieldnames = ['date', 'serviceName', 'location', 'costUSD', 'estimatedCarbonKg', 'carbonIntensityFactor', 'regionalFactor']
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+                writer = csv.DictWriter(csvfile, fieldnames=ESTIMATE_FIELDS)
                 writer.writeheader()
                 writer.writerows(carbon_estimates)
             print(f"✅ Carbon estimates exported to {self.csv_file}")
+            self.export_parquet(carbon_estimates)
+        
+        # Export per-resource estimates to CSV
+        self._export_resource_csv(attribution)
         
         return True
     
-    def run_extraction(self):
-        """Run the complete carbon data extraction workflow"""
-        print("🌱 Starting Azure Carbon Data Extraction")
-        print("=" * 60)
-        
+    def _prepare_extraction(self):
+        """Check the subscription and authenticate before querying any APIs"""
         if not self.subscription_id:
             print("❌ No subscription ID available. Please run 'az login' and 'az account set --subscription <id>'")
             return False
         
         print(f"🔍 Using subscription: {self.subscription_id}")
         
-        if not self.authenticate():
-            return False
-        
-        # Collect data from multiple sources
-        cost_data = self.get_cost_management_data()
-        resource_data = self.get_resource_data()
-        sustainability_data = self.get_sustainability_data()
+        if getattr(self.http, 'replay', False):
+            print("📼 Replay mode: answering every API call from the response cache")
+            return True
+        if is_local_endpoint(self.base_url):
+            print(f"🧪 Using local ARM stand-in at {self.base_url}, skipping authentication")
+            return True
         
+        return self.authenticate()
+    
+    def _finish_extraction(self, cost_data, resource_data, sustainability_data):
+        """Calculate estimates from the collected data, export and summarize"""
         # Calculate carbon estimates
         carbon_estimates = self.calculate_carbon_estimates(cost_data, resource_data)
+        merged_cost_data, merged_estimates = self.merge_incremental(cost_data, carbon_estimates)
+        cube = self.update_cube(cost_data, merged_cost_data)
         
         # Export all data
-        success = self.export_data(cost_data, resource_data, sustainability_data, carbon_estimates)
-        
+        success = self.export_data(merged_cost_data, resource_data, sustainability_data, merged_estimates,
+                                   cube=cube)
         if success:
+            self.advance_watermark(cost_data)
             print("\n🎉 Carbon data extraction completed successfully!")
             print(f"📁 JSON output: {self.output_file}")
             print(f"📊 CSV output: {self.csv_file}")
             
             # Show summary
             if carbon_estimates:
-                total_carbon = sum(item['estimatedCarbonKg'] for item in carbon_estimates)
-                total_cost = sum(item['costUSD'] for item in carbon_estimates)
-                print(f"📈 Total estimated carbon footprint: {total_carbon:.2f} kg CO2")
-                print(f"💰 Total cost analyzed: ${total_cost:.2f} USD")
+                totals = cube.totals()
+                print(f"📈 Total estimated carbon footprint: {totals['estimatedCarbonKg']:.2f} kg CO2")
+                print(f"💰 Total cost analyzed: ${totals['costUSD']:.2f} USD")
             
         return success
+    
+    def run_streaming_extraction(self):
+        """Run the extraction with cost pages flowing through estimation straight into the writers
+        
+        Only one page of cost rows and its estimates are in memory at a time;
+        totals and the rollup cube are accumulated as pages pass, and the
+        per-resource attribution is joined from the cube at the end.
+        The JSON output holds metadata, summary, inventory and per-resource
+        estimates, while the individual estimates go to CSV and NDJSON.
+        """
+        print("🌱 Starting Azure Carbon Data Extraction (streaming)")
+        print("=" * 60)
+        
+        if not self._prepare_extraction():
+            return False
+        
+        totals = self.stream_estimates(self.get_resource_data(), self.get_sustainability_data())
+        if totals is None:
+            return False
+        
+        print("\n🎉 Carbon data extraction completed successfully!")
+        print(f"📁 JSON output: {self.output_file}")
+        print(f"📊 CSV output: {self.csv_file}")
+        print(f"🧾 NDJSON output: {self._ndjson_path()}")
+        print(f"📈 Total estimated carbon footprint: {totals['totalEstimatedCarbonKg']:.2f} kg CO2")
+        print(f"💰 Total cost analyzed: ${totals['totalCostUSD']:.2f} USD")
+        return True
+    
+    def stream_estimates(self, resource_data, sustainability_data):
+        """Stream the cost pages through estimation into the CSV, NDJSON and Parquet exports
+        
+        Writes the JSON summary, cube and per-resource estimates once the
+        stream is complete. Returns the streamed totals, or None on failure.
+        """
+        from estimation import iter_page_estimates
+        from rollup_cube import RollupCube
+        from streaming_export import StreamingExport
+        
+        registry = self.registry()
+        self.cube = RollupCube()
+        
+        print("🔍 Streaming Azure Cost Management pages into the exports...")
+        parquet = self._parquet_writer()
+        try:
+            with StreamingExport(self.csv_file, self._ndjson_path()) as export, parquet or nullcontext():
+                for page, estimates in iter_page_estimates(self.iter_cost_pages_streaming(), registry):
+                    self.cube.add_page([col['name'] for col in page.get('columns', [])], page.get('rows', []),
+                                       self.subscription_id, registry)
+                    export.write(estimates)
+                    if parquet:
+                        parquet.write(estimates)
+        except Exception as e:
+            print(f"❌ Streaming extraction failed: {e}")
+            return None
+        
+        totals = export.totals
+        print(f"✅ Streamed {totals['dataPointCount']} carbon estimates from {totals['pageCount']} pages")
+        if parquet:
+            print(f"🧱 Parquet dataset: {self._parquet_path()} ({parquet.rows_written} rows)")
+        
+        attribution = self.attribute_cube(self.cube, resource_data) if resource_data else None
+        anomalies = self.detect_anomalies(self.cube)
+        summary = {
+            "totalEstimatedCarbonKg": totals["totalEstimatedCarbonKg"],
+            "totalCostUSD": totals["totalCostUSD"],
+            "resourceCount": len(resource_data) if resource_data else 0,
+            "dataPointCount": totals["dataPointCount"],
+            "anomalyCount": len(anomalies),
+            "dateRange": {"from": totals["firstDate"], "to": totals["lastDate"]},
+            "resourceAttribution": attribution["summary"] if attribution else None,
+            "rollups": self.cube.summary("serviceName", "location")
+        }
+        with open(self.output_file, 'w') as f:
+            json.dump({
+                "metadata": {**self._export_metadata(), "streaming": True,
+                             "carbonEstimatesFile": os.path.basename(self._ndjson_path())},
+                "resourceData": resource_data,
+                "sustainabilityData": sustainability_data,
+                "resourceEstimates": attribution["resources"] if attribution else [],
+                "anomalies": anomalies,
+                "summary": summary
+            }, f, indent=2)
+        self.save_anomaly_state()
+        self.cube.save(self._cube_path())
+        self._export_resource_csv(attribution)
+        return totals
+    
+    def run_parallel_extraction(self):
+        """Run the extraction with estimation and aggregation spread over worker processes
+        
+        Cost pages go to the workers as raw response bodies and come back as
+        per date/service/location aggregates, which become the exported
+        carbon estimates. The raw cost rows are never decoded in this process.
+        """
+        from parallel_estimation import ParallelEstimator
+        
+        print(f"🌱 Starting Azure Carbon Data Extraction ({self.estimation_processes} estimation processes)")
+        print("=" * 60)
+        
+        if not self._prepare_extraction():
+            return False
+        
+        resource_data = self.get_resource_data()
+        sustainability_data = self.get_sustainability_data()
+        with ParallelEstimator(self.estimation_processes, self.factors_file, self.grid_intensity_file) as estimator:
+            aggregates = self.aggregate_cost_data(estimator)
+        if aggregates is None:
+            return False
+        
+        carbon_estimates = aggregates.records()
+        if not self.export_data(None, resource_data, sustainability_data, carbon_estimates, cube=aggregates.cube):
+            return False
+        
+        totals = aggregates.cube.totals()
+        print("\n🎉 Carbon data extraction completed successfully!")
+        print(f"📁 JSON output: {self.output_file}")
+        print(f"📊 CSV output: {self.csv_file}")
+        print(f"📈 Total estimated carbon footprint: {totals['estimatedCarbonKg']:.2f} kg CO2")
+        print(f"💰 Total cost analyzed: ${totals['costUSD']:.2f} USD")
+        return True
+    
+    def run_extraction(self):
+        """Run the complete carbon data extraction workflow"""
+        if (self.streaming or (self.estimation_processes or 0) > 1) and self.incremental:
+            print("⚠️ Incremental runs merge with the previous output in memory; using the batch pipeline")
+        elif self.streaming:
+            return self.run_streaming_extraction()
+        elif (self.estimation_processes or 0) > 1:
+            return self.run_parallel_extraction()
+        
+        print("🌱 Starting Azure Carbon Data Extraction")
+        print("=" * 60)
+        
+        if not self._prepare_extraction():
+            return False
+        
+        # Collect data from multiple sources
+        cost_data = self.get_cost_management_data()
+        resource_data = self.get_resource_data()
+        sustainability_data = self.get_sustainability_data()
+        
+        return self._finish_extraction(cost_data, resource_data, sustainability_data)
+    
+    async def run_extraction_async(self, concurrency=4):
+        """Run the extraction workflow with all independent API calls issued concurrently
+        
+        Cost Management, Resource Graph and each sustainability endpoint are
+        queried at the same time (at most `concurrency` in flight), so the
+        collection phase takes roughly as long as the slowest single call.
+        """
+        print(f"🌱 Starting Azure Carbon Data Extraction (async, concurrency={concurrency})")
+        print("=" * 60)
+        
+        if not self._prepare_extraction():
+            return False
+        
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        
+        async def bounded(func, *args):
+            async with semaphore:
+                # The HTTP session is blocking, so each call runs on a worker thread
+                return await asyncio.to_thread(func, *args)
+        
+        endpoints = self._sustainability_endpoints()
+        print(f"🔍 Querying Cost Management, Resource Graph and {len(endpoints)} sustainability endpoints concurrently...")
+        cost_data, resource_data, *endpoint_results = await asyncio.gather(
+            bounded(self.get_cost_management_data),
+            bounded(self.get_resource_data),
+            *(bounded(self._fetch_sustainability_endpoint, endpoint) for endpoint in endpoints)
+        )
+        
+        sustainability_data = {
+            endpoint["name"]: data
+            for endpoint, data in zip(endpoints, endpoint_results)
+            if data is not None
+        } or None
+        
+        return self._finish_extraction(cost_data, resource_data, sustainability_data)
 
-def extract_carbon_emissions():
-    """Extract carbon emissions data from Azure APIs and save to output directory"""
+def extract_carbon_emissions(concurrency=1, **settings):
+    """Extract carbon emissions data from Azure APIs and save to output directory
+    
+    With concurrency > 1 the independent API calls are issued concurrently.
+    Any other keyword arguments are extractor settings (see
+    AzureCarbonExtractor.configure), e.g. resource_shard_by="type" or
+    cost_chunk_days=7.
+    """
     print("🌱 Starting Azure Carbon Emissions extraction...")
     
     # Ensure output directory exists
-    output_dir = "../output"
+    output_dir = OUTPUT_DIR
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
     
     try:
         # Initialize the extractor
         extractor = AzureCarbonExtractor()
+        extractor.configure(**settings)
         
         # Override output paths to use output directory
         extractor.output_file = os.path.join(output_dir, "azure_carbon_data.json")
         extractor.csv_file = os.path.join(output_dir, "azure_carbon_data.csv")
         
         # Run the extraction
-        success = extractor.run_extraction()
+        if concurrency > 1 and not extractor.streaming and (extractor.estimation_processes or 0) <= 1:
+            success = asyncio.run(extractor.run_extraction_async(concurrency))
+        else:
+            success = extractor.run_extraction()
         
         if success:
             output_files = [extractor.output_file, extractor.csv_file]
+            extra_files = [extractor._resource_csv_path(), extractor._cube_path()]
+            if extractor.streaming:
+                extra_files.append(extractor._ndjson_path())
+            output_files.extend(path for path in extra_files if os.path.exists(path))
             return True, output_files
         else:
             return False, []
@@ -405,10 +1057,28 @@ def main():
     
     parser = argparse.ArgumentParser(description='Extract carbon emissions data from Azure')
     parser.add_argument('--subscription-id', help='Azure subscription ID (auto-detected if not provided)')
+    parser.add_argument('--concurrency', type=int, default=1,
+                        help='Max concurrent API calls; values above 1 enable async extraction')
+    parser.add_argument('--resource-shards', choices=['type', 'subscription'],
+                        help='Split the Resource Graph inventory query into parallel shards')
+    parser.add_argument('--days', type=int, default=30, help='Days of cost data to query')
+    parser.add_argument('--start-date', help='Query cost data from this date (YYYY-MM-DD) instead of --days')
+    parser.add_argument('--chunk-days', type=int,
+                        help='Split the cost query into chunks of this many days, queried in parallel')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only query days after the last run (plus --restatement-days) and merge')
+    parser.add_argument('--restatement-days', type=int, default=3,
+                        help='Closed days re-queried on incremental runs to pick up late cost')
     args = parser.parse_args()
     
     extractor = AzureCarbonExtractor(subscription_id=args.subscription_id)
-    success = extractor.run_extraction()
+    extractor.configure(resource_shard_by=args.resource_shards, cost_days=args.days,
+                        cost_start_date=args.start_date, cost_chunk_days=args.chunk_days,
+                        incremental=args.incremental, restatement_days=args.restatement_days)
+    if args.concurrency > 1:
+        success = asyncio.run(extractor.run_extraction_async(args.concurrency))
+    else:
+        success = extractor.run_extraction()
     
     sys.exit(0 if success else 1)
 
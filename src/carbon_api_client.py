@@ -10,39 +10,41 @@ import os
 import sys
 import json
 import time
-import requests
-from azure.identity import DefaultAzureCredential
 from datetime import datetime, timedelta
 
+from credentials import MANAGEMENT_SCOPE, get_credential_provider, resolve_subscription_id
+from http_session import arm_base_url, get_shared_session, is_local_endpoint
+from lro_poller import LroPoller
+from carbon_query_planner import CarbonQueryError, CarbonQueryPlanner, parse_date
+
 class CarbonOptimizationClient:
-    def __init__(self, subscription_id=None):
+    def __init__(self, subscription_id=None, http=None, base_url=None):
         self.subscription_id = subscription_id or self._get_subscription_id()
-        self.base_url = "https://management.azure.com"
+        self.http = http or get_shared_session()
+        self.base_url = base_url or arm_base_url()
         self.api_version = "2023-10-01-preview"
         self.credential = None
-        self.headers = None
         
     def _get_subscription_id(self):
-        """Get subscription ID from Azure CLI"""
-        try:
-            import subprocess
-            result = subprocess.run(['az', 'account', 'show', '--query', 'id', '-o', 'tsv'], 
-                                  capture_output=True, text=True, check=True)
-            return result.stdout.strip()
-        except Exception as e:
-            print(f"❌ Could not get subscription ID: {e}")
-            print("💡 Please run 'az login' or set subscription ID manually")
-            return None
+        """Get subscription ID from the environment or the Azure CLI profile"""
+        subscription_id = resolve_subscription_id()
+        if not subscription_id:
+            print("❌ Could not get subscription ID")
+            print("💡 Please run 'az login', set AZURE_SUBSCRIPTION_ID or set subscription ID manually")
+        return subscription_id
     
     def authenticate(self):
         """Authenticate with Azure"""
+        if getattr(self.http, 'replay', False):
+            # Responses come from the cache, no token needed
+            print("📼 Replay mode: answering every API call from the response cache")
+            return True
+        if is_local_endpoint(self.base_url):
+            print(f"🧪 Using local ARM stand-in at {self.base_url}, skipping authentication")
+            return True
         try:
-            self.credential = DefaultAzureCredential()
-            token = self.credential.get_token("https://management.azure.com/.default").token
-            self.headers = {
-                "Authorization": f"Bearer {token}",
-                "Content-Type": "application/json"
-            }
+            self.credential = get_credential_provider()
+            self.credential.token(MANAGEMENT_SCOPE)
             print(f"✅ Authenticated successfully")
             print(f"📋 Subscription ID: {self.subscription_id}")
             return True
@@ -50,6 +52,14 @@ class CarbonOptimizationClient:
             print(f"❌ Authentication failed: {e}")
             return False
     
+    @property
+    def headers(self):
+        """HTTP headers with a current token from the shared credential provider"""
+        headers = {"Content-Type": "application/json"}
+        if self.credential is not None:
+            headers["Authorization"] = f"Bearer {self.credential.token(MANAGEMENT_SCOPE)}"
+        return headers
+    
     def get_carbon_insights(self):
         """Get carbon insights for the subscription"""
         url = f"{self.base_url}/subscriptions/{self.subscription_id}/providers/Microsoft.Carbon/insights"
@@ -57,7 +67,7 @@ class CarbonOptimizationClient:
         
         print("🔍 Getting carbon insights...")
         try:
-            response = requests.get(url, headers=self.headers, params=params)
+            response = self.http.get(url, headers=self.headers, params=params)
             print(f"   Status: {response.status_code}")
             
             if response.status_code == 200:
@@ -70,12 +80,13 @@ class CarbonOptimizationClient:
             print(f"   Request failed: {e}")
             return None
     
-    def query_carbon_usage(self, timeframe="MonthToDate"):
-        """Query carbon usage data"""
-        url = f"{self.base_url}/subscriptions/{self.subscription_id}/providers/Microsoft.Carbon/query"
-        params = {"api-version": self.api_version}
-        
-        # Query body based on Microsoft documentation
+    def _carbon_query_url(self):
+        return (f"{self.base_url}/subscriptions/{self.subscription_id}/providers/Microsoft.Carbon/query"
+                f"?api-version={self.api_version}")
+    
+    def usage_query_body(self, timeframe, grouping=("ResourceType", "ResourceLocation"),
+                         time_period=None, query_filter=None):
+        """Usage query body based on Microsoft documentation"""
         body = {
             "type": "Usage",
             "timeframe": timeframe,
@@ -87,22 +98,82 @@ class CarbonOptimizationClient:
                         "function": "Sum"
                     }
                 },
-                "grouping": [
-                    {
-                        "type": "Dimension", 
-                        "name": "ResourceType"
-                    },
-                    {
-                        "type": "Dimension",
-                        "name": "ResourceLocation"
-                    }
-                ]
+                "grouping": [{"type": "Dimension", "name": name} for name in grouping]
             }
         }
+        if time_period:
+            body["timePeriod"] = time_period
+        if query_filter:
+            body["dataset"]["filter"] = query_filter
+        return body
+    
+    def iter_carbon_query_pages(self, body):
+        """Yield every result page of a usage query, following nextLink and skipToken continuations
+        
+        Raises CarbonQueryError when a page fails, since a partial result would under-report emissions.
+        """
+        url = self._carbon_query_url()
+        while url:
+            response = self.http.post(url, headers=self.headers, json=body)
+            if response.status_code != 200:
+                raise CarbonQueryError(response.status_code, response.text)
+            
+            page = response.json()
+            yield page
+            
+            next_link = page.get("nextLink") or page.get("properties", {}).get("nextLink")
+            skip_token = page.get("skipToken")
+            if next_link:
+                url = next_link
+            elif skip_token:
+                body = {**body, "skipToken": skip_token}
+            else:
+                url = None
+    
+    def list_resource_groups(self):
+        """Names of every resource group in the subscription"""
+        url = f"{self.base_url}/subscriptions/{self.subscription_id}/resourcegroups?api-version=2021-04-01"
+        names = []
+        while url:
+            response = self.http.get(url, headers=self.headers)
+            if response.status_code != 200:
+                raise RuntimeError(f"Listing resource groups failed: {response.status_code} - {response.text[:200]}")
+            page = response.json()
+            names.extend(group["name"] for group in page.get("value", []))
+            url = page.get("nextLink")
+        return names
+    
+    def query_carbon_usage_by_resource_group(self, start_date, end_date, chunk_days=7, groups_per_slice=20, workers=4):
+        """Daily emissions per resource group, type and location for [start_date, end_date]
+        
+        The query is planned as date chunks x batches of resource groups and run
+        concurrently (see CarbonQueryPlanner); returns a CarbonUsageResult or None.
+        """
+        try:
+            resource_groups = self.list_resource_groups()
+            print(f"📁 {len(resource_groups)} resource groups in subscription")
+            planner = CarbonQueryPlanner(
+                self,
+                chunk_days=chunk_days,
+                split_dimension="ResourceGroupName",
+                split_values=resource_groups,
+                values_per_slice=groups_per_slice,
+                workers=workers
+            )
+            return planner.run(parse_date(start_date), parse_date(end_date))
+        except Exception as e:
+            print(f"   Carbon usage query failed: {e}")
+            return None
+    
+    def query_carbon_usage(self, timeframe="MonthToDate"):
+        """Query carbon usage data"""
+        url = f"{self.base_url}/subscriptions/{self.subscription_id}/providers/Microsoft.Carbon/query"
+        params = {"api-version": self.api_version}
+        body = self.usage_query_body(timeframe)
         
         print(f"🔍 Querying carbon usage data (timeframe: {timeframe})...")
         try:
-            response = requests.post(url, headers=self.headers, params=params, json=body)
+            response = self.http.post(url, headers=self.headers, params=params, json=body)
             print(f"   Status: {response.status_code}")
             
             if response.status_code == 200:
@@ -115,13 +186,13 @@ class CarbonOptimizationClient:
             print(f"   Request failed: {e}")
             return None
     
-    def create_export(self, export_name="carbon-export"):
-        """Create a carbon emissions export"""
-        url = f"{self.base_url}/subscriptions/{self.subscription_id}/providers/Microsoft.Carbon/exports/{export_name}"
-        params = {"api-version": self.api_version}
-        
-        # Export configuration
-        body = {
+    def _export_url(self, export_name):
+        return (f"{self.base_url}/subscriptions/{self.subscription_id}/providers/Microsoft.Carbon/exports/"
+                f"{export_name}?api-version={self.api_version}")
+    
+    def _export_body(self):
+        """Export configuration"""
+        return {
             "properties": {
                 "schedule": {
                     "status": "Active",
@@ -141,22 +212,36 @@ class CarbonOptimizationClient:
                 }
             }
         }
+    
+    def start_export(self, poller, export_name="carbon-export"):
+        """Send the export PUT and hand it to `poller`; returns the LongRunningOperation or None"""
+        url = self._export_url(export_name)
         
         print(f"🔍 Creating carbon export: {export_name}...")
         try:
-            response = requests.put(url, headers=self.headers, params=params, json=body)
+            response = self.http.put(url, headers=self.headers, json=self._export_body())
             print(f"   Status: {response.status_code}")
-            
-            if response.status_code in [200, 201]:
-                return response.json()
-            else:
+            if response.status_code >= 400:
                 print(f"   Error: {response.text}")
-                return None
+            return poller.add(f"{self.subscription_id}/{export_name}", response, method="PUT", url=url)
                 
         except Exception as e:
             print(f"   Request failed: {e}")
             return None
     
+    def create_export(self, export_name="carbon-export"):
+        """Create a carbon emissions export, waiting for it if Azure accepts it asynchronously"""
+        poller = LroPoller(self.http, headers=lambda: self.headers)
+        operation = self.start_export(poller, export_name)
+        if operation is None:
+            return None
+        
+        poller.run()
+        if not operation.succeeded:
+            print(f"   Export {operation.status}: {operation.error}")
+            return None
+        return operation.result
+    
     def extract_all_carbon_data(self):
         """Extract all available carbon data"""
         all_data = {
@@ -193,6 +278,31 @@ class CarbonOptimizationClient:
         
         return all_data
 
+def create_exports(subscription_ids, export_name="carbon-export", http=None, workers=8):
+    """Create the export in many subscriptions at once and collect every outcome in one polling pass
+
+    Returns {subscription_id: LongRunningOperation}; subscriptions whose PUT could not be sent are omitted.
+    """
+    http = http or get_shared_session()
+    clients = [CarbonOptimizationClient(subscription_id, http=http) for subscription_id in subscription_ids]
+    if clients and not clients[0].authenticate():
+        return {}
+    for client in clients[1:]:
+        # The credential provider is process-wide, so one authentication covers every client
+        client.credential = clients[0].credential
+    
+    poller = LroPoller(http, headers=lambda: clients[0].headers, workers=workers)
+    started = {}
+    for client in clients:
+        operation = client.start_export(poller, export_name)
+        if operation is not None:
+            started[client.subscription_id] = operation
+    
+    poller.run()
+    succeeded = sum(1 for operation in started.values() if operation.succeeded)
+    print(f"📤 Exports created in {succeeded}/{len(subscription_ids)} subscriptions")
+    return started
+
 def main():
     print("🌍 AZURE CARBON OPTIMIZATION API CLIENT")
     print("=" * 60)
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Carbon Query Planner
+Splits a Microsoft.Carbon usage query into slices - date windows, optionally
+crossed with batches of dimension values such as resource groups - runs the
+slices concurrently, follows continuation links on every slice and merges the
+pages into one typed result set. A slice that times out, fails server-side or
+returns too large a result is split in half and retried, so fine granularity
+never depends on a single huge query succeeding. Other client errors (a bad
+filter, an auth failure) fail the slice at once, since a smaller query would
+fail the same way.
+"""
+
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+
+import requests
+
+CarbonUsageRow = namedtuple(
+    "CarbonUsageRow", ["date", "resource_group", "resource_type", "location", "carbon_emissions"]
+)
+
+QuerySlice = namedtuple("QuerySlice", ["start", "end", "dimension", "values"])
+
+# Column or field names (lower-cased) used by Microsoft.Carbon results, per CarbonUsageRow field
+_FIELD_NAMES = {
+    "usagedate": "date",
+    "date": "date",
+    "resourcegroupname": "resource_group",
+    "resourcegroup": "resource_group",
+    "resourcetype": "resource_type",
+    "resourcelocation": "location",
+    "location": "location",
+    "usagequantity": "carbon_emissions",
+    "totalcarbonemissions": "carbon_emissions",
+    "totalcarbonemission": "carbon_emissions",
+    "latestmonthemissions": "carbon_emissions",
+    "carbonemissions": "carbon_emissions",
+}
+
+
+class CarbonQueryError(RuntimeError):
+    """A usage query page answered with an error status"""
+
+    def __init__(self, status_code, text):
+        super().__init__(f"Carbon query failed: {status_code} - {text[:200]}")
+        self.status_code = status_code
+        self.text = text
+
+
+def is_splittable(error):
+    """True for failures a smaller slice may avoid: timeouts, 5xx and result-too-large errors"""
+    if isinstance(error, (requests.Timeout, requests.ConnectionError)):
+        return True
+    if not isinstance(error, CarbonQueryError):
+        return False
+    if error.status_code in (408, 413) or error.status_code >= 500:
+        return True
+    text = error.text.lower()
+    return "too large" in text or "toolarge" in text
+
+
+def _date_string(value):
+    """Normalise 20250510, '20250510' or ISO timestamps to YYYY-MM-DD"""
+    if value is None:
+        return None
+    text = str(value)
+    if text.isdigit() and len(text) == 8:
+        return f"{text[:4]}-{text[4:6]}-{text[6:]}"
+    return text[:10]
+
+
+def _typed_row(values):
+    """CarbonUsageRow from a {field name: value} mapping, ignoring unknown fields"""
+    fields = dict.fromkeys(CarbonUsageRow._fields)
+    for name, value in values.items():
+        field = _FIELD_NAMES.get(str(name).lower())
+        if field:
+            fields[field] = value
+    fields["date"] = _date_string(fields["date"])
+    fields["carbon_emissions"] = float(fields["carbon_emissions"] or 0.0)
+    return CarbonUsageRow(**fields)
+
+
+def rows_from_page(page):
+    """Typed rows from one result page, in either columns/rows or `value` list form"""
+    if "value" in page:
+        return [_typed_row(item.get("properties", item)) for item in page["value"]]
+    properties = page.get("properties", page)
+    names = [column["name"] for column in properties.get("columns", [])]
+    return [_typed_row(dict(zip(names, row))) for row in properties.get("rows", [])]
+
+
+class CarbonUsageResult:
+    """Merged rows of a planned query, plus what it took to get them"""
+
+    def __init__(self, rows, slices, pages, failed, seconds):
+        self.rows = rows
+        self.slices = slices
+        self.pages = pages
+        self.failed = failed
+        self.seconds = seconds
+
+    def total_emissions(self):
+        return sum(row.carbon_emissions for row in self.rows)
+
+    def to_dict(self):
+        return {
+            "rows": [row._asdict() for row in self.rows],
+            "sliceCount": self.slices,
+            "pageCount": self.pages,
+            "failedSlices": [
+                {"from": s.start.strftime("%Y-%m-%d"), "to": s.end.strftime("%Y-%m-%d"),
+                 "dimension": s.dimension, "values": list(s.values or [])}
+                for s in self.failed
+            ],
+            "totalCarbonEmissions": self.total_emissions(),
+            "seconds": round(self.seconds, 3)
+        }
+
+
+class CarbonQueryPlanner:
+    def __init__(self, client, grouping=("ResourceGroupName", "ResourceType", "ResourceLocation"),
+                 chunk_days=None, split_dimension=None, split_values=None, values_per_slice=20, workers=4):
+        self.client = client
+        self.grouping = list(grouping)
+        self.chunk_days = chunk_days
+        self.split_dimension = split_dimension
+        self.split_values = list(split_values or [])
+        self.values_per_slice = max(1, values_per_slice)
+        self.workers = workers
+
+    def plan(self, start, end):
+        """Slices covering [start, end]: date windows x batches of dimension values"""
+        windows = []
+        step = timedelta(days=self.chunk_days) if self.chunk_days else None
+        cursor = start
+        while cursor.date() <= end.date():
+            window_end = min(cursor + step - timedelta(days=1), end) if step else end
+            windows.append((cursor, window_end))
+            cursor = window_end + timedelta(days=1)
+
+        if not (self.split_dimension and self.split_values):
+            return [QuerySlice(s, e, None, None) for s, e in windows]
+
+        batches = [tuple(self.split_values[i:i + self.values_per_slice])
+                   for i in range(0, len(self.split_values), self.values_per_slice)]
+        return [QuerySlice(s, e, self.split_dimension, batch) for s, e in windows for batch in batches]
+
+    def body_for(self, query_slice):
+        time_period = {
+            "from": query_slice.start.strftime("%Y-%m-%dT00:00:00Z"),
+            "to": query_slice.end.strftime("%Y-%m-%dT23:59:59Z")
+        }
+        query_filter = None
+        if query_slice.dimension:
+            query_filter = {"dimensions": {"name": query_slice.dimension, "operator": "In",
+                                           "values": list(query_slice.values)}}
+        return self.client.usage_query_body("Custom", self.grouping, time_period=time_period,
+                                            query_filter=query_filter)
+
+    def _run_slice(self, query_slice):
+        """All rows of one slice; returns (rows, page count)"""
+        rows = []
+        pages = 0
+        for page in self.client.iter_carbon_query_pages(self.body_for(query_slice)):
+            pages += 1
+            rows.extend(rows_from_page(page))
+        return rows, pages
+
+    @staticmethod
+    def split(query_slice):
+        """Two halves of a slice (by dimension values first, then by dates), or None if it can't shrink"""
+        if query_slice.values and len(query_slice.values) > 1:
+            middle = len(query_slice.values) // 2
+            return [query_slice._replace(values=query_slice.values[:middle]),
+                    query_slice._replace(values=query_slice.values[middle:])]
+        days = (query_slice.end.date() - query_slice.start.date()).days
+        if days >= 1:
+            middle = query_slice.start + timedelta(days=days // 2)
+            return [query_slice._replace(end=middle),
+                    query_slice._replace(start=middle + timedelta(days=1))]
+        return None
+
+    def run(self, start, end):
+        """Query every slice concurrently and merge the rows in (date, resource group, type, location) order"""
+        started = time.perf_counter()
+        slices = self.plan(start, end)
+        print(f"🔍 Querying carbon usage in {len(slices)} slice(s) with {self.workers} workers...")
+
+        rows = []
+        pages = 0
+        failed = []
+        completed = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            pending = {pool.submit(self._run_slice, s): s for s in slices}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    query_slice = pending.pop(future)
+                    try:
+                        slice_rows, slice_pages = future.result()
+                    except Exception as e:
+                        halves = self.split(query_slice) if is_splittable(e) else None
+                        if halves is None:
+                            print(f"   ❌ Slice {query_slice.start:%Y-%m-%d} failed: {e}")
+                            failed.append(query_slice)
+                        else:
+                            print(f"   ⚠️ Slice failed ({e}), retrying as two smaller slices")
+                            for half in halves:
+                                pending[pool.submit(self._run_slice, half)] = half
+                        continue
+                    rows.extend(slice_rows)
+                    pages += slice_pages
+                    completed += 1
+
+        rows.sort(key=lambda r: (r.date or "", r.resource_group or "", r.resource_type or "", r.location or ""))
+        result = CarbonUsageResult(rows, completed, pages, failed, time.perf_counter() - started)
+        print(f"✅ Carbon usage retrieved: {len(rows)} rows from {pages} pages "
+              f"({len(failed)} failed slices, {result.seconds:.1f}s)")
+        return result
+
+
+def parse_date(value):
+    """datetime from a YYYY-MM-DD string (pass-through for datetimes)"""
+    return value if isinstance(value, datetime) else datetime.strptime(value, "%Y-%m-%d")
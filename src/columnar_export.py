@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Columnar export of carbon estimates to a partitioned Parquet dataset.
+
+Estimates are written as a Hive-style dataset that BI jobs (pyarrow, Spark,
+DuckDB, Synapse) can read selectively instead of re-parsing the JSON/CSV:
+
+    azure_carbon_parquet/usageDate=2025-05-10/subscriptionId=<id>/part-0.parquet
+
+- usage date and subscription are partition directories, so readers that
+  filter on them skip whole files;
+- serviceName and location are dictionary-encoded, which keeps them small
+  and reads back as categoricals;
+- every column chunk carries min/max statistics, and rows are sorted by
+  service and location within a row group so filters on them prune too.
+
+Estimates can be written page by page. Rows are buffered per usage date and
+flushed as row groups, so memory is bounded by the buffer, not the dataset.
+Files are written to a temporary directory first. Once the whole export has
+succeeded, they replace the subscription's previous partitions. Other
+subscriptions sharing the dataset are left untouched.
+
+pyarrow is an optional dependency; without it the export is skipped.
+"""
+
+import os
+import shutil
+
+PARQUET_FIELDS = ['serviceName', 'location', 'costUSD', 'estimatedCarbonKg',
+                  'carbonIntensityFactor', 'regionalFactor']
+# Partition value readers map back to a null usage date
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+
+def parquet_available():
+    """True when pyarrow, the only dependency of the writer, can be imported"""
+    try:
+        import pyarrow.compute  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class ParquetExport:
+    """Partitioned Parquet writer for one subscription's carbon estimates"""
+
+    def __init__(self, root, subscription_id, row_group_size=128 * 1024, max_buffered_rows=1024 * 1024,
+                 compression="zstd"):
+        import pyarrow as pa
+
+        self.root = root
+        self.subscription_id = subscription_id or "unknown"
+        self.row_group_size = row_group_size
+        self.max_buffered_rows = max_buffered_rows
+        self.compression = compression
+        self.schema = pa.schema([
+            ('serviceName', pa.dictionary(pa.int32(), pa.string())),
+            ('location', pa.dictionary(pa.int32(), pa.string())),
+            ('costUSD', pa.float64()),
+            ('estimatedCarbonKg', pa.float64()),
+            ('carbonIntensityFactor', pa.float64()),
+            ('regionalFactor', pa.float64())
+        ])
+        self.temp_dir = os.path.join(root, f".tmp-{self.subscription_id}-{os.getpid()}")
+        self.rows_written = 0
+        self._writers = {}
+        self._buffers = {}
+        self._buffered_rows = 0
+
+    def __enter__(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+        os.makedirs(self.temp_dir)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.flush()
+            for writer in self._writers.values():
+                writer.close()
+            if exc_type is None:
+                self._replace_partitions()
+        finally:
+            shutil.rmtree(self.temp_dir, ignore_errors=True)
+        return False
+
+    def partition_dir(self, date):
+        return os.path.join(f"usageDate={date or NULL_PARTITION}", f"subscriptionId={self.subscription_id}")
+
+    def write(self, estimates):
+        """Buffer one page of estimates by usage date, flushing dates whose row group is full"""
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        if not estimates:
+            return
+        dates = pa.array([e['date'] or "" for e in estimates], type=pa.string())
+        # Buffered as plain strings, which can be sorted; dictionary-encoded per row group on flush
+        columns = [pa.array([e[field] for e in estimates], type=pa.string()) for field in PARQUET_FIELDS[:2]]
+        columns += [pa.array([e[field] for e in estimates], type=pa.float64()) for field in PARQUET_FIELDS[2:]]
+        table = pa.Table.from_arrays(columns, names=PARQUET_FIELDS)
+
+        # A page spans a handful of usage dates, so one vectorised filter per date
+        for date in pc.unique(dates).to_pylist():
+            part = table.filter(pc.equal(dates, date))
+            buffer = self._buffers.setdefault(date, [])
+            buffer.append(part)
+            self._buffered_rows += len(part)
+            if sum(len(t) for t in buffer) >= self.row_group_size:
+                self._flush_date(date)
+        if self._buffered_rows >= self.max_buffered_rows:
+            self.flush()
+
+    def flush(self):
+        """Write every buffered date out as a row group"""
+        for date in list(self._buffers):
+            self._flush_date(date)
+
+    def _flush_date(self, date):
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+
+        buffer = self._buffers.pop(date)
+        table = pa.concat_tables(buffer)
+        self._buffered_rows -= len(table)
+        table = table.take(pc.sort_indices(table, [("serviceName", "ascending"), ("location", "ascending")]))
+        table = pa.Table.from_arrays([table.column(i).combine_chunks().dictionary_encode() if i < 2
+                                      else table.column(i) for i in range(len(PARQUET_FIELDS))], schema=self.schema)
+
+        writer = self._writers.get(date)
+        if writer is None:
+            directory = os.path.join(self.temp_dir, self.partition_dir(date))
+            os.makedirs(directory, exist_ok=True)
+            writer = pq.ParquetWriter(os.path.join(directory, "part-0.parquet"), self.schema,
+                                      compression=self.compression, use_dictionary=['serviceName', 'location'],
+                                      write_statistics=True)
+            self._writers[date] = writer
+        writer.write_table(table, row_group_size=self.row_group_size)
+        self.rows_written += len(table)
+
+    def _replace_partitions(self):
+        """Swap the new partitions in for the subscription's previous ones"""
+        suffix = f"subscriptionId={self.subscription_id}"
+        for name in os.listdir(self.root):
+            old = os.path.join(self.root, name, suffix)
+            if name.startswith("usageDate=") and os.path.isdir(old):
+                shutil.rmtree(old)
+        for date in self._writers:
+            target = os.path.join(self.root, self.partition_dir(date))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(os.path.join(self.temp_dir, self.partition_dir(date)), target)
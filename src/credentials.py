@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Process-wide Azure credential and token cache.
+
+DefaultAzureCredential is built once and shared by extraction and upload.
+Tokens are cached per scope (management, storage) and a background thread
+refreshes each one a few minutes before it expires, so long runs never stall
+on the credential chain or fail halfway with an expired token.
+
+The subscription is resolved from the environment or the Azure CLI profile
+file rather than by running `az`, and azure.identity is only imported once a
+token is actually needed, which keeps startup fast.
+"""
+
+import json
+import os
+import threading
+import time
+
+MANAGEMENT_SCOPE = "https://management.azure.com/.default"
+STORAGE_SCOPE = "https://storage.azure.com/.default"
+
+SUBSCRIPTION_ENV_VARS = ("AZURE_SUBSCRIPTION_ID", "ARM_SUBSCRIPTION_ID")
+
+
+def _azure_profile_path():
+    config_dir = os.environ.get("AZURE_CONFIG_DIR") or os.path.join(os.path.expanduser("~"), ".azure")
+    return os.path.join(config_dir, "azureProfile.json")
+
+
+def resolve_subscription_id():
+    """Subscription ID from the environment or the Azure CLI's default subscription, or None
+
+    Reads ~/.azure/azureProfile.json (the file `az account set` maintains)
+    directly instead of spawning `az account show`, which costs a second or more.
+    """
+    for name in SUBSCRIPTION_ENV_VARS:
+        value = os.environ.get(name, "").strip()
+        if value:
+            return value
+
+    try:
+        # The CLI writes this file with a UTF-8 byte order mark
+        with open(_azure_profile_path(), "r", encoding="utf-8-sig") as f:
+            profile = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    for subscription in profile.get("subscriptions", []):
+        if subscription.get("isDefault"):
+            return subscription.get("id")
+    return None
+
+
+def _default_azure_credential():
+    # Imported on first use: azure.identity alone adds ~150ms to every startup
+    from azure.identity import DefaultAzureCredential
+    return DefaultAzureCredential()
+
+
+class CachedCredential:
+    """TokenCredential that caches tokens per scope and refreshes them before expiry
+
+    Can be passed anywhere the Azure SDK expects a credential (e.g. BlobServiceClient).
+    """
+
+    def __init__(self, refresh_margin=300, credential_factory=_default_azure_credential, min_refresh_interval=1.0,
+                 retry_interval=30.0, max_retry_interval=600.0):
+        self.refresh_margin = refresh_margin
+        self.credential_factory = credential_factory
+        # Floor between two background refreshes of a scope, whatever the token lifetime
+        self.min_refresh_interval = min_refresh_interval
+        # Failed background refreshes are retried after retry_interval, doubling up to max_retry_interval
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max_retry_interval
+        self._credential = None
+        self._tokens = {}
+        self._fetched_at = {}
+        self._retry_at = {}
+        self._failures = {}
+        self._lock = threading.Lock()
+        self._scope_locks = {}
+        self._wakeup = threading.Condition(self._lock)
+        self._refresher = None
+        self._closed = False
+
+    def _underlying(self):
+        with self._lock:
+            if self._credential is None:
+                self._credential = self.credential_factory()
+            return self._credential
+
+    def _scope_lock(self, scopes):
+        with self._lock:
+            return self._scope_locks.setdefault(scopes, threading.Lock())
+
+    def _margin(self, scopes, token):
+        """Refresh margin, capped at half the token's lifetime so short-lived tokens aren't always stale"""
+        lifetime = token.expires_on - self._fetched_at.get(scopes, time.time())
+        return min(self.refresh_margin, max(lifetime, 0) / 2)
+
+    def _is_fresh(self, scopes, token):
+        return token is not None and token.expires_on - time.time() > self._margin(scopes, token)
+
+    def _fetch(self, scopes):
+        fetched_at = time.time()
+        token = self._underlying().get_token(*scopes)
+        with self._lock:
+            self._tokens[scopes] = token
+            self._fetched_at[scopes] = fetched_at
+            self._retry_at.pop(scopes, None)
+            self._failures.pop(scopes, None)
+            self._wakeup.notify_all()
+        self._ensure_refresher()
+        return token
+
+    def get_token(self, *scopes, **kwargs):
+        """Cached AccessToken for the scopes, fetched only when missing or close to expiry
+
+        Requests with options such as claims= or tenant_id= (CAE challenges,
+        other tenants) bypass the cache, which only holds the default tokens.
+        """
+        if kwargs:
+            return self._underlying().get_token(*scopes, **kwargs)
+        scopes = tuple(scopes)
+        with self._lock:
+            token = self._tokens.get(scopes)
+            fresh = self._is_fresh(scopes, token)
+        if fresh:
+            return token
+
+        # One fetch per scope at a time; concurrent callers reuse its result
+        with self._scope_lock(scopes):
+            with self._lock:
+                token = self._tokens.get(scopes)
+                fresh = self._is_fresh(scopes, token)
+            if fresh:
+                return token
+            return self._fetch(scopes)
+
+    def token(self, scope=MANAGEMENT_SCOPE):
+        """Bearer token string for a single scope"""
+        return self.get_token(scope).token
+
+    def _ensure_refresher(self):
+        with self._lock:
+            if self._refresher is None and not self._closed:
+                self._refresher = threading.Thread(target=self._refresh_loop, name="token-refresher", daemon=True)
+                self._refresher.start()
+
+    def _refresh_loop(self):
+        """Refresh every cached token `refresh_margin` seconds before it expires"""
+        while True:
+            with self._lock:
+                if self._closed:
+                    return
+                if not self._tokens:
+                    self._wakeup.wait()
+                    continue
+                due = {
+                    scopes: max(token.expires_on - self._margin(scopes, token),
+                                self._fetched_at[scopes] + self.min_refresh_interval,
+                                self._retry_at.get(scopes, 0))
+                    for scopes, token in self._tokens.items()
+                }
+                scopes = min(due, key=due.get)
+                delay = due[scopes] - time.time()
+                if delay > 0:
+                    # Woken early when a new token is cached or on close()
+                    self._wakeup.wait(timeout=delay)
+                    continue
+
+            try:
+                with self._scope_lock(scopes):
+                    self._fetch(scopes)
+            except Exception as e:
+                with self._lock:
+                    # Back off so a failing credential doesn't spin; callers still refresh on demand
+                    failures = self._failures.get(scopes, 0)
+                    self._failures[scopes] = failures + 1
+                    delay = min(self.retry_interval * 2 ** failures, self.max_retry_interval)
+                    self._retry_at[scopes] = time.time() + delay
+                print(f"⚠️ Background token refresh failed, retrying in {delay:.0f}s: {e}")
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._wakeup.notify_all()
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_credential_provider():
+    """Return the process-wide CachedCredential, creating it on first use"""
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            _provider = CachedCredential()
+        return _provider
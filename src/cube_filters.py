@@ -0,0 +1,17 @@
+#!/usr/bin/env python3
+"""
+Command-line --where filters for the rollup cube.
+
+Kept apart from rollup_cube so the main CLI can parse its arguments without
+importing NumPy.
+"""
+
+import argparse
+
+
+def parse_filter(value):
+    """argparse type for --where: 'DIMENSION=VALUE' -> (dimension, value)"""
+    dimension, separator, filter_value = value.partition("=")
+    if not separator or not dimension.strip():
+        raise argparse.ArgumentTypeError(f"DIMENSION=VALUE expected, got '{value}'")
+    return dimension.strip(), filter_value
@@ -7,16 +7,18 @@ with better error handling and authentication feedback.
 
 import sys
 import os
-from azure.storage.blob import BlobServiceClient
-from azure.identity import DefaultAzureCredential
-from azure.core.exceptions import ResourceExistsError, ClientAuthenticationError
+
+from credentials import STORAGE_SCOPE, get_credential_provider
 
 def check_authentication():
     """Check if Azure authentication is working"""
+    from azure.core.exceptions import ClientAuthenticationError
+    
     try:
-        credential = DefaultAzureCredential()
+        # Shared with extraction, so the credential chain is only walked once per process
+        credential = get_credential_provider()
         # Try to get a token to test authentication
-        token = credential.get_token("https://storage.azure.com/.default")
+        token = credential.get_token(STORAGE_SCOPE)
         print("✅ Azure authentication successful")
         return credential
     except ClientAuthenticationError as e:
@@ -93,6 +95,9 @@ def main():
     # Step 2: Connect to storage account
     print("\n2️⃣ Connecting to Azure Storage...")
     try:
+        # Imported here so callers that never upload don't pay for the storage SDK
+        from azure.storage.blob import BlobServiceClient
+        
         account_url = f"https://{storage_account_name}.blob.core.windows.net"
         blob_service_client = BlobServiceClient(account_url=account_url, credential=credential)
         print(f"✅ Connected to {account_url}")
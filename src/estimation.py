@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Carbon estimation kernel.
+
+Turns Cost Management rows into carbon estimates (cost x service factor x
+regional factor, looked up in the factor registry). With NumPy installed the rows of each page are transposed
+into typed columns once, service names, locations and dates are mapped to
+small categorical codes so each factor lookup and date format happens once
+per distinct value, and estimatedCarbonKg for the whole page is a single
+array expression. Without NumPy the same results come from a per-row loop.
+
+When the registry carries a grid intensity series, the regional factor of
+each row comes from an as-of join on its region and usage date instead.
+"""
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from factor_registry import get_registry
+
+HAVE_NUMPY = np is not None
+
+def iter_cost_pages(cost_data):
+    """Normalize a Cost Management response or an iterable of pages into pages"""
+    if not cost_data:
+        return
+    if isinstance(cost_data, dict):
+        if 'properties' in cost_data:
+            yield cost_data['properties']
+        return
+    yield from cost_data
+
+
+def format_usage_date(value):
+    """Format a Cost Management usage date (20250510 or an ISO timestamp) as YYYY-MM-DD"""
+    if value is None or value == '':
+        return ''
+    value = str(value)
+    if len(value) == 8 and value.isdigit():
+        return f"{value[:4]}-{value[4:6]}-{value[6:]}"
+    return value[:10]
+
+
+def factorize(values):
+    """(codes, uniques): an int array of positions into the list of distinct values"""
+    index = {}
+    codes = [index.setdefault(value, len(index)) for value in values]
+    return np.array(codes, dtype=np.int32), list(index)
+
+
+def column(columns, rows, name, default):
+    """One column of a page as a tuple, or `default` repeated if the page lacks it"""
+    if name in columns:
+        position = columns.index(name)
+        return tuple(row[position] for row in rows)
+    return (default,) * len(rows)
+
+
+def estimate_page_columns(columns, rows, registry):
+    """Estimates for one page as typed columns
+
+    Returns a dict of NumPy arrays: `cost`, `carbon`, `serviceFactor`,
+    `regionalFactor`, plus categorical `dateCode`/`serviceCode`/`locationCode`
+    arrays with the matching `dates`/`services`/`locations` value lists.
+    """
+    date_name = 'UsageDate' if 'UsageDate' in columns else 'Date'
+    cost = np.array(column(columns, rows, 'CostUSD', 0), dtype=np.float64)
+
+    service_codes, services = factorize(column(columns, rows, 'ServiceName', 'Unknown'))
+    raw_location_codes, raw_locations = factorize(column(columns, rows, 'ResourceLocation', 'unknown'))
+    date_codes, raw_dates = factorize(column(columns, rows, date_name, ''))
+
+    # Spellings of the same region ('US East', 'eastus') share a code once canonicalised
+    location_codes, locations = factorize(registry.region_key(location) for location in raw_locations)
+    location_codes = location_codes[raw_location_codes]
+
+    # One factor lookup per distinct value, then gather by code
+    service_factor = np.array([registry.service_factor(s) for s in services], dtype=np.float64)[service_codes]
+    regional_factor = np.array([registry.regional_factor(l) for l in locations], dtype=np.float64)[location_codes]
+    if registry.grid_intensity is not None:
+        regional_factor = registry.grid_intensity.regional_factors(locations, location_codes, raw_dates, date_codes,
+                                                                   regional_factor)
+
+    return {
+        "cost": cost,
+        "carbon": np.round(cost * service_factor * regional_factor, 4),
+        "serviceFactor": service_factor,
+        "regionalFactor": regional_factor,
+        "dateCode": date_codes,
+        "dates": [format_usage_date(d) for d in raw_dates],
+        "serviceCode": service_codes,
+        "services": services,
+        "locationCode": location_codes,
+        "locations": locations
+    }
+
+
+def to_records(page_columns):
+    """Estimate dicts (the export format) for one page of columns"""
+    dates = page_columns["dates"]
+    services = page_columns["services"]
+    locations = page_columns["locations"]
+    return [
+        {
+            "date": dates[d],
+            "serviceName": services[s],
+            "location": locations[l],
+            "costUSD": cost,
+            "estimatedCarbonKg": carbon,
+            "carbonIntensityFactor": service_factor,
+            "regionalFactor": regional_factor
+        }
+        for d, s, l, cost, carbon, service_factor, regional_factor in zip(
+            page_columns["dateCode"].tolist(),
+            page_columns["serviceCode"].tolist(),
+            page_columns["locationCode"].tolist(),
+            page_columns["cost"].tolist(),
+            page_columns["carbon"].tolist(),
+            page_columns["serviceFactor"].tolist(),
+            page_columns["regionalFactor"].tolist()
+        )
+    ]
+
+
+def estimate_rows(columns, rows, registry):
+    """Estimate dicts for one page, row by row; the fallback used when NumPy is not installed"""
+    if registry.grid_intensity is not None:
+        raise ImportError("Grid intensity series need NumPy; the per-row fallback only has static factors")
+    estimates = []
+    for row in rows:
+        row_data = dict(zip(columns, row))
+
+        service_name = row_data.get('ServiceName', 'Unknown')
+        location = registry.region_key(row_data.get('ResourceLocation', 'unknown'))
+        cost_usd = float(row_data.get('CostUSD', 0))
+
+        # Estimate carbon based on service type and cost
+        service_factor = registry.service_factor(service_name)
+        regional_factor = registry.regional_factor(location)
+
+        estimates.append({
+            "date": format_usage_date(row_data.get('UsageDate', row_data.get('Date', ''))),
+            "serviceName": service_name,
+            "location": location,
+            "costUSD": cost_usd,
+            "estimatedCarbonKg": round(cost_usd * service_factor * regional_factor, 4),
+            "carbonIntensityFactor": service_factor,
+            "regionalFactor": regional_factor
+        })
+    return estimates
+
+
+def iter_page_estimates(cost_data, registry=None):
+    """Yield (page, estimate dicts) for each page in turn, so only one page is held at a time"""
+    registry = registry or get_registry()
+    for page in iter_cost_pages(cost_data):
+        rows = page.get('rows', [])
+        columns = [col['name'] for col in page.get('columns', [])]
+        if not rows:
+            continue
+        if HAVE_NUMPY:
+            yield page, to_records(estimate_page_columns(columns, rows, registry))
+        else:
+            yield page, estimate_rows(columns, rows, registry)
+
+
+def estimate_records(cost_data, registry=None):
+    """Carbon estimate dicts for every row of a Cost Management response or iterable of pages"""
+    estimates = []
+    for _, page_estimates in iter_page_estimates(cost_data, registry):
+        estimates.extend(page_estimates)
+    return estimates
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Extraction State
+Persists a watermark per subscription - the last fully-closed usage date that
+has been extracted - so incremental runs only query the days after it.
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+
+
+class ExtractionState:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.subscriptions = {}
+        self.load()
+
+    def load(self):
+        """Load the state file; a missing or unreadable file means no watermarks yet"""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                self.subscriptions = json.load(f).get('subscriptions', {})
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Ignoring unreadable state file {self.path}: {e}")
+            self.subscriptions = {}
+
+    def get_watermark(self, subscription_id):
+        """Last fully-closed usage date extracted for the subscription (a date), or None"""
+        with self.lock:
+            entry = self.subscriptions.get(subscription_id)
+        if not entry or not entry.get('lastClosedDate'):
+            return None
+        return datetime.strptime(entry['lastClosedDate'], "%Y-%m-%d").date()
+
+    def set_watermark(self, subscription_id, closed_date):
+        with self.lock:
+            self.subscriptions[subscription_id] = {
+                "lastClosedDate": closed_date.strftime("%Y-%m-%d"),
+                "updatedAt": datetime.now().isoformat()
+            }
+
+    def save(self):
+        """Write the state atomically so an interrupted run never leaves a corrupt file"""
+        with self.lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump({"subscriptions": self.subscriptions}, f, indent=2)
+            os.replace(temp_path, self.path)
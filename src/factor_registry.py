@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Carbon factor registry.
+
+Service and regional carbon factors live in a versioned JSON file
+(src/carbon_factors.json by default, or $CARBON_FACTORS_FILE) so they can be
+swapped without code changes. Each entry lists the aliases it is known by
+(`Azure App Service` for Microsoft.Web/serverFarms, `US East` for eastus);
+all of them are compiled into one index keyed by a normalised form
+(lower-case, alphanumerics only), and every distinct raw string is resolved
+through that index once and memoised, so per-row lookups are a dict hit.
+
+A registry can carry an hourly grid intensity series (see grid_intensity.py)
+that overrides the static regional factors where it has readings.
+"""
+
+import json
+import os
+import re
+import threading
+
+DEFAULT_FACTORS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "carbon_factors.json")
+FACTORS_FILE_ENV_VAR = "CARBON_FACTORS_FILE"
+
+_NON_ALPHANUMERIC = re.compile(r"[^0-9a-z]+")
+
+
+def normalize_name(value):
+    """Comparison form of a service or location name: 'US East' -> 'useast'"""
+    return _NON_ALPHANUMERIC.sub("", str(value).lower())
+
+
+def _compile_section(section, label):
+    """(factors, index): canonical key -> factor, and normalised alias -> canonical key"""
+    if not isinstance(section, dict) or "default" not in section:
+        raise ValueError(f"Factor registry '{label}' needs a 'default' entry")
+    factors = {}
+    index = {}
+    for key, entry in section.items():
+        if not isinstance(entry, dict):
+            entry = {"factor": entry}
+        factors[key] = float(entry["factor"])
+        if key == "default":
+            continue
+        for alias in [key] + list(entry.get("aliases", [])):
+            normalized = normalize_name(alias)
+            if index.get(normalized, key) != key:
+                raise ValueError(f"Factor registry '{label}' alias '{alias}' maps to both "
+                                 f"{index[normalized]} and {key}")
+            index[normalized] = key
+    return factors, index
+
+
+class FactorRegistry:
+    """Service and regional carbon factors with a precompiled alias index"""
+
+    def __init__(self, services, regions, version=None, source=None):
+        self.version = version
+        self.source = source
+        self.carbon_factors, self._service_index = _compile_section(services, "services")
+        self.regional_factors, self._region_index = _compile_section(regions, "regions")
+        # Raw string -> canonical key (None when unknown), filled on first sight
+        self._service_memo = {}
+        self._region_memo = {}
+        # Optional GridIntensity used by the estimation kernel instead of regional_factors
+        self.grid_intensity = None
+
+    @classmethod
+    def load(cls, path=None):
+        """Registry from a factors file (default: $CARBON_FACTORS_FILE, then the bundled file)"""
+        path = path or os.environ.get(FACTORS_FILE_ENV_VAR) or DEFAULT_FACTORS_FILE
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data.get("services"), data.get("regions"), version=data.get("version"), source=path)
+
+    def service_key(self, name):
+        """Canonical service key for a ServiceName or resource type, or None if unknown"""
+        try:
+            return self._service_memo[name]
+        except KeyError:
+            key = self._service_index.get(normalize_name(name))
+            self._service_memo[name] = key
+            return key
+
+    def region_key(self, location):
+        """Canonical region name for a location ('US East' -> 'eastus'); unknown ones are just lower-cased"""
+        try:
+            return self._region_memo[location]
+        except KeyError:
+            key = self._region_index.get(normalize_name(location), str(location).lower())
+            self._region_memo[location] = key
+            return key
+
+    def service_factor(self, name):
+        key = self.service_key(name)
+        return self.carbon_factors[key] if key else self.carbon_factors["default"]
+
+    def regional_factor(self, location):
+        return self.regional_factors.get(self.region_key(location), self.regional_factors["default"])
+
+    def describe(self):
+        """Registry identity for export metadata"""
+        description = {"version": self.version, "source": os.path.basename(self.source) if self.source else None}
+        if self.grid_intensity is not None:
+            description["gridIntensity"] = self.grid_intensity.describe()
+        return description
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(path=None, grid_intensity=None):
+    """Process-wide registry for a factors file (and grid intensity series), loaded and compiled once"""
+    path = path or os.environ.get(FACTORS_FILE_ENV_VAR) or DEFAULT_FACTORS_FILE
+    key = (path, grid_intensity)
+    with _registries_lock:
+        if key not in _registries:
+            registry = FactorRegistry.load(path)
+            if grid_intensity:
+                try:
+                    from grid_intensity import GridIntensity
+                except ImportError as e:
+                    # Falling back to the static factors would silently change every estimate
+                    raise ImportError(f"Grid intensity series ({grid_intensity}) need NumPy: "
+                                      "pip install numpy or drop --grid-intensity") from e
+                registry.grid_intensity = GridIntensity.load(grid_intensity, registry)
+            _registries[key] = registry
+        return _registries[key]
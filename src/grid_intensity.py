@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Hourly grid carbon intensity.
+
+Replaces the static per-region factor with a time series per region, loaded
+from local files (e.g. exports from Electricity Maps or WattTime) in
+gCO2eq/kWh and stored as kg CO2 per kWh, the unit of the regional factors in
+carbon_factors.json. All regions are kept in one pair of sorted arrays keyed
+by (region, UTC second), so an as-of join of millions of usage rows is a
+single np.searchsorted: each row takes the latest reading at or before its
+timestamp, as long as that reading is at most `max_age_hours` old. Rows whose
+region has no series, or whose timestamp has no recent enough reading, keep
+the static factor.
+
+Cost Management reports daily usage, so daily rows (20250510) are joined to
+daily mean intensity; rows carrying a time of day are joined to the hourly
+series.
+
+Accepted files:
+    <dir>/            one <region>.csv per region with timestamp,carbonIntensity columns
+    <file>.csv        region,timestamp,carbonIntensity columns
+    <file>.npz        written by GridIntensity.save(), loads without parsing
+
+Timestamps are ISO 8601 in UTC ("2025-05-10T13:00:00" or "2025-05-10T13:00:00Z").
+"""
+
+import csv
+import os
+
+import numpy as np
+
+SECONDS_PER_DAY = 86400
+# Region code * stride + epoch seconds: one sortable int64 key per reading
+_REGION_STRIDE = 1 << 40
+_INTENSITY_COLUMNS = ("carbonIntensity", "carbon_intensity", "intensity", "gCO2eqPerKwh")
+
+
+def parse_timestamps(values):
+    """UTC epoch seconds (int64) for ISO 8601 strings; -1 where a value cannot be parsed"""
+    text = np.char.strip(np.asarray(values, dtype=str))
+    # Fast path: plain ISO timestamps (optionally with a Z suffix) parse in one vectorised call
+    if text.size and not (np.char.str_len(text) == 8).any() and not (np.char.find(text, "+") >= 0).any():
+        try:
+            parsed = np.char.rstrip(text, "Z").astype("datetime64[s]")
+        except ValueError:
+            pass
+        else:
+            seconds = parsed.astype(np.int64)
+            seconds[np.isnat(parsed)] = -1
+            return seconds
+    return _parse_each(text.tolist())
+
+
+def _parse_each(values):
+    """parse_timestamps() for compact dates (20250510), UTC offsets and values that may not parse"""
+    cleaned = []
+    for value in values:
+        if len(value) == 8 and value.isdigit():
+            value = f"{value[:4]}-{value[4:6]}-{value[6:]}"
+        elif value.endswith("Z"):
+            value = value[:-1]
+        elif value.endswith("+00:00"):
+            value = value[:-6]
+        cleaned.append(value)
+    try:
+        parsed = np.array(cleaned, dtype="datetime64[s]")
+    except ValueError:
+        parsed = np.array([_parse_one(value) for value in cleaned], dtype="datetime64[s]")
+    seconds = parsed.astype(np.int64)
+    seconds[np.isnat(parsed)] = -1
+    return seconds
+
+
+def _parse_one(value):
+    try:
+        return np.datetime64(value, "s")
+    except ValueError:
+        return np.datetime64("NaT")
+
+
+def _read_columns(path):
+    """{"region", "timestamp", "intensity"} column lists of one intensity CSV ("region" only if present)"""
+    with open(path, "r", newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        value_name = next((name for name in _INTENSITY_COLUMNS if name in header), None)
+        if value_name is None or "timestamp" not in header:
+            raise ValueError(f"{path}: expected a timestamp column and one of {', '.join(_INTENSITY_COLUMNS)}")
+        names = ["timestamp", "intensity"] + (["region"] if "region" in header else [])
+        positions = [header.index(name if name != "intensity" else value_name) for name in names]
+        # Appending to per-column lists keeps no per-row containers alive for the garbage collector to scan
+        columns = {name: [] for name in names}
+        appends = [(columns[name].append, position) for name, position in zip(names, positions)]
+        for row in reader:
+            for append, position in appends:
+                append(row[position])
+    return columns
+
+
+class GridIntensity:
+    """Per-region carbon intensity series (kg CO2/kWh) with a vectorised as-of join"""
+
+    def __init__(self, regions, keys, values, max_age_hours=24, source=None):
+        self.regions = list(regions)
+        self._codes = {region: code for code, region in enumerate(self.regions)}
+        order = np.argsort(keys, kind="stable")
+        self._keys = np.asarray(keys, dtype=np.int64)[order]
+        self._values = np.asarray(values, dtype=np.float64)[order]
+        self.max_age_hours = max_age_hours
+        self.source = source
+        self._daily = None
+
+    @classmethod
+    def from_series(cls, series, max_age_hours=24, source=None):
+        """Build from {region: (timestamps, gCO2eq/kWh)}; timestamps as ISO strings or epoch seconds"""
+        regions, keys, values = [], [], []
+        for code, (region, (timestamps, intensity)) in enumerate(series.items()):
+            timestamps = np.asarray(timestamps)
+            if timestamps.dtype.kind not in "iu":
+                timestamps = parse_timestamps(timestamps)
+            valid = timestamps >= 0
+            regions.append(region)
+            keys.append(code * _REGION_STRIDE + timestamps[valid].astype(np.int64))
+            values.append(np.asarray(intensity, dtype=np.float64)[valid] / 1000.0)
+        if not regions:
+            return cls([], np.empty(0, np.int64), np.empty(0), max_age_hours, source)
+        return cls(regions, np.concatenate(keys), np.concatenate(values), max_age_hours, source)
+
+    @classmethod
+    def load(cls, path, registry=None, max_age_hours=24):
+        """Series from a directory of per-region CSVs, one long CSV, or a saved .npz
+
+        Region names are canonicalised through `registry` ('US East' ->
+        'eastus'); readings of regions spelled differently are merged.
+        """
+        if path.endswith(".npz"):
+            with np.load(path) as data:
+                return cls(data["regions"].tolist(), data["keys"], data["values"], max_age_hours, source=path)
+
+        canonical = registry.region_key if registry is not None else (lambda name: str(name).lower())
+        if os.path.isdir(path):
+            files = [(os.path.join(path, name), name[:-4]) for name in sorted(os.listdir(path)) if name.endswith(".csv")]
+        else:
+            files = [(path, None)]
+
+        codes = {}
+        keys, values = [], []
+        for file_path, region in files:
+            columns = _read_columns(file_path)
+            if not columns["timestamp"]:
+                continue
+            if region is None and "region" not in columns:
+                raise ValueError(f"{file_path}: expected a region column (or one <region>.csv per region)")
+            if region is not None:
+                raw_regions, raw_codes = [region], np.zeros(len(columns["timestamp"]), dtype=np.int64)
+            else:
+                index = {}
+                raw_codes = np.array([index.setdefault(name, len(index)) for name in columns["region"]],
+                                     dtype=np.int64)
+                raw_regions = list(index)
+            # One canonical code per distinct spelling, shared across files
+            region_codes = np.array([codes.setdefault(canonical(name), len(codes)) for name in raw_regions],
+                                    dtype=np.int64)
+            seconds = parse_timestamps(columns["timestamp"])
+            valid = seconds >= 0
+            keys.append((region_codes[raw_codes] * _REGION_STRIDE + seconds)[valid])
+            values.append(np.array(columns["intensity"], dtype=np.float64)[valid] / 1000.0)
+        if not keys:
+            return cls([], np.empty(0, np.int64), np.empty(0), max_age_hours, source=path)
+        return cls(list(codes), np.concatenate(keys), np.concatenate(values), max_age_hours, source=path)
+
+    def save(self, path):
+        """Write the compiled arrays to a .npz that load() reads without parsing"""
+        np.savez(path, regions=np.array(self.regions), keys=self._keys, values=self._values)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def describe(self):
+        """Series identity and coverage for export metadata"""
+        source = os.path.basename(os.path.normpath(self.source)) if self.source else None
+        if not len(self._keys):
+            return {"source": source, "regions": 0, "readings": 0}
+        seconds = self._keys % _REGION_STRIDE
+        return {
+            "source": source,
+            "regions": len(self.regions),
+            "readings": len(self._keys),
+            "from": str(np.datetime64(int(seconds.min()), "s")),
+            "to": str(np.datetime64(int(seconds.max()), "s"))
+        }
+
+    def daily(self):
+        """Series of daily means, stamped at 00:00 UTC, computed once"""
+        if self._daily is None:
+            day_keys = self._keys - (self._keys % _REGION_STRIDE) % SECONDS_PER_DAY
+            days, inverse = np.unique(day_keys, return_inverse=True)
+            means = np.bincount(inverse, weights=self._values) / np.bincount(inverse)
+            self._daily = GridIntensity(self.regions, days, means, self.max_age_hours, self.source)
+        return self._daily
+
+    def lookup(self, region_codes, seconds):
+        """(kg CO2/kWh, found) for parallel arrays of region codes (-1: no series) and epoch seconds"""
+        region_codes = np.asarray(region_codes, dtype=np.int64)
+        seconds = np.asarray(seconds, dtype=np.int64)
+        if not len(self._keys):
+            return np.zeros(len(seconds)), np.zeros(len(seconds), dtype=bool)
+        position = np.searchsorted(self._keys, region_codes * _REGION_STRIDE + seconds, side="right") - 1
+        found = (region_codes >= 0) & (seconds >= 0) & (position >= 0)
+        position = np.clip(position, 0, len(self._keys) - 1)
+        reading = self._keys[position]
+        found &= (reading // _REGION_STRIDE) == region_codes
+        found &= seconds - reading % _REGION_STRIDE <= self.max_age_hours * 3600
+        return self._values[position], found
+
+    def regional_factors(self, locations, location_codes, raw_dates, date_codes, static):
+        """Per-row regional factors for one factorised page, falling back to `static` per row
+
+        `locations`/`raw_dates` are the page's distinct canonical regions and
+        usage dates, indexed by the per-row `location_codes`/`date_codes`.
+        """
+        daily = all(len(str(value)) <= 10 for value in raw_dates)
+        series = self.daily() if daily else self
+        region_codes = np.array([self._codes.get(location, -1) for location in locations], dtype=np.int64)
+        seconds = parse_timestamps(raw_dates)
+        values, found = series.lookup(region_codes[location_codes], seconds[date_codes])
+        return np.where(found, values, static)
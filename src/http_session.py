@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Shared HTTP transport for Azure Resource Manager calls.
+
+Every API client in this project sends its requests through one pooled
+requests.Session, so connections to management.azure.com are kept alive
+between calls instead of paying a new TCP+TLS handshake each time.
+Throttled (429) and transiently failing (5xx, connection reset) requests
+are retried with exponential backoff and full jitter, honoring the
+Retry-After and x-ms-ratelimit-* headers that ARM sends back, and an
+optional adaptive rate limiter paces requests to stay under ARM's quotas.
+"""
+
+import os
+import random
+import re
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from rate_limiter import AdaptiveRateLimiter
+
+DEFAULT_ARM_URL = "https://management.azure.com"
+
+# Status codes that are worth retrying: throttling and transient server errors
+RETRY_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+# e.g. x-ms-ratelimit-microsoft.costmanagement-qpu-retry-after
+_RATELIMIT_RETRY_AFTER = re.compile(r"^x-ms-ratelimit-.*retry-after$", re.IGNORECASE)
+
+# e.g. x-ms-ratelimit-remaining-subscription-reads, x-ms-ratelimit-microsoft.costmanagement-qpu-remaining
+_RATELIMIT_REMAINING = re.compile(r"^x-ms-ratelimit-.*remaining", re.IGNORECASE)
+_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+
+
+def _parse_seconds(value):
+    """Parse a delay header value given in seconds, hh:mm:ss or as an HTTP date"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    if re.match(r"^\d+:\d{2}:\d{2}$", value):
+        hours, minutes, seconds = (int(part) for part in value.split(":"))
+        return float(hours * 3600 + minutes * 60 + seconds)
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_retry_after(headers):
+    """Return the delay (seconds) the server asked for, or None if it gave no hint"""
+    if not headers:
+        return None
+
+    delays = []
+    for name, value in headers.items():
+        lower = name.lower()
+        if lower in ("retry-after-ms", "x-ms-retry-after-ms"):
+            seconds = _parse_seconds(value)
+            if seconds is not None:
+                delays.append(seconds / 1000.0)
+        elif lower == "retry-after" or _RATELIMIT_RETRY_AFTER.match(lower):
+            seconds = _parse_seconds(value)
+            if seconds is not None:
+                delays.append(seconds)
+
+    # Resource Graph reports its per-user quota window instead of Retry-After
+    if headers.get("x-ms-user-quota-remaining") == "0":
+        seconds = _parse_seconds(headers.get("x-ms-user-quota-resets-after"))
+        if seconds is not None:
+            delays.append(seconds)
+
+    return max(delays) if delays else None
+
+
+def parse_quota(headers):
+    """Return (remaining requests, seconds until the quota resets) reported by ARM
+
+    Either value is None when the response did not report it. With several
+    quotas in play (subscription, tenant, per-user) the tightest one counts.
+    """
+    if not headers:
+        return None, None
+
+    remaining = []
+    for name, value in headers.items():
+        lower = name.lower()
+        if lower == "x-ms-user-quota-remaining" or _RATELIMIT_REMAINING.match(lower):
+            match = _NUMBER.search(str(value))
+            if match:
+                remaining.append(float(match.group()))
+
+    resets_after = _parse_seconds(headers.get("x-ms-user-quota-resets-after"))
+    return (min(remaining) if remaining else None), resets_after
+
+
+class ArmSession:
+    """Pooled, retrying HTTP session for management.azure.com"""
+
+    def __init__(self, pool_connections=10, pool_maxsize=20, max_retries=5,
+                 backoff_factor=1.0, backoff_max=60.0, max_retry_after=300.0, timeout=60, cache=None, rate_limiter=None):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
+        self.max_retry_after = max_retry_after
+        self.timeout = timeout
+        # Optional ResponseCache consulted before (and filled after) each request
+        self.cache = cache
+        # Optional AdaptiveRateLimiter every request waits on before going out
+        self.rate_limiter = rate_limiter
+
+        self.session = requests.Session()
+        # Retries are handled here so Retry-After and ARM headers can be honored
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._stats_lock = threading.Lock()
+        self.stats = {"requests": 0, "retries": 0, "throttled": 0, "failures": 0}
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def backoff_delay(self, attempt, retry_after=None):
+        """Delay before retry number `attempt` (0-based)"""
+        if retry_after is not None:
+            # The server knows best; add a little jitter so parallel workers don't stampede
+            return min(retry_after, self.max_retry_after) + random.uniform(0, min(1.0, self.backoff_factor))
+        ceiling = min(self.backoff_max, self.backoff_factor * (2 ** attempt))
+        return random.uniform(0, ceiling)
+
+    @property
+    def replay(self):
+        """True when requests are answered purely from the response cache"""
+        return self.cache is not None and self.cache.replay
+
+    def request(self, method, url, gate=None, **kwargs):
+        """Send a request (or answer it from the cache); returns the last response
+
+        `gate` (e.g. a semaphore) is held around each attempt only, never
+        while waiting to retry.
+        """
+        if self.cache is None:
+            return self._send_with_retry(method, url, gate, **kwargs)
+
+        # Query parameters are part of the cache key
+        cache_url = _full_url(url, kwargs.get("params"))
+        body = kwargs.get("json")
+        cached = self.cache.lookup(method, cache_url, body)
+        if cached is not None:
+            return cached
+        if self.cache.replay:
+            return self.cache.miss_response(method, cache_url)
+
+        response = self._send_with_retry(method, url, gate, **kwargs)
+        self.cache.store(method, cache_url, body, response)
+        return response
+
+    def _send_with_retry(self, method, url, gate=None, **kwargs):
+        """Send a request, retrying throttled and transient failures; returns the last response"""
+        kwargs.setdefault("timeout", self.timeout)
+
+        attempt = 0
+        while True:
+            self._count("requests")
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(url)
+            try:
+                with gate or nullcontext():
+                    response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.max_retries:
+                    self._count("failures")
+                    raise
+                delay = self.backoff_delay(attempt)
+                print(f"⏳ {method} {_short_url(url)} failed ({type(e).__name__}), "
+                      f"retrying in {delay:.1f}s ({attempt + 1}/{self.max_retries})")
+            else:
+                retry_after = parse_retry_after(response.headers)
+                if self.rate_limiter is not None:
+                    remaining, resets_after = parse_quota(response.headers)
+                    self.rate_limiter.observe(url, response.status_code, remaining, resets_after, retry_after)
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                    if response.status_code in RETRY_STATUS_CODES:
+                        self._count("failures")
+                    return response
+                if response.status_code == 429:
+                    self._count("throttled")
+                delay = self.backoff_delay(attempt, retry_after)
+                print(f"⏳ {method} {_short_url(url)} returned {response.status_code}, "
+                      f"retrying in {delay:.1f}s ({attempt + 1}/{self.max_retries})")
+                response.close()
+
+            self._count("retries")
+            time.sleep(delay)
+            attempt += 1
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+class BudgetedSession:
+    """ArmSession wrapper that caps the requests in flight through it with a shared semaphore
+
+    Used to give every tenant its own request budget when many subscriptions
+    are extracted in parallel over one pooled session.
+    """
+
+    def __init__(self, session, semaphore):
+        self.session = session
+        self.semaphore = semaphore
+
+    def request(self, method, url, **kwargs):
+        if isinstance(self.session, ArmSession):
+            # Held per attempt, so a throttled request doesn't keep a slot while it sleeps
+            return self.session.request(method, url, gate=self.semaphore, **kwargs)
+        with self.semaphore:
+            return self.session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def __getattr__(self, name):
+        # stats, close() etc. come from the wrapped session
+        return getattr(self.session, name)
+
+
+def _full_url(url, params):
+    """URL including any query parameters passed separately"""
+    if not params:
+        return url
+    return requests.Request("GET", url, params=params).prepare().url
+
+
+def run_metrics(http):
+    """Request counters and rate limiter state of a session, for export metadata"""
+    metrics = {}
+    stats = getattr(http, "stats", None)
+    if isinstance(stats, dict):
+        metrics["requests"] = dict(stats)
+    limiter = getattr(http, "rate_limiter", None)
+    if limiter is not None:
+        metrics["rateLimits"] = limiter.snapshot()
+    return metrics
+
+
+def arm_base_url():
+    """Resource Manager base URL: $AZURE_ARM_URL (e.g. a local stand-in server) or the public cloud"""
+    return os.environ.get("AZURE_ARM_URL", DEFAULT_ARM_URL).rstrip("/")
+
+
+def is_local_endpoint(url):
+    """True for loopback URLs such as the local ARM stand-in, which need no Azure token"""
+    return (urlsplit(url).hostname or "") in ("localhost", "127.0.0.1", "::1")
+
+
+def _short_url(url):
+    """Strip the query string so log lines stay readable"""
+    return url.split("?", 1)[0]
+
+
+_shared_session = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_session():
+    """Return the process-wide ArmSession, creating it with default settings on first use"""
+    global _shared_session
+    with _shared_lock:
+        if _shared_session is None:
+            _shared_session = ArmSession(rate_limiter=AdaptiveRateLimiter())
+        return _shared_session
+
+
+def configure_shared_session(**kwargs):
+    """Replace the process-wide ArmSession with one built from the given settings"""
+    global _shared_session
+    with _shared_lock:
+        if _shared_session is not None:
+            _shared_session.close()
+        _shared_session = ArmSession(**kwargs)
+        return _shared_session
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Poller for Azure Resource Manager long-running operations.
+
+ARM answers slow requests (exports, large queries) with 201/202 and an
+Azure-AsyncOperation or Location header to poll. LroPoller tracks any number
+of such operations from a single loop: each one sits in a heap keyed by its
+next poll time, which honors Retry-After, so hundreds of exports can be
+started and collected in one pass without a thread blocked per operation.
+"""
+
+import heapq
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from http_session import get_shared_session, parse_retry_after
+
+TERMINAL_STATUSES = {"Succeeded", "Failed", "Canceled"}
+
+
+class LongRunningOperation:
+    """One pending ARM operation and where to poll it"""
+
+    def __init__(self, name, method, url, response):
+        self.name = name
+        self.method = method.upper()
+        self.resource_url = url
+        headers = response.headers or {}
+        self.location_url = headers.get("Location")
+        self.async_url = headers.get("Azure-AsyncOperation")
+        self.status = "InProgress"
+        self.result = None
+        self.error = None
+        self.polls = 0
+        self.started = time.monotonic()
+        self.finished = None
+
+    @property
+    def status_url(self):
+        return self.async_url or self.location_url
+
+    @property
+    def done(self):
+        return self.status != "InProgress"
+
+    @property
+    def succeeded(self):
+        return self.status == "Succeeded"
+
+    def finish(self, status, result=None, error=None):
+        self.status = status
+        self.result = result
+        self.error = error
+        self.finished = time.monotonic()
+
+
+def _json_or_none(response):
+    try:
+        return response.json() if response.content else None
+    except ValueError:
+        return None
+
+
+class LroPoller:
+    def __init__(self, http=None, headers=None, default_interval=5.0, max_interval=60.0,
+                 timeout=1800.0, workers=4):
+        self.http = http or get_shared_session()
+        # A dict, or a callable returning one so tokens stay fresh on long waits
+        self.headers = headers
+        self.default_interval = default_interval
+        self.max_interval = max_interval
+        self.timeout = timeout
+        self.workers = workers
+
+        self.operations = {}
+        self._heap = []
+        self._sequence = itertools.count()
+
+    def _headers(self):
+        return self.headers() if callable(self.headers) else (self.headers or {})
+
+    def _schedule(self, operation, delay):
+        heapq.heappush(self._heap, (time.monotonic() + delay, next(self._sequence), operation))
+
+    def add(self, name, response, method="PUT", url=None):
+        """Track the operation started by `response`; returns its LongRunningOperation
+
+        Responses that are already final (200, or 201 without anything to poll)
+        and errors resolve immediately.
+        """
+        operation = LongRunningOperation(name, method, url or response.url, response)
+        self.operations[name] = operation
+
+        if response.status_code >= 400:
+            operation.finish("Failed", error=_json_or_none(response) or response.text)
+        elif response.status_code in (201, 202) and operation.status_url:
+            self._schedule(operation, self._next_interval(response, self.default_interval))
+        else:
+            operation.finish("Succeeded", result=_json_or_none(response))
+        return operation
+
+    def _next_interval(self, response, fallback):
+        """Retry-After when the server sent one, otherwise the fallback capped at max_interval"""
+        retry_after = parse_retry_after(response.headers)
+        if retry_after is not None:
+            return retry_after
+        return min(fallback, self.max_interval)
+
+    def _get(self, url):
+        return self.http.get(url, headers=self._headers())
+
+    def _final_result(self, operation, status_body):
+        """Fetch the operation's outcome once Azure-AsyncOperation reports success"""
+        if operation.method in ("PUT", "PATCH") and operation.resource_url:
+            response = self._get(operation.resource_url)
+        elif operation.location_url:
+            response = self._get(operation.location_url)
+        else:
+            return status_body
+        if response.status_code >= 400:
+            raise RuntimeError(f"{response.status_code} fetching result: {response.text[:200]}")
+        return _json_or_none(response)
+
+    def poll(self, operation):
+        """Poll once; returns the delay before the next poll, or None once the operation is done"""
+        operation.polls += 1
+        response = self._get(operation.status_url)
+
+        if operation.async_url:
+            body = _json_or_none(response) or {}
+            status = body.get("status", "InProgress") if response.status_code < 400 else "Failed"
+            if status == "Succeeded":
+                operation.finish("Succeeded", result=self._final_result(operation, body))
+                return None
+            if status in TERMINAL_STATUSES:
+                operation.finish(status, error=body.get("error") or response.text)
+                return None
+        else:
+            # Location polling: 202 while running, then the result itself
+            if response.status_code >= 400:
+                operation.finish("Failed", error=_json_or_none(response) or response.text)
+                return None
+            if response.status_code != 202:
+                operation.finish("Succeeded", result=_json_or_none(response))
+                return None
+
+        # Without Retry-After, back off gradually for slow operations
+        return self._next_interval(response, self.default_interval * (1.5 ** min(operation.polls, 10)))
+
+    def _poll_safely(self, operation):
+        try:
+            return self.poll(operation)
+        except Exception as e:
+            # Transient failures are retried on the next tick until the timeout
+            print(f"⚠️ Polling {operation.name} failed: {e}")
+            return self.default_interval
+
+    def run(self):
+        """Poll every pending operation until all are done; returns {name: LongRunningOperation}"""
+        if self._heap:
+            print(f"⏳ Waiting for {len(self._heap)} long-running operation(s)...")
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while self._heap:
+                due_at = self._heap[0][0]
+                delay = due_at - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+                # Poll everything that has come due in one batch
+                now = time.monotonic()
+                due = []
+                while self._heap and self._heap[0][0] <= now:
+                    due.append(heapq.heappop(self._heap)[2])
+
+                for operation, next_delay in zip(due, executor.map(self._poll_safely, due)):
+                    if next_delay is None:
+                        print(f"   {'✅' if operation.succeeded else '❌'} {operation.name}: {operation.status}")
+                    elif now + next_delay - operation.started > self.timeout:
+                        operation.finish("TimedOut", error=f"Still running after {self.timeout:.0f}s")
+                        print(f"   ❌ {operation.name}: timed out")
+                    else:
+                        self._schedule(operation, next_delay)
+
+        return self.operations
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Region migration what-if simulator.
+
+Answers "what if workload X moved from southeastasia to northeurope" for
+every source -> target region pair at once, from the rollup cube of an
+extraction instead of re-running the estimation per scenario. Cost is
+assumed unchanged by a move, so a workload's projected carbon in a target
+region is its cost x service factor x the target's regional factor on each
+usage date (the grid intensity series where configured):
+
+    projected[(group, source), target] = sum over dates of
+        weighted_cost[(group, source), date] * factor[target, date]
+
+which is a single (workloads x dates) @ (dates x targets) matrix product.
+The current carbon is computed the same way with the source region's own
+factors, rather than read from the cube, so savings reflect only the move
+even when the cube was estimated with other factors.
+Workloads are whole source regions, or source regions split by a cube
+dimension such as serviceName or resourceGroup.
+
+Usage:
+    python src/migration_simulator.py ../output/azure_carbon_cube.json
+    python src/migration_simulator.py ../output/azure_carbon_cube.json --by serviceName --where location=southeastasia
+"""
+
+import argparse
+
+import numpy as np
+
+from factor_registry import get_registry
+from rollup_cube import DIMENSIONS, RollupCube, parse_filter
+
+
+class MigrationSimulator:
+    """Projected carbon of every workload in every candidate target region"""
+
+    def __init__(self, cube, registry=None, group_by=None, targets=None, **filters):
+        if group_by in ("location", "date") or (group_by and group_by not in DIMENSIONS):
+            raise ValueError(f"Cannot group migrations by '{group_by}'")
+        self.registry = registry or get_registry()
+        self.group_by = group_by
+        group_position = DIMENSIONS.index(group_by) if group_by else None
+
+        # One pass over the cube's cells into categorical codes for workloads (group, source region),
+        # dates and services; everything after this is array arithmetic
+        workload_index, date_index, service_index = {}, {}, {}
+        workload_codes, date_codes, service_codes = [], [], []
+        cost = []
+        for key, (cell_cost, _, _) in cube.select(**filters):
+            date, service, location = key[0], key[1], key[2]
+            group = key[group_position] if group_by else None
+            workload_codes.append(workload_index.setdefault((group, location), len(workload_index)))
+            date_codes.append(date_index.setdefault(date, len(date_index)))
+            service_codes.append(service_index.setdefault(service, len(service_index)))
+            cost.append(cell_cost)
+
+        self.workloads = list(workload_index)
+        self.dates = list(date_index)
+        sources = sorted({location for _, location in self.workloads})
+        self.targets = list(targets) if targets else self.candidate_regions(sources)
+
+        workload_codes = np.array(workload_codes, dtype=np.int64)
+        date_codes = np.array(date_codes, dtype=np.int64)
+        cost = np.array(cost, dtype=np.float64)
+        service_factor = np.array([self.registry.service_factor(s) for s in service_index],
+                                  dtype=np.float64)[np.array(service_codes, dtype=np.int64)]
+
+        count = len(self.workloads)
+        self.cost = np.bincount(workload_codes, weights=cost, minlength=count)
+        weighted = np.bincount(workload_codes * len(self.dates) + date_codes, weights=cost * service_factor,
+                               minlength=count * len(self.dates)).reshape(count, len(self.dates))
+        self.projected = weighted @ self.target_factors().T
+        # Baseline from the same model: each workload's weighted cost x its own region's factors
+        source_factors = self.region_factors(sources)
+        source_codes = np.array([sources.index(location) for _, location in self.workloads], dtype=np.int64)
+        self.current = (weighted * source_factors[source_codes]).sum(axis=1)
+
+    def candidate_regions(self, sources):
+        """Regions with a static factor or a grid intensity series, plus the current source regions"""
+        regions = {key for key in self.registry.regional_factors if key != "default"} | set(sources)
+        if self.registry.grid_intensity is not None:
+            regions |= set(self.registry.grid_intensity.regions)
+        return sorted(regions)
+
+    def region_factors(self, regions):
+        """(regions x dates) regional factors, from the grid intensity series where it has readings"""
+        static = np.array([self.registry.regional_factor(r) for r in regions], dtype=np.float64)
+        factors = np.repeat(static[:, None], len(self.dates), axis=1)
+        grid = self.registry.grid_intensity
+        if grid is not None and len(regions) and len(self.dates):
+            region_codes = np.repeat(np.arange(len(regions)), len(self.dates))
+            date_codes = np.tile(np.arange(len(self.dates)), len(regions))
+            factors = grid.regional_factors(list(regions), region_codes, self.dates, date_codes,
+                                            factors.ravel()).reshape(factors.shape)
+        return factors
+
+    def target_factors(self):
+        """(targets x dates) regional factors of the candidate target regions"""
+        return self.region_factors(self.targets)
+
+    def savings(self):
+        """(workloads x targets) carbon saved in kg by each move; negative where a move adds carbon"""
+        return self.current[:, None] - self.projected
+
+    def _scenario(self, workload, target):
+        group, source = self.workloads[workload]
+        current = float(self.current[workload])
+        projected = float(self.projected[workload, target])
+        scenario = {
+            "source": source,
+            "target": self.targets[target],
+            "costUSD": round(float(self.cost[workload]), 6),
+            "currentCarbonKg": round(current, 4),
+            "projectedCarbonKg": round(projected, 4),
+            "savingsKg": round(current - projected, 4),
+            "savingsPercent": round((current - projected) / current * 100, 2) if current else 0.0
+        }
+        if self.group_by:
+            scenario = {self.group_by: group, **scenario}
+        return scenario
+
+    def ranked(self, top=None, min_savings_kg=0.0, sources=None, targets=None):
+        """Scenarios with at least `min_savings_kg` saved, largest saving first"""
+        savings = self.savings()
+        allowed = np.ones(savings.shape, dtype=bool)
+        target_names = np.array(self.targets, dtype=object)
+        source_names = np.array([source for _, source in self.workloads], dtype=object)
+        allowed &= source_names[:, None] != target_names[None, :]
+        if sources:
+            allowed &= np.isin(source_names, list(sources))[:, None]
+        if targets:
+            allowed &= np.isin(target_names, list(targets))[None, :]
+        allowed &= savings > min_savings_kg
+
+        workloads, target_codes = np.nonzero(allowed)
+        order = np.argsort(-savings[workloads, target_codes], kind="stable")
+        if top:
+            order = order[:top]
+        return [self._scenario(workloads[i], target_codes[i]) for i in order]
+
+    def scenario(self, source, target, group=None):
+        """One move; ValueError if the workload or target region is not in the simulation"""
+        return self._scenario(self.workloads.index((group if self.group_by else None, source)),
+                              self.targets.index(target))
+
+
+def print_scenarios(scenarios, group_by=None):
+    """Print ranked scenarios as a table"""
+    label = f"{group_by + ': ' if group_by else ''}source -> target"
+    print(f"{label:<60}{'cost USD':>12}{'carbon kg':>12}{'after kg':>12}{'saved kg':>12}{'saved':>8}")
+    for s in scenarios:
+        move = f"{s[group_by] + ': ' if group_by else ''}{s['source']} -> {s['target']}"
+        print(f"{move:<60}{s['costUSD']:>12.2f}{s['currentCarbonKg']:>12.4f}{s['projectedCarbonKg']:>12.4f}"
+              f"{s['savingsKg']:>12.4f}{s['savingsPercent']:>7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rank region migrations by the carbon they would save")
+    parser.add_argument("cube", help="Cube file, e.g. ../output/azure_carbon_cube.json")
+    parser.add_argument("--by", help="Split workloads by a cube dimension, e.g. serviceName or resourceGroup")
+    parser.add_argument("--where", action="append", default=[], type=parse_filter, metavar="DIMENSION=VALUE",
+                        help="Only include cube cells with this dimension value (repeatable)")
+    parser.add_argument("--targets", help="Comma-separated candidate target regions (default: all known)")
+    parser.add_argument("--top", type=int, default=20, help="Number of scenarios to show (default: 20)")
+    parser.add_argument("--factors", help="Carbon factors registry file")
+    parser.add_argument("--grid-intensity", help="Grid intensity series used for the target regions")
+    args = parser.parse_args()
+
+    targets = [t.strip() for t in args.targets.split(",") if t.strip()] if args.targets else None
+    simulator = MigrationSimulator(RollupCube.load(args.cube), get_registry(args.factors, args.grid_intensity),
+                                   args.by, targets, **dict(args.where))
+    print_scenarios(simulator.ranked(top=args.top), args.by)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+Multi-Subscription Carbon Extraction
+Fans the per-subscription extraction out over a bounded worker pool, for an
+explicit list of subscriptions or every subscription under a management group.
+
+Each subscription's results are written to its own partition
+(output/subscriptions/<id>/) and merged into one combined dataset. Requests
+are budgeted per tenant so one large tenant cannot starve the others of ARM
+quota, and the Resource Graph inventory is fetched once for all subscriptions.
+"""
+
+import contextlib
+import csv
+import json
+import os
+import sys
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from azure_carbon_extractor import CUBE_FILENAME, OUTPUT_DIR, AzureCarbonExtractor
+from credentials import MANAGEMENT_SCOPE, get_credential_provider
+from extraction_state import ExtractionState
+from factor_registry import get_registry
+from http_session import BudgetedSession, arm_base_url, get_shared_session, is_local_endpoint, run_metrics
+from streaming_export import ESTIMATE_FIELDS
+
+UNKNOWN_TENANT = "unknown"
+
+
+class MultiSubscriptionExtractor:
+    def __init__(self, subscription_ids=None, management_group=None, max_workers=8,
+                 tenant_budget=4, output_dir="output", http=None, extractor_settings=None):
+        self.subscription_ids = list(subscription_ids or [])
+        self.management_group = management_group
+        self.max_workers = max_workers
+        self.tenant_budget = tenant_budget
+        self.output_dir = output_dir
+        # Applied to every per-subscription AzureCarbonExtractor via configure()
+        self.extractor_settings = dict(extractor_settings or {})
+        if self.extractor_settings.get('incremental') and not self.extractor_settings.get('state'):
+            # One watermark file for all subscriptions rather than one per partition
+            self.extractor_settings['state'] = ExtractionState(os.path.join(output_dir, ".extraction_state.json"))
+        self.http = http or get_shared_session()
+        self.base_url = self.extractor_settings.get('base_url') or arm_base_url()
+        self.credential = None
+        self.token = None
+        self.output_file = os.path.join(output_dir, "azure_carbon_data.json")
+        self.csv_file = os.path.join(output_dir, "azure_carbon_data.csv")
+        self.cube_file = self.extractor_settings.get('cube_file') or os.path.join(output_dir, CUBE_FILENAME)
+        self.parquet_dir = self.extractor_settings.get('parquet_dir') or os.path.join(output_dir, "azure_carbon_parquet")
+
+    def authenticate(self):
+        """Authenticate once; every per-subscription extractor shares the cached credential"""
+        try:
+            self.credential = get_credential_provider()
+            self.token = self.credential.token(MANAGEMENT_SCOPE)
+            print("✅ Azure authentication successful")
+            return True
+        except Exception as e:
+            print(f"❌ Authentication failed: {e}")
+            return False
+
+    def get_headers(self):
+        if self.credential is not None:
+            self.token = self.credential.token(MANAGEMENT_SCOPE)
+        return {
+            "Authorization": f"Bearer {self.token}",
+            "Content-Type": "application/json",
+            "Accept": "application/json"
+        }
+
+    def _get_paged(self, url):
+        """GET an ARM list endpoint, following nextLink"""
+        items = []
+        while url:
+            response = self.http.get(url, headers=self.get_headers())
+            if response.status_code != 200:
+                raise RuntimeError(f"{response.status_code} - {response.text[:200]}")
+            data = response.json()
+            items.extend(data.get('value', []))
+            url = data.get('nextLink')
+        return items
+
+    def list_subscription_tenants(self):
+        """Map every subscription visible to the caller to its tenant ID"""
+        try:
+            subscriptions = self._get_paged(f"{self.base_url}/subscriptions?api-version=2022-12-01")
+            return {s['subscriptionId']: s.get('tenantId', UNKNOWN_TENANT) for s in subscriptions}
+        except Exception as e:
+            print(f"⚠️ Could not list subscriptions, tenant budgets will be shared: {e}")
+            return {}
+
+    def enumerate_management_group(self, management_group):
+        """Return the IDs of all subscriptions below a management group (at any depth)"""
+        url = (f"{self.base_url}/providers/Microsoft.Management/managementGroups/"
+               f"{management_group}/descendants?api-version=2020-05-01")
+        descendants = self._get_paged(url)
+        return [d['name'] for d in descendants
+                if d.get('type', '').lower() == 'microsoft.management/managementgroups/subscriptions']
+
+    def resolve_subscriptions(self):
+        """Combine explicit subscriptions with those enumerated from the management group"""
+        subscription_ids = list(self.subscription_ids)
+        if self.management_group:
+            try:
+                found = self.enumerate_management_group(self.management_group)
+                print(f"✅ Management group '{self.management_group}': {len(found)} subscriptions")
+                subscription_ids.extend(found)
+            except Exception as e:
+                print(f"❌ Could not enumerate management group '{self.management_group}': {e}")
+        # Preserve order, drop duplicates
+        return list(dict.fromkeys(subscription_ids))
+
+    def _collect_shared_inventory(self, subscription_ids):
+        """Fetch the Resource Graph inventory for all subscriptions at once, grouped by subscription"""
+        probe = AzureCarbonExtractor(subscription_id=subscription_ids[0], http=self.http)
+        probe.configure(**self.extractor_settings)
+        probe.credential = self.credential
+        probe.token = self.token
+        try:
+            shards = probe._resource_graph_shards("subscription", subscription_ids)
+            inventory = defaultdict(list)
+            with ThreadPoolExecutor(max_workers=min(probe.resource_workers, len(shards))) as pool:
+                for resources in pool.map(lambda shard: probe._query_resource_graph(*shard), shards):
+                    for resource in resources:
+                        inventory[resource.get('subscriptionId', '').lower()].append(resource)
+            print(f"✅ Shared inventory: {sum(len(r) for r in inventory.values())} resources "
+                  f"across {len(subscription_ids)} subscriptions")
+            return inventory
+        except Exception as e:
+            print(f"⚠️ Shared inventory query failed, querying per subscription: {e}")
+            return None
+
+    def _extract_subscription(self, subscription_id, http, inventory, estimator=None):
+        """Run the extraction for one subscription and write its partition
+        
+        With a ParallelEstimator the subscription's cost pages are estimated
+        and aggregated on its worker processes, one partition per subscription.
+        In streaming mode the estimates go straight to the partition's files
+        and are not returned.
+        """
+        partition_dir = os.path.join(self.output_dir, "subscriptions", subscription_id)
+        os.makedirs(partition_dir, exist_ok=True)
+
+        extractor = AzureCarbonExtractor(subscription_id=subscription_id, http=http)
+        extractor.configure(**self.extractor_settings)
+        extractor.credential = self.credential
+        extractor.token = self.token
+        extractor.output_file = os.path.join(partition_dir, "azure_carbon_data.json")
+        extractor.csv_file = os.path.join(partition_dir, "azure_carbon_data.csv")
+        extractor.cube_file = os.path.join(partition_dir, CUBE_FILENAME)
+        extractor.anomaly_state_file = os.path.join(partition_dir, ".anomaly_state.json")
+        # Every subscription replaces its own partitions of one shared dataset
+        extractor.parquet_dir = self.parquet_dir
+
+        if inventory is not None:
+            resource_data = inventory.get(subscription_id.lower(), [])
+        else:
+            resource_data = extractor.get_resource_data()
+        sustainability_data = extractor.get_sustainability_data()
+
+        estimates_file = None
+        if extractor.streaming and not extractor.incremental:
+            totals = extractor.stream_estimates(resource_data, sustainability_data)
+            success = totals is not None
+            carbon_estimates = []
+            estimates_file = extractor.csv_file if success else None
+        elif estimator is not None:
+            aggregates = extractor.aggregate_cost_data(estimator)
+            success = aggregates is not None
+            carbon_estimates = aggregates.records() if success else []
+            exported = extractor.export_data(None, resource_data, sustainability_data, carbon_estimates,
+                                             cube=aggregates.cube if success else None)
+            success = success and bool(exported)
+        else:
+            cost_data = extractor.get_cost_management_data()
+            success = cost_data is not None
+            carbon_estimates = extractor.calculate_carbon_estimates(cost_data, resource_data)
+            merged_cost_data, carbon_estimates = extractor.merge_incremental(cost_data, carbon_estimates)
+            exported = extractor.export_data(merged_cost_data, resource_data, sustainability_data, carbon_estimates,
+                                             cube=extractor.update_cube(cost_data, merged_cost_data))
+            # A failed export must not move the watermark past the days it didn't write
+            success = success and bool(exported)
+            if success:
+                extractor.advance_watermark(cost_data)
+
+        return {
+            "subscriptionId": subscription_id,
+            "success": success,
+            "anomalies": extractor.last_anomalies,
+            "resourceCount": len(resource_data) if resource_data else 0,
+            "carbonEstimates": carbon_estimates,
+            "dataPointCount": totals["dataPointCount"] if estimates_file else len(carbon_estimates),
+            "estimatesFile": estimates_file,
+            "cube": extractor.cube,
+            "partition": extractor.output_file
+        }
+
+    def export_merged(self, results, failures):
+        """Write the merged dataset and rollup cube across all subscriptions"""
+        from rollup_cube import RollupCube
+
+        cube = RollupCube()
+        carbon_estimates = []
+        anomalies = []
+        by_subscription = {}
+        for result in results:
+            subscription_id = result["subscriptionId"]
+            if result.get("cube") is not None:
+                cube.merge(result["cube"])
+            anomalies.extend(result.get("anomalies", []))
+            estimates = [{"subscriptionId": subscription_id, **e} for e in result["carbonEstimates"]]
+            carbon_estimates.extend(estimates)
+            totals = cube.totals(subscriptionId=subscription_id)
+            by_subscription[subscription_id] = {
+                "totalEstimatedCarbonKg": totals["estimatedCarbonKg"],
+                "totalCostUSD": totals["costUSD"],
+                "resourceCount": result["resourceCount"],
+                "dataPointCount": result["dataPointCount"],
+                "partition": result["partition"]
+            }
+
+        overall = cube.totals()
+        streamed = [result for result in results if result.get("estimatesFile")]
+        anomalies.sort(key=lambda a: abs(a["score"]), reverse=True)
+        merged = {
+            "metadata": {
+                "extractionTime": datetime.now().isoformat(),
+                "subscriptionIds": sorted(by_subscription),
+                "failedSubscriptions": failures,
+                "managementGroup": self.management_group,
+                "dataSource": "Azure Management APIs",
+                "carbonEstimationMethod": "Cost-based with regional and service factors",
+                "carbonFactors": get_registry(self.extractor_settings.get('factors_file'),
+                                             self.extractor_settings.get('grid_intensity_file')).describe(),
+                "runMetrics": run_metrics(self.http),
+                # Streamed subscriptions' estimates are only in the merged CSV
+                "carbonEstimatesFile": os.path.basename(self.csv_file) if streamed else None
+            },
+            "carbonEstimates": carbon_estimates,
+            "anomalies": anomalies,
+            "summary": {
+                "totalEstimatedCarbonKg": overall["estimatedCarbonKg"],
+                "totalCostUSD": overall["costUSD"],
+                "resourceCount": sum(s["resourceCount"] for s in by_subscription.values()),
+                "dataPointCount": sum(s["dataPointCount"] for s in by_subscription.values()),
+                "anomalyCount": len(anomalies),
+                "bySubscription": by_subscription,
+                "rollups": cube.summary("serviceName", "location")
+            }
+        }
+
+        with open(self.output_file, 'w') as f:
+            json.dump(merged, f, indent=2)
+        print(f"✅ Merged data exported to {self.output_file}")
+
+        with open(self.csv_file, 'w', newline='') as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=['subscriptionId'] + ESTIMATE_FIELDS, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(carbon_estimates)
+            # Copied row by row, so streamed estimates never have to fit in memory
+            for result in streamed:
+                with open(result["estimatesFile"], newline='') as partition:
+                    writer.writerows({"subscriptionId": result["subscriptionId"], **row}
+                                     for row in csv.DictReader(partition))
+        print(f"✅ Merged carbon estimates exported to {self.csv_file}")
+
+        cube.save(self.cube_file)
+        print(f"✅ Merged rollup cube ({len(cube.cells)} cells) saved to {self.cube_file}")
+
+        return merged
+
+    def run_extraction(self):
+        """Extract every subscription on the worker pool and merge the results"""
+        print("🌱 Starting Multi-Subscription Carbon Data Extraction")
+        print("=" * 60)
+
+        if getattr(self.http, 'replay', False):
+            print("📼 Replay mode: answering every API call from the response cache")
+        elif is_local_endpoint(self.base_url):
+            print(f"🧪 Using local ARM stand-in at {self.base_url}, skipping authentication")
+        elif not self.authenticate():
+            return False
+
+        subscription_ids = self.resolve_subscriptions()
+        if not subscription_ids:
+            print("❌ No subscriptions to extract. Pass subscription IDs or a management group.")
+            return False
+
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        tenants = self.list_subscription_tenants()
+        budgets = {}
+        sessions = {}
+        for subscription_id in subscription_ids:
+            tenant_id = tenants.get(subscription_id, UNKNOWN_TENANT)
+            if tenant_id not in budgets:
+                budgets[tenant_id] = threading.BoundedSemaphore(self.tenant_budget)
+            sessions[subscription_id] = BudgetedSession(self.http, budgets[tenant_id])
+
+        print(f"🔍 Extracting {len(subscription_ids)} subscriptions across {len(budgets)} tenants "
+              f"({self.max_workers} workers, {self.tenant_budget} requests in flight per tenant)")
+
+        inventory = self._collect_shared_inventory(subscription_ids)
+
+        estimator = None
+        processes = self.extractor_settings.get('estimation_processes') or 0
+        streaming = self.extractor_settings.get('streaming')
+        if streaming and self.extractor_settings.get('incremental'):
+            print("⚠️ Incremental runs merge with the previous output in memory; using the batch pipeline")
+        if processes > 1 and not (streaming or self.extractor_settings.get('incremental')):
+            from parallel_estimation import ParallelEstimator
+            estimator = ParallelEstimator(processes, self.extractor_settings.get('factors_file'),
+                                          self.extractor_settings.get('grid_intensity_file'))
+
+        results = []
+        failures = []
+        with contextlib.ExitStack() as stack, ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            if estimator is not None:
+                stack.enter_context(estimator)
+            futures = {
+                pool.submit(self._extract_subscription, subscription_id, sessions[subscription_id], inventory,
+                            estimator): subscription_id
+                for subscription_id in subscription_ids
+            }
+            for future in as_completed(futures):
+                subscription_id = futures[future]
+                try:
+                    result = future.result()
+                    results.append(result)
+                    if not result["success"]:
+                        failures.append(subscription_id)
+                except Exception as e:
+                    print(f"❌ {subscription_id}: extraction failed: {e}")
+                    failures.append(subscription_id)
+
+        results.sort(key=lambda r: subscription_ids.index(r["subscriptionId"]))
+        merged = self.export_merged(results, sorted(failures))
+
+        print(f"\n🎉 Extracted {len(results) - len(failures)}/{len(subscription_ids)} subscriptions")
+        print(f"📈 Total estimated carbon footprint: {merged['summary']['totalEstimatedCarbonKg']:.2f} kg CO2")
+        print(f"💰 Total cost analyzed: ${merged['summary']['totalCostUSD']:.2f} USD")
+        if failures:
+            print(f"⚠️ Failed subscriptions: {', '.join(sorted(failures))}")
+
+        return len(failures) < len(subscription_ids)
+
+
+def extract_multi_subscription(subscription_ids=None, management_group=None, max_workers=8,
+                               tenant_budget=4, output_dir=OUTPUT_DIR, **settings):
+    """Extract carbon data for many subscriptions and save merged and per-subscription outputs"""
+    try:
+        extractor = MultiSubscriptionExtractor(
+            subscription_ids=subscription_ids,
+            management_group=management_group,
+            max_workers=max_workers,
+            tenant_budget=tenant_budget,
+            output_dir=output_dir,
+            extractor_settings=settings
+        )
+        success = extractor.run_extraction()
+        if success:
+            return True, [extractor.output_file, extractor.csv_file, extractor.cube_file]
+        return False, []
+    except Exception as e:
+        print(f"❌ Multi-subscription extraction failed: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return False, []
+
+
+def main():
+    """Main entry point"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Extract carbon emissions data for many Azure subscriptions')
+    parser.add_argument('--subscriptions', help='Comma-separated subscription IDs')
+    parser.add_argument('--management-group', help='Management group whose subscriptions should be extracted')
+    parser.add_argument('--workers', type=int, default=8, help='Subscriptions extracted in parallel')
+    parser.add_argument('--tenant-budget', type=int, default=4, help='Max concurrent requests per tenant')
+    parser.add_argument('--output-dir', default=OUTPUT_DIR, help='Directory for merged and partitioned output')
+    args = parser.parse_args()
+
+    subscription_ids = [s.strip() for s in (args.subscriptions or '').split(',') if s.strip()]
+    success, _ = extract_multi_subscription(subscription_ids, args.management_group, args.workers,
+                                            args.tenant_budget, args.output_dir)
+    sys.exit(0 if success else 1)
+
+
+if __name__ == "__main__":
+    main()
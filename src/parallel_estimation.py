@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Multi-process carbon estimation and aggregation.
+
+The parent process only fetches Cost Management pages and hands each page's
+raw response body (bytes, exactly as received) to a process pool. Workers
+decode the JSON, estimate the page and pre-aggregate it into rollup cube
+cells (date, service, location, resource group), returning a few compact
+tuples instead of a dict per row. The parent merges these partial aggregates,
+so JSON decoding, estimation and summing all scale with the number of worker
+processes.
+
+Partitions are the units whose pages are merged together: date windows for a
+single subscription, or subscriptions when many are extracted at once.
+
+Workers are started with forkserver (spawn where that is unavailable) rather
+than forked, since the pool is created while subscription and token refresher
+threads may hold locks that a forked child would inherit locked.
+"""
+
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from factor_registry import get_registry
+from rollup_cube import RollupCube, page_cells
+
+_worker_registry = None
+
+
+def _init_worker(factors_file, grid_intensity=None):
+    """Load and compile the factor registry (and grid intensity series) once per worker process"""
+    global _worker_registry
+    _worker_registry = get_registry(factors_file, grid_intensity)
+
+
+def aggregate_page(payload):
+    """Worker entry point: raw Cost Management response body -> (row count, rollup cube cells)"""
+    registry = _worker_registry or get_registry()
+    properties = json.loads(payload).get('properties') or {}
+    rows = properties.get('rows') or []
+    columns = [col['name'] for col in properties.get('columns', [])]
+    return len(rows), page_cells(columns, rows, registry)
+
+
+class PartialAggregates:
+    """Merged worker aggregates of one partition, held as a rollup cube"""
+
+    def __init__(self, registry=None, subscription_id=None):
+        self.registry = registry or get_registry()
+        self.subscription_id = subscription_id
+        self.cube = RollupCube()
+        self.rows = 0
+        self.pages = 0
+
+    def merge(self, partial):
+        rows, cells = partial
+        self.rows += rows
+        self.pages += 1
+        self.cube.add_cells(cells, self.subscription_id)
+
+    def regional_factor(self, location, service_factor, totals):
+        """Static factor, or with a grid intensity series the cost-weighted factor behind the carbon"""
+        if self.registry.grid_intensity is not None and totals["costUSD"] and service_factor:
+            return round(totals["estimatedCarbonKg"] / (totals["costUSD"] * service_factor), 6)
+        return self.registry.regional_factor(location)
+
+    def records(self):
+        """Estimate dicts (the export format), one per date, service and location"""
+        records = []
+        for (date, service, location), totals in sorted(self.cube.rollup("date", "serviceName", "location").items()):
+            service_factor = self.registry.service_factor(service)
+            records.append({
+                "date": date,
+                "serviceName": service,
+                "location": location,
+                "costUSD": totals["costUSD"],
+                "estimatedCarbonKg": totals["estimatedCarbonKg"],
+                "carbonIntensityFactor": service_factor,
+                "regionalFactor": self.regional_factor(location, service_factor, totals)
+            })
+        return records
+
+
+class ParallelEstimator:
+    """Process pool that estimates and pre-aggregates raw Cost Management pages"""
+
+    def __init__(self, processes=None, factors_file=None, grid_intensity=None):
+        self.processes = processes or os.cpu_count() or 1
+        self.factors_file = factors_file
+        self.grid_intensity = grid_intensity
+        self._pool = None
+        # Shared by every aggregate() call, however many threads feed the pool
+        self._slots = threading.BoundedSemaphore(2 * self.processes)
+
+    def __enter__(self):
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        self._pool = ProcessPoolExecutor(max_workers=self.processes, mp_context=context, initializer=_init_worker,
+                                         initargs=(self.factors_file, self.grid_intensity))
+        return self
+
+    def __exit__(self, *exc):
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        return False
+
+    def aggregate(self, payloads, subscription_id=None):
+        """Merge every page of an iterable of raw response bodies into one PartialAggregates
+
+        At most two pages per worker are fetched or in flight across all
+        callers, so fetching (in the calling threads) overlaps with
+        estimation and memory stays bounded.
+        """
+        aggregates = PartialAggregates(get_registry(self.factors_file, self.grid_intensity), subscription_id)
+        pending = []
+        payloads = iter(payloads)
+        while True:
+            # Taken before the page is fetched, released once a worker is done with it
+            self._slots.acquire()
+            try:
+                payload = next(payloads, None)
+                if payload is None:
+                    break
+                future = self._pool.submit(aggregate_page, payload)
+            except BaseException:
+                self._slots.release()
+                raise
+            future.add_done_callback(lambda _: self._slots.release())
+            pending.append(future)
+            while pending and pending[0].done():
+                aggregates.merge(pending.pop(0).result())
+        self._slots.release()
+        for future in pending:
+            aggregates.merge(future.result())
+        return aggregates
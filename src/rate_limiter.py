@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Adaptive client-side rate limiting for Azure Resource Manager.
+
+Every endpoint family (Cost Management, Resource Graph, Microsoft.Carbon,
+plain ARM reads, ...) gets its own token bucket, shared by all threads that
+send through the session. The buckets follow the quota ARM reports back:
+x-ms-ratelimit-remaining-* and x-ms-user-quota-remaining/-resets-after set the
+pace needed to spread what is left over the reset window, healthy responses
+slowly raise the rate again, and a 429 halves it and holds the whole family
+until Retry-After has passed. Fan-out runs stay just under quota instead of
+bursting into lockouts.
+"""
+
+import re
+import threading
+import time
+
+# Starting requests/second for families with tight, well-known quotas
+DEFAULT_RATES = {
+    "microsoft.costmanagement": 1.0,
+    "microsoft.resourcegraph": 3.0,
+}
+
+_PROVIDER = re.compile(r"/providers/(microsoft\.[a-z]+)", re.IGNORECASE)
+
+
+def endpoint_family(url):
+    """Throttling family of an ARM URL, e.g. 'microsoft.costmanagement', or 'arm' for plain reads"""
+    providers = _PROVIDER.findall(url.split("?", 1)[0])
+    return providers[-1].lower() if providers else "arm"
+
+
+class TokenBucket:
+    """Thread-safe token bucket; callers reserve a token and sleep outside the lock"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        """Take a token and return how long (seconds) the caller must wait before using it"""
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens -= 1
+            # A negative balance queues callers behind each other at the current rate
+            return max(0.0, -self.tokens / self.rate)
+
+    def set_rate(self, rate):
+        with self.lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+
+    def hold(self, seconds):
+        """Make the bucket hand out nothing for `seconds`, then resume at its rate"""
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, -seconds * self.rate)
+
+    def available(self):
+        with self.lock:
+            self._refill(time.monotonic())
+            return self.tokens
+
+
+class AdaptiveRateLimiter:
+    """Per-endpoint-family token buckets that adapt to ARM's throttling headers"""
+
+    def __init__(self, initial_rate=10.0, min_rate=0.2, max_rate=50.0, burst=10,
+                 low_water=0.2, increase_step=0.5, decrease_factor=0.5, rates=None):
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.initial_rate = self._clamp(initial_rate)
+        # A burst larger than max_rate would let a fresh family exceed it
+        self.burst = min(burst, max(1, max_rate))
+        # Below this fraction of the largest remaining quota seen, slow down
+        self.low_water = low_water
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.rates = rates if rates is not None else DEFAULT_RATES
+
+        self.lock = threading.Lock()
+        self.families = {}
+
+    def _family(self, url):
+        name = endpoint_family(url)
+        with self.lock:
+            family = self.families.get(name)
+            if family is None:
+                rate = self._clamp(self.rates.get(name, self.initial_rate))
+                family = {
+                    "bucket": TokenBucket(rate, self.burst),
+                    "requests": 0,
+                    "throttled": 0,
+                    "waitedSeconds": 0.0,
+                    "remaining": None,
+                    "peakRemaining": None,
+                    "resetsAfter": None
+                }
+                self.families[name] = family
+            return family
+
+    def _clamp(self, rate):
+        return min(self.max_rate, max(self.min_rate, rate))
+
+    def acquire(self, url):
+        """Block until the URL's endpoint family may send another request; returns the wait"""
+        family = self._family(url)
+        wait = family["bucket"].reserve()
+        with self.lock:
+            family["requests"] += 1
+            family["waitedSeconds"] += wait
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def observe(self, url, status_code, remaining=None, resets_after=None, retry_after=None):
+        """Adapt the family's rate to a response and the quota headers parsed from it"""
+        family = self._family(url)
+        bucket = family["bucket"]
+        hold = None
+
+        with self.lock:
+            rate = bucket.rate
+            if status_code == 429:
+                family["throttled"] += 1
+                rate = self._clamp(rate * self.decrease_factor)
+                hold = retry_after if retry_after is not None else 1.0 / rate
+            elif remaining is not None:
+                family["remaining"] = remaining
+                family["resetsAfter"] = resets_after
+                peak = max(family["peakRemaining"] or 0, remaining)
+                family["peakRemaining"] = peak
+                if resets_after:
+                    # Spread what is left of the quota evenly over the reset window
+                    rate = self._clamp(remaining / resets_after)
+                    if remaining <= 0:
+                        hold = resets_after
+                elif remaining < peak * self.low_water:
+                    rate = self._clamp(rate * self.decrease_factor)
+                else:
+                    rate = self._clamp(rate + self.increase_step)
+
+        if rate != bucket.rate:
+            bucket.set_rate(rate)
+        if hold:
+            bucket.hold(hold)
+
+    def snapshot(self):
+        """Current state of every endpoint family, for run metrics"""
+        with self.lock:
+            families = list(self.families.items())
+        return {
+            name: {
+                "ratePerSecond": round(family["bucket"].rate, 3),
+                "availableTokens": round(family["bucket"].available(), 3),
+                "requests": family["requests"],
+                "throttled": family["throttled"],
+                "waitedSeconds": round(family["waitedSeconds"], 3),
+                "remainingQuota": family["remaining"],
+                "quotaResetsAfter": family["resetsAfter"]
+            }
+            for name, family in sorted(families)
+        }
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Per-resource carbon attribution.
+
+Cost Management reports cost per service, location and resource group, while
+Resource Graph lists the individual resources. The attributor joins the two
+with hash indexes over the inventory instead of scanning it per cost row:
+
+1. Cost rows are summed per distinct (service, location, resource group) in
+   a single pass.
+2. Each distinct combination is resolved once through the factor registry
+   and matched against the inventory index, from most to least specific:
+   group + location + type, then group + type for services that map to a
+   resource type; group + location, then group for the rest.
+3. Each matched bucket's cost and carbon are split evenly across its
+   resources.
+
+Every resource sits in at most four buckets, so the whole join is linear in
+cost rows plus resources.
+"""
+
+from collections import defaultdict
+
+from factor_registry import get_registry
+
+# Match levels, most specific first
+MATCH_LEVELS = ["groupLocationType", "groupType", "groupLocation", "group"]
+
+RESOURCE_FIELDS = ['resourceId', 'name', 'type', 'resourceGroup', 'location', 'subscriptionId',
+                   'costUSD', 'estimatedCarbonKg']
+
+
+class ResourceAttributor:
+    """Joins Cost Management rows to a Resource Graph inventory; feed pages (add_page) or totals (add_totals)"""
+
+    def __init__(self, resources, registry=None):
+        self.registry = registry or get_registry()
+        self.resources = list(resources or [])
+        self._index = {level: defaultdict(list) for level in MATCH_LEVELS}
+        for position, resource in enumerate(self.resources):
+            group = str(resource.get('resourceGroup') or '').lower()
+            location = self.registry.region_key(resource.get('location') or 'unknown')
+            resource_type = str(resource.get('type') or '').lower()
+            self._index["groupLocationType"][(group, location, resource_type)].append(position)
+            self._index["groupType"][(group, resource_type)].append(position)
+            self._index["groupLocation"][(group, location)].append(position)
+            self._index["group"][group].append(position)
+        # (service, location, resource group) -> summed cost, and carbon where it was estimated upstream
+        self._totals = defaultdict(float)
+        self._carbon = defaultdict(float)
+        self.rows = 0
+
+    def add_page(self, columns, rows):
+        """Accumulate one page of cost rows"""
+        group_index = columns.index('ResourceGroupName') if 'ResourceGroupName' in columns else None
+        service_index = columns.index('ServiceName') if 'ServiceName' in columns else None
+        location_index = columns.index('ResourceLocation') if 'ResourceLocation' in columns else None
+        cost_index = columns.index('CostUSD') if 'CostUSD' in columns else None
+        if cost_index is None:
+            return
+
+        totals = self._totals
+        for row in rows:
+            key = (row[service_index] if service_index is not None else 'Unknown',
+                   row[location_index] if location_index is not None else 'unknown',
+                   row[group_index] if group_index is not None else '')
+            totals[key] += float(row[cost_index])
+        self.rows += len(rows)
+
+    def add_totals(self, totals, rows=0, carbon=None):
+        """Accumulate pre-aggregated {(service, location, resource group): cost} totals
+        
+        `carbon` holds already estimated carbon for the same keys (e.g. from
+        time-varying grid intensity); other keys are estimated from the
+        registry's static factors.
+        """
+        for key, cost in totals.items():
+            self._totals[key] += cost
+        for key, value in (carbon or {}).items():
+            self._carbon[key] += value
+        self.rows += rows
+
+    def _match(self, service, location, group):
+        """(level, bucket key) of the most specific non-empty inventory bucket, or (None, None)"""
+        group = str(group or '').lower()
+        if not group:
+            return None, None
+        region = self.registry.region_key(location)
+        service_key = self.registry.service_key(service)
+        if service_key:
+            candidates = [("groupLocationType", (group, region, service_key.lower())),
+                          ("groupType", (group, service_key.lower()))]
+        else:
+            candidates = [("groupLocation", (group, region)), ("group", group)]
+        for level, key in candidates:
+            if key in self._index[level]:
+                return level, key
+        return None, None
+
+    def results(self):
+        """{"resources": [...], "summary": {...}} with per-resource cost and carbon, highest carbon first"""
+        bucket_cost = defaultdict(float)
+        bucket_carbon = defaultdict(float)
+        unattributed_cost = 0.0
+        unattributed_carbon = 0.0
+        cost_by_level = dict.fromkeys(MATCH_LEVELS, 0.0)
+
+        for (service, location, group), cost in self._totals.items():
+            if (service, location, group) in self._carbon:
+                carbon = self._carbon[(service, location, group)]
+            else:
+                carbon = cost * self.registry.service_factor(service) * self.registry.regional_factor(location)
+            level, key = self._match(service, location, group)
+            if level is None:
+                unattributed_cost += cost
+                unattributed_carbon += carbon
+                continue
+            bucket_cost[(level, key)] += cost
+            bucket_carbon[(level, key)] += carbon
+            cost_by_level[level] += cost
+
+        resource_cost = defaultdict(float)
+        resource_carbon = defaultdict(float)
+        for bucket, cost in bucket_cost.items():
+            level, key = bucket
+            members = self._index[level][key]
+            cost_share = cost / len(members)
+            carbon_share = bucket_carbon[bucket] / len(members)
+            for position in members:
+                resource_cost[position] += cost_share
+                resource_carbon[position] += carbon_share
+
+        estimates = []
+        for position, cost in resource_cost.items():
+            resource = self.resources[position]
+            estimates.append({
+                "resourceId": resource.get('id'),
+                "name": resource.get('name'),
+                "type": resource.get('type'),
+                "resourceGroup": resource.get('resourceGroup'),
+                "location": resource.get('location'),
+                "subscriptionId": resource.get('subscriptionId'),
+                "costUSD": round(cost, 6),
+                "estimatedCarbonKg": round(resource_carbon[position], 4)
+            })
+        estimates.sort(key=lambda e: e["estimatedCarbonKg"], reverse=True)
+
+        return {
+            "resources": estimates,
+            "summary": {
+                "costRows": self.rows,
+                "inventoryResources": len(self.resources),
+                "attributedResources": len(estimates),
+                "attributedCostUSD": round(sum(resource_cost.values()), 6),
+                "attributedCarbonKg": round(sum(resource_carbon.values()), 4),
+                "unattributedCostUSD": round(unattributed_cost, 6),
+                "unattributedCarbonKg": round(unattributed_carbon, 4),
+                "costUSDByMatch": {level: round(cost, 6) for level, cost in cost_by_level.items()}
+            }
+        }
+
+
+def attribute_to_resources(pages, resources, registry=None):
+    """Per-resource estimates for an iterable of Cost Management pages"""
+    attributor = ResourceAttributor(resources, registry)
+    for page in pages:
+        attributor.add_page([col['name'] for col in page.get('columns', [])], page.get('rows', []))
+    return attributor.results()
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+On-disk cache of Azure API responses.
+
+Entries are content-addressed by (method, URL, body hash, subscription) and
+expire after a per-endpoint TTL; the least recently used entries are evicted
+once the cache grows past its size limit. In replay mode nothing goes to the
+network: the whole pipeline runs from previously cached responses.
+"""
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+import requests
+
+# Per-endpoint time-to-live in seconds, matched against the lower-cased URL
+DEFAULT_TTLS = [
+    ("microsoft.costmanagement/query", 6 * 3600),
+    ("microsoft.resourcegraph/resources", 3600),
+    ("microsoft.advisor/", 24 * 3600),
+    ("microsoft.resourcehealth/", 15 * 60),
+    ("microsoft.insights/workbooks", 24 * 3600),
+    ("microsoft.carbon/", 6 * 3600),
+    ("microsoft.management/managementgroups", 24 * 3600),
+    ("/resources?", 3600),
+    ("/subscriptions?", 24 * 3600),
+]
+
+# Only read operations are cached; exports and other writes always go to Azure
+CACHEABLE_METHODS = {"GET", "POST"}
+
+# Long-running operation status and result URLs change answer while they are polled
+_OPERATION_URL = re.compile(r"/(operations|operationstatus(es)?|operationresults)/|asyncoperation")
+
+_SUBSCRIPTION_IN_URL = re.compile(r"/subscriptions/([0-9a-fA-F-]{36})", re.IGNORECASE)
+
+
+def _subscription_of(url, body):
+    """Subscription a request is scoped to, from the URL or a Resource Graph body"""
+    match = _SUBSCRIPTION_IN_URL.search(url)
+    if match:
+        return match.group(1).lower()
+    if isinstance(body, dict) and body.get("subscriptions"):
+        return ",".join(sorted(s.lower() for s in body["subscriptions"]))
+    return ""
+
+
+def _body_hash(body):
+    if body is None:
+        return ""
+    encoded = json.dumps(body, sort_keys=True, separators=(",", ":")).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024, ttls=None, replay=False):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttls = ttls if ttls is not None else DEFAULT_TTLS
+        self.replay = replay
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+        os.makedirs(directory, exist_ok=True)
+        self.total_bytes = sum(size for _, size, _ in self._entries())
+
+    def ttl_for(self, url):
+        """TTL for a URL, or None if responses from it should not be cached"""
+        lower = url.lower()
+        if _OPERATION_URL.search(lower):
+            return None
+        for pattern, ttl in self.ttls:
+            if pattern in lower:
+                return ttl
+        return None
+
+    def _key(self, method, url, body, subscription):
+        material = "\n".join([method.upper(), url, _body_hash(body), subscription])
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _loose_path(self, method, url, subscription):
+        # Latest response for a URL regardless of body, used when replaying on a later day
+        key = self._key(method, url, None, subscription)
+        return os.path.join(self.directory, "latest", f"{key}.json")
+
+    def _entries(self):
+        """(path, size, last used) for every cached response"""
+        for root, _, files in os.walk(self.directory):
+            if os.path.basename(root) == "latest":
+                continue
+            for name in files:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    stat = os.stat(path)
+                    yield path, stat.st_size, stat.st_mtime
+
+    def _read(self, path, allow_expired):
+        try:
+            with open(path, "r") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not allow_expired and time.time() - entry["storedAt"] > entry["ttl"]:
+            return None
+        # Touch the entry so eviction sees it as recently used
+        os.utime(path)
+        return entry
+
+    def lookup(self, method, url, body=None):
+        """Cached requests.Response for the request, or None on a miss"""
+        if method.upper() not in CACHEABLE_METHODS or self.ttl_for(url) is None:
+            return None
+
+        subscription = _subscription_of(url, body)
+        entry = self._read(self._path(self._key(method, url, body, subscription)), allow_expired=self.replay)
+        if entry is None and self.replay:
+            try:
+                with open(self._loose_path(method, url, subscription), "r") as f:
+                    key = f.read().strip()
+                entry = self._read(self._path(key), allow_expired=True)
+                if entry is not None:
+                    print(f"⚠️ Replaying the latest cached response for {url.split('?', 1)[0]} (request body differs)")
+            except OSError:
+                entry = None
+
+        with self.lock:
+            self.stats["hits" if entry else "misses"] += 1
+        return _to_response(entry, url) if entry else None
+
+    def store(self, method, url, body, response):
+        """Cache a successful response from a cacheable endpoint"""
+        ttl = self.ttl_for(url)
+        if method.upper() not in CACHEABLE_METHODS or ttl is None or response.status_code != 200:
+            return
+
+        subscription = _subscription_of(url, body)
+        key = self._key(method, url, body, subscription)
+        entry = {
+            "storedAt": time.time(),
+            "ttl": ttl,
+            "method": method.upper(),
+            "url": url,
+            "subscription": subscription,
+            "status": response.status_code,
+            "headers": {"Content-Type": response.headers.get("Content-Type", "application/json")},
+            "body": response.text
+        }
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        previous_size = os.path.getsize(path) if os.path.exists(path) else 0
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump(entry, f)
+        os.replace(temp_path, path)
+
+        loose_path = self._loose_path(method, url, subscription)
+        os.makedirs(os.path.dirname(loose_path), exist_ok=True)
+        with open(loose_path, "w") as f:
+            f.write(key)
+
+        with self.lock:
+            self.stats["stores"] += 1
+            self.total_bytes += os.path.getsize(path) - previous_size
+            over_limit = self.total_bytes > self.max_bytes
+        if over_limit:
+            self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        with self.lock:
+            entries = sorted(self._entries(), key=lambda entry: entry[2])
+            total = sum(size for _, size, _ in entries)
+            # Evict down to 90% so every store doesn't trigger another scan
+            target = self.max_bytes * 0.9
+            for path, size, _ in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                    self.stats["evictions"] += 1
+                except OSError:
+                    pass
+            self.total_bytes = total
+
+    def miss_response(self, method, url):
+        """Response returned in replay mode when nothing was cached for a request"""
+        return _to_response({
+            "status": 404,
+            "headers": {"Content-Type": "application/json"},
+            "body": json.dumps({"error": {"code": "ReplayCacheMiss",
+                                          "message": f"No cached response for {method} {url}"}})
+        }, url)
+
+
+def _to_response(entry, url):
+    response = requests.Response()
+    response.status_code = entry["status"]
+    response.headers.update(entry.get("headers", {}))
+    response._content = entry["body"].encode("utf-8")
+    response.encoding = "utf-8"
+    response.url = url
+    response.from_cache = True
+    return response
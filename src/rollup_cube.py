@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Rollup cube of cost and carbon.
+
+A materialised aggregation of the estimates over date x service x location x
+resource group x subscription. Pages of cost rows are folded in as they
+arrive (one vectorised group-by per page), incremental runs replace only the
+re-queried dates, and the cube is persisted next to the outputs. Totals,
+roll-ups ("carbon by service") and drill-downs ("by resource group, within
+eastus") are answered from the cells, so they cost O(cells) instead of
+O(rows).
+
+Usage:
+    python src/rollup_cube.py ../output/azure_carbon_cube.json --by serviceName
+    python src/rollup_cube.py ../output/azure_carbon_cube.json --by resourceGroup --where location=eastus
+"""
+
+import argparse
+import json
+import os
+from collections import defaultdict
+
+from cube_filters import parse_filter
+from estimation import HAVE_NUMPY, column, estimate_page_columns, estimate_rows, factorize, np
+from factor_registry import get_registry
+
+DIMENSIONS = ("date", "serviceName", "location", "resourceGroup", "subscriptionId")
+MEASURES = ("costUSD", "estimatedCarbonKg", "rows")
+CUBE_VERSION = 1
+
+
+def page_cells(columns, rows, registry=None):
+    """Cells of one page of cost rows: (date, service, location, resource group, cost, carbon, rows)"""
+    registry = registry or get_registry()
+    if not rows:
+        return []
+    if not HAVE_NUMPY:
+        groups = column(columns, rows, 'ResourceGroupName', '')
+        totals = defaultdict(lambda: [0.0, 0.0, 0])
+        for estimate, group in zip(estimate_rows(columns, rows, registry), groups):
+            cell = totals[(estimate["date"], estimate["serviceName"], estimate["location"], group)]
+            cell[0] += estimate["costUSD"]
+            cell[1] += estimate["estimatedCarbonKg"]
+            cell[2] += 1
+        return [key + tuple(values) for key, values in totals.items()]
+
+    page = estimate_page_columns(columns, rows, registry)
+    group_codes, groups = factorize(column(columns, rows, 'ResourceGroupName', ''))
+    spans = (len(page["services"]), len(page["locations"]), len(groups))
+    key = page["dateCode"].astype(np.int64)
+    for codes, span in zip((page["serviceCode"], page["locationCode"], group_codes), spans):
+        key = key * span + codes
+
+    keys, inverse = np.unique(key, return_inverse=True)
+    cost = np.bincount(inverse, weights=page["cost"]).tolist()
+    carbon = np.bincount(inverse, weights=page["carbon"]).tolist()
+    counts = np.bincount(inverse).tolist()
+    cells = []
+    for key, cell_cost, cell_carbon, count in zip(keys.tolist(), cost, carbon, counts):
+        key, group = divmod(key, spans[2])
+        key, location = divmod(key, spans[1])
+        date, service = divmod(key, spans[0])
+        cells.append((page["dates"][date], page["services"][service], page["locations"][location],
+                      groups[group], cell_cost, cell_carbon, count))
+    return cells
+
+
+class RollupCube:
+    """Cost, carbon and row count per (date, service, location, resource group, subscription) cell"""
+
+    def __init__(self):
+        self.cells = {}
+
+    def add(self, key, cost, carbon, rows=1):
+        cell = self.cells.get(key)
+        if cell is None:
+            self.cells[key] = [cost, carbon, rows]
+        else:
+            cell[0] += cost
+            cell[1] += carbon
+            cell[2] += rows
+
+    def add_cells(self, cells, subscription_id=None):
+        """Fold in page_cells() output for one subscription"""
+        subscription_id = subscription_id or ""
+        for date, service, location, group, cost, carbon, rows in cells:
+            self.add((date, service, location, group or "", subscription_id), cost, carbon, rows)
+
+    def add_page(self, columns, rows, subscription_id=None, registry=None):
+        self.add_cells(page_cells(columns, rows, registry), subscription_id)
+
+    def merge(self, other):
+        for key, (cost, carbon, rows) in other.cells.items():
+            self.add(key, cost, carbon, rows)
+        return self
+
+    def drop_since(self, since, subscription_id=None):
+        """Remove the cells dated `since` (YYYY-MM-DD) or later, for one subscription or all"""
+        for key in [k for k in self.cells
+                    if k[0] >= since and (subscription_id is None or k[4] == (subscription_id or ""))]:
+            del self.cells[key]
+
+    def _matches(self, key, filters):
+        return all(key[DIMENSIONS.index(dim)] == value for dim, value in filters.items())
+
+    def select(self, **filters):
+        """(key, [cost, carbon, rows]) for the cells matching DIMENSION=VALUE filters"""
+        unknown = [d for d in filters if d not in DIMENSIONS]
+        if unknown:
+            raise ValueError(f"Unknown cube dimensions: {', '.join(unknown)} (expected {', '.join(DIMENSIONS)})")
+        if not filters:
+            return self.cells.items()
+        return ((key, cell) for key, cell in self.cells.items() if self._matches(key, filters))
+
+    def rollup(self, *dimensions, **filters):
+        """{(values of `dimensions`): {"costUSD", "estimatedCarbonKg", "rows"}} over the matching cells
+
+        rollup("serviceName") totals by service; adding filters drills down,
+        e.g. rollup("resourceGroup", location="eastus").
+        """
+        unknown = [d for d in dimensions if d not in DIMENSIONS]
+        if unknown:
+            raise ValueError(f"Unknown cube dimensions: {', '.join(unknown)} (expected {', '.join(DIMENSIONS)})")
+        positions = [DIMENSIONS.index(d) for d in dimensions]
+        result = defaultdict(lambda: [0.0, 0.0, 0])
+        for key, (cost, carbon, rows) in self.select(**filters):
+            totals = result[tuple(key[p] for p in positions)]
+            totals[0] += cost
+            totals[1] += carbon
+            totals[2] += rows
+        return {group: dict(zip(MEASURES, (cost, round(carbon, 4), rows)))
+                for group, (cost, carbon, rows) in result.items()}
+
+    def totals(self, **filters):
+        """{"costUSD", "estimatedCarbonKg", "rows"} over the matching cells"""
+        return self.rollup(**filters).get((), dict(zip(MEASURES, (0.0, 0.0, 0))))
+
+    def summary(self, *dimensions):
+        """Roll-ups keyed by dimension for the export metadata, e.g. {"serviceName": {"Storage": {...}}}"""
+        return {dim: {group[0]: totals for group, totals in sorted(self.rollup(dim).items())}
+                for dim in dimensions}
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump({
+                "version": CUBE_VERSION,
+                "dimensions": list(DIMENSIONS),
+                "measures": list(MEASURES),
+                "cells": [list(key) + [cost, carbon, rows] for key, (cost, carbon, rows) in sorted(self.cells.items())]
+            }, f, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, path):
+        """Cube persisted with save(); an empty cube if the file is missing or unreadable"""
+        cube = cls()
+        if not os.path.exists(path):
+            return cube
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Could not read rollup cube {path}: {e}")
+            return cube
+        if data.get("version") != CUBE_VERSION:
+            print(f"⚠️ Ignoring rollup cube {path} with version {data.get('version')}")
+            return cube
+        for cell in data.get("cells", []):
+            cube.cells[tuple(cell[:len(DIMENSIONS)])] = list(cell[len(DIMENSIONS):])
+        return cube
+
+
+def print_rollup(cube, by="serviceName", where=()):
+    """Print a roll-up table, highest carbon first
+    
+    `by` is a comma-separated list of dimensions and `where` holds
+    (dimension, value) filters, as parsed by parse_filter().
+    """
+    dimensions = [d.strip() for d in by.split(",") if d.strip()]
+    rows = cube.rollup(*dimensions, **dict(where))
+
+    print(f"{' / '.join(dimensions):<60}{'cost USD':>14}{'carbon kg':>14}{'rows':>10}")
+    for group, totals in sorted(rows.items(), key=lambda item: item[1]["estimatedCarbonKg"], reverse=True):
+        print(f"{' / '.join(str(v) for v in group):<60}{totals['costUSD']:>14.2f}"
+              f"{totals['estimatedCarbonKg']:>14.4f}{totals['rows']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Roll up or drill down a persisted carbon rollup cube")
+    parser.add_argument("cube", help="Cube file, e.g. ../output/azure_carbon_cube.json")
+    parser.add_argument("--by", default="serviceName",
+                        help=f"Comma-separated dimensions out of {','.join(DIMENSIONS)} (default: serviceName)")
+    parser.add_argument("--where", action="append", default=[], type=parse_filter, metavar="DIMENSION=VALUE",
+                        help="Only include cells with this dimension value (repeatable)")
+    args = parser.parse_args()
+
+    print_rollup(RollupCube.load(args.cube), args.by, args.where)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Streaming export of carbon estimates.
+
+Writes estimates to CSV and NDJSON as each page of cost rows is estimated,
+keeping running totals instead of the full estimate list, so memory stays
+flat no matter how many rows a subscription produces. Files are written
+under a temporary name and only replace the previous output once the whole
+stream has been written, so a failed run never leaves a truncated export.
+"""
+
+import csv
+import json
+import os
+
+ESTIMATE_FIELDS = ['date', 'serviceName', 'location', 'costUSD', 'estimatedCarbonKg',
+                   'carbonIntensityFactor', 'regionalFactor']
+
+
+class StreamingExport:
+    """Incremental CSV and NDJSON writers for carbon estimates, with totals kept on the fly"""
+
+    def __init__(self, csv_path, ndjson_path):
+        self.csv_path = csv_path
+        self.ndjson_path = ndjson_path
+        self.totals = {
+            "totalEstimatedCarbonKg": 0.0,
+            "totalCostUSD": 0.0,
+            "dataPointCount": 0,
+            "pageCount": 0,
+            "firstDate": None,
+            "lastDate": None
+        }
+        self._csv_file = None
+        self._ndjson_file = None
+        self._writer = None
+
+    def __enter__(self):
+        self._csv_file = open(self.csv_path + ".tmp", 'w', newline='')
+        self._ndjson_file = open(self.ndjson_path + ".tmp", 'w')
+        self._writer = csv.DictWriter(self._csv_file, fieldnames=ESTIMATE_FIELDS, extrasaction='ignore')
+        self._writer.writeheader()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._csv_file.close()
+        self._ndjson_file.close()
+        for path in (self.csv_path, self.ndjson_path):
+            if exc_type is None:
+                os.replace(path + ".tmp", path)
+            else:
+                os.remove(path + ".tmp")
+        return False
+
+    def write(self, estimates):
+        """Append one page of estimates to both files and fold it into the totals"""
+        if not estimates:
+            return
+        self._writer.writerows(estimates)
+        self._ndjson_file.writelines(json.dumps(e, separators=(',', ':')) + "\n" for e in estimates)
+
+        totals = self.totals
+        totals["totalEstimatedCarbonKg"] += sum(e['estimatedCarbonKg'] for e in estimates)
+        totals["totalCostUSD"] += sum(e['costUSD'] for e in estimates)
+        totals["dataPointCount"] += len(estimates)
+        totals["pageCount"] += 1
+        dates = [e['date'] for e in estimates if e['date']]
+        if dates:
+            first, last = min(dates), max(dates)
+            totals["firstDate"] = min(totals["firstDate"] or first, first)
+            totals["lastDate"] = max(totals["lastDate"] or last, last)
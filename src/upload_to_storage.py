@@ -1,11 +1,12 @@
-from azure.storage.blob import BlobServiceClient, ContainerClient
-from azure.identity import DefaultAzureCredential
-from azure.core.exceptions import ResourceExistsError
 import os
 import sys
 
+from credentials import get_credential_provider
+
 def ensure_container_exists(blob_service_client, container_name):
     """Create container if it doesn't exist"""
+    from azure.core.exceptions import ResourceExistsError
+    
     try:
         container_client = blob_service_client.get_container_client(container_name)
         container_client.get_container_properties()
@@ -39,8 +40,10 @@ def upload_to_azure_storage(local_file_path, storage_account_name, container_nam
         blob_name = os.path.basename(local_file_path)
     
     try:
-        # Use DefaultAzureCredential for authentication
-        credential = DefaultAzureCredential()
+        from azure.storage.blob import BlobServiceClient
+        
+        # Shared, token-caching credential: the chain is walked once, not once per file
+        credential = get_credential_provider()
         
         # Create BlobServiceClient
         account_url = f"https://{storage_account_name}.blob.core.windows.net"
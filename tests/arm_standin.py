@@ -0,0 +1,440 @@
+#!/usr/bin/env python3
+"""
+Local ARM Stand-in
+A small HTTP server that answers the management.azure.com calls this project
+makes - Cost Management query, Resource Graph, the resources list, Advisor,
+Resource Health, workbooks, subscriptions, management groups and
+Microsoft.Carbon (query, insights, exports) - so the extractors can be
+exercised and benchmarked on a machine with no network or subscription.
+
+Responses are replayed from a recorded response cache (the `--cache`
+directory of main.py) when a matching entry exists, and synthesised
+otherwise: deterministic N-rows-per-day cost data, a configurable resource
+inventory, and paging through nextLink/$skipToken exactly like ARM. Latency
+and 429 throttling can be injected to test retries and rate limiting.
+
+Usage:
+    python tests/arm_standin.py --port 8080 --rows-per-day 1000 --latency 0.05 --throttle-rate 0.05
+    AZURE_SUBSCRIPTION_ID=00000000-0000-0000-0000-000000000001 \\
+        python main.py --extract --arm-url http://127.0.0.1:8080
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+DEFAULT_SUBSCRIPTION = "00000000-0000-0000-0000-000000000001"
+DEFAULT_TENANT = "00000000-0000-0000-0000-0000000000aa"
+RECORDED_BASE_URL = "https://management.azure.com"
+
+SERVICES = ["Virtual Machines", "Storage", "Azure App Service", "SQL Database", "Azure Kubernetes Service",
+            "Azure Cosmos DB", "Bandwidth", "Azure DNS", "Azure Monitor", "Load Balancer"]
+LOCATIONS = ["eastus", "westus", "northeurope", "westeurope", "southeastasia", "US East", "EU West", "unknown"]
+RESOURCE_TYPES = ["Microsoft.Compute/virtualMachines", "Microsoft.Storage/storageAccounts",
+                  "Microsoft.ContainerService/managedClusters", "Microsoft.Sql/servers",
+                  "Microsoft.Web/serverFarms", "Microsoft.DBforPostgreSQL/servers",
+                  "Microsoft.Network/loadBalancers"]
+
+COST_COLUMNS = [
+    {"name": "Cost", "type": "Number"},
+    {"name": "CostUSD", "type": "Number"},
+    {"name": "UsageDate", "type": "Number"},
+    {"name": "ServiceName", "type": "String"},
+    {"name": "ResourceLocation", "type": "String"},
+    {"name": "ResourceGroupName", "type": "String"},
+    {"name": "Currency", "type": "String"},
+]
+CARBON_COLUMNS = [
+    {"name": "UsageQuantity", "type": "Number"},
+    {"name": "UsageDate", "type": "Number"},
+    {"name": "ResourceGroupName", "type": "String"},
+    {"name": "ResourceType", "type": "String"},
+    {"name": "ResourceLocation", "type": "String"},
+]
+
+
+def _period(body, default_days=30):
+    """(start, end) dates of a query body's timePeriod, or the last `default_days` days"""
+    period = (body or {}).get("timePeriod")
+    if period:
+        return (datetime.strptime(period["from"][:10], "%Y-%m-%d"),
+                datetime.strptime(period["to"][:10], "%Y-%m-%d"))
+    end = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return end - timedelta(days=default_days - 1), end
+
+
+class ArmStandIn:
+    """Threaded local stand-in for management.azure.com; use as a context manager or start()/stop()"""
+
+    def __init__(self, host="127.0.0.1", port=0, rows_per_day=100, page_size=5000, resources=200,
+                 resource_groups=20, subscriptions=None, latency=0.0, throttle_rate=0.0,
+                 throttle_retry_after=1, fixtures_dir=None, seed=42):
+        self.host = host
+        self.port = port
+        self.rows_per_day = rows_per_day
+        self.page_size = page_size
+        self.resources = resources
+        self.resource_groups = resource_groups
+        self.subscriptions = list(subscriptions or [DEFAULT_SUBSCRIPTION])
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.throttle_retry_after = throttle_retry_after
+        self.fixtures = None
+        if fixtures_dir:
+            from response_cache import ResponseCache
+            self.fixtures = ResponseCache(fixtures_dir, replay=True)
+
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "throttled": 0, "replayed": 0, "routes": {}}
+        self.operations = {}
+        self.server = None
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.server.server_address[1]}"
+
+    def start(self):
+        standin = self
+
+        class Handler(ArmRequestHandler):
+            server_state = standin
+
+        self.server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05},
+                                       name="arm-standin", daemon=True)
+        self.thread.start()
+        return self.url
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # --- request bookkeeping and fault injection ---
+
+    def count(self, route):
+        with self.lock:
+            self.stats["requests"] += 1
+            self.stats["routes"][route] = self.stats["routes"].get(route, 0) + 1
+
+    def should_throttle(self):
+        with self.lock:
+            throttled = self.throttle_rate > 0 and self.random.random() < self.throttle_rate
+            if throttled:
+                self.stats["throttled"] += 1
+            return throttled
+
+    def replay(self, method, path_and_query, body):
+        """Recorded response for the request, as (status, headers, text), or None"""
+        if self.fixtures is None:
+            return None
+        response = self.fixtures.lookup(method, RECORDED_BASE_URL + path_and_query, body)
+        if response is None:
+            return None
+        with self.lock:
+            self.stats["replayed"] += 1
+        return response.status_code, dict(response.headers), response.text
+
+    # --- synthetic responses ---
+
+    def cost_rows(self, start, end, offset, limit):
+        """Rows [offset, offset + limit) of the deterministic cost result for the period"""
+        total = ((end - start).days + 1) * self.rows_per_day
+        rows = []
+        for index in range(offset, min(offset + limit, total)):
+            day_index, j = divmod(index, self.rows_per_day)
+            day = start + timedelta(days=day_index)
+            cost = 0.01 + ((j * 7919 + day.toordinal() * 104729) % 100000) / 1000.0
+            rows.append([
+                cost,
+                cost,
+                int(day.strftime("%Y%m%d")),
+                SERVICES[j % len(SERVICES)],
+                LOCATIONS[(j // len(SERVICES)) % len(LOCATIONS)],
+                f"rg-{j % self.resource_groups}",
+                "USD"
+            ])
+        return rows, offset + limit < total
+
+    def resource(self, index, subscription_id):
+        resource_type = RESOURCE_TYPES[index % len(RESOURCE_TYPES)]
+        group = f"rg-{index % self.resource_groups}"
+        name = f"res-{index}"
+        return {
+            "id": f"/subscriptions/{subscription_id}/resourceGroups/{group}/providers/{resource_type}/{name}",
+            "name": name,
+            "type": resource_type,
+            "location": LOCATIONS[index % 5],
+            "resourceGroup": group,
+            "subscriptionId": subscription_id,
+            "tags": {"env": "bench"} if index % 3 == 0 else {}
+        }
+
+    def carbon_rows(self, body, offset, limit):
+        start, end = _period(body)
+        dimension_filter = body.get("dataset", {}).get("filter", {}).get("dimensions", {})
+        groups = dimension_filter.get("values") or [f"rg-{i}" for i in range(self.resource_groups)]
+        per_day = len(groups) * len(RESOURCE_TYPES)
+        total = ((end - start).days + 1) * per_day
+        rows = []
+        for index in range(offset, min(offset + limit, total)):
+            day_index, j = divmod(index, per_day)
+            day = start + timedelta(days=day_index)
+            group = groups[j // len(RESOURCE_TYPES)]
+            resource_type = RESOURCE_TYPES[j % len(RESOURCE_TYPES)]
+            rows.append([round(0.001 * (1 + (index * 31) % 997), 6), int(day.strftime("%Y%m%d")),
+                         group, resource_type.lower(), LOCATIONS[j % 5]])
+        return rows, offset + limit < total
+
+
+class ArmRequestHandler(BaseHTTPRequestHandler):
+    server_state = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        # Keep benchmark and test output quiet
+        pass
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return None
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            return None
+
+    def _send(self, status, payload=None, headers=None, text=None):
+        data = (text if text is not None else json.dumps(payload if payload is not None else {})).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("x-ms-ratelimit-remaining-subscription-reads", "11999")
+        for name, value in (headers or {}).items():
+            if name.lower() not in ("content-type", "content-length"):
+                self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self, method):
+        state = self.server_state
+        body = self._body() if method in ("POST", "PUT") else None
+        parts = urlsplit(self.path)
+        path = parts.path.lower()
+        query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        route = _route(method, path)
+        state.count(route)
+
+        if state.latency:
+            time.sleep(state.latency)
+        if state.should_throttle():
+            return self._send(429, {"error": {"code": "TooManyRequests", "message": "Rate limit exceeded"}},
+                              {"Retry-After": str(state.throttle_retry_after)})
+
+        recorded = state.replay(method, self.path, body)
+        if recorded is not None:
+            status, headers, text = recorded
+            return self._send(status, headers=headers, text=text)
+
+        handler = getattr(self, f"_{route}", None)
+        if handler is None:
+            return self._send(404, {"error": {"code": "NotFound", "message": f"No stand-in for {method} {parts.path}"}})
+        try:
+            handler(body, query, parts)
+        except Exception as e:
+            self._send(500, {"error": {"code": "InternalServerError", "message": str(e)}})
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_PUT(self):
+        self._handle("PUT")
+
+    # --- routes ---
+
+    def _next_link(self, parts, skip_token):
+        base = f"http://{self.headers.get('Host')}{parts.path}"
+        query = re.sub(r"&?(?:\$|%24)skiptoken=[^&]*", "", parts.query, flags=re.IGNORECASE)
+        return f"{base}?{query}&$skiptoken={skip_token}"
+
+    def _cost_query(self, body, query, parts):
+        state = self.server_state
+        start, end = _period(body)
+        offset = int(query.get("$skiptoken", 0))
+        rows, more = state.cost_rows(start, end, offset, state.page_size)
+        properties = {"columns": COST_COLUMNS, "rows": rows,
+                      "nextLink": self._next_link(parts, offset + state.page_size) if more else None}
+        self._send(200, {"id": "standin", "name": "standin", "type": "Microsoft.CostManagement/query",
+                         "properties": properties},
+                   {"x-ms-ratelimit-microsoft.costmanagement-qpu-remaining": "QueriesPerUnit=399"})
+
+    def _resource_graph(self, body, query, parts):
+        state = self.server_state
+        options = (body or {}).get("options", {})
+        top = int(options.get("$top", 1000))
+        offset = int(options.get("$skipToken", 0))
+        subscriptions = (body or {}).get("subscriptions") or state.subscriptions
+        total = state.resources * len(subscriptions)
+        data = [state.resource(i % state.resources, subscriptions[i // state.resources])
+                for i in range(offset, min(offset + top, total))]
+        payload = {"totalRecords": total, "count": len(data), "data": data, "resultTruncated": "false"}
+        if offset + top < total:
+            payload["$skipToken"] = str(offset + top)
+        self._send(200, payload, {"x-ms-user-quota-remaining": "14", "x-ms-user-quota-resets-after": "00:00:05"})
+
+    def _resources_list(self, body, query, parts):
+        state = self.server_state
+        subscription_id = parts.path.split("/")[2]
+        offset = int(query.get("$skiptoken", 0))
+        data = [state.resource(i, subscription_id) for i in range(offset, min(offset + 1000, state.resources))]
+        payload = {"value": data}
+        if offset + 1000 < state.resources:
+            payload["nextLink"] = self._next_link(parts, offset + 1000)
+        self._send(200, payload)
+
+    def _advisor(self, body, query, parts):
+        self._send(200, {"value": [{"name": f"rec-{i}", "properties": {"category": "Cost", "impact": "Medium"}}
+                                   for i in range(3)]})
+
+    def _resource_health(self, body, query, parts):
+        self._send(200, {"value": [{"name": "current", "properties": {"availabilityState": "Available"}}]})
+
+    def _workbooks(self, body, query, parts):
+        self._send(200, {"value": []})
+
+    def _subscriptions(self, body, query, parts):
+        self._send(200, {"value": [{"subscriptionId": s, "tenantId": DEFAULT_TENANT, "state": "Enabled"}
+                                   for s in self.server_state.subscriptions]})
+
+    def _management_group(self, body, query, parts):
+        self._send(200, {"value": [{"name": s, "type": "Microsoft.Management/managementGroups/subscriptions"}
+                                   for s in self.server_state.subscriptions]})
+
+    def _resource_groups(self, body, query, parts):
+        self._send(200, {"value": [{"name": f"rg-{i}", "location": LOCATIONS[i % 5]}
+                                   for i in range(self.server_state.resource_groups)]})
+
+    def _carbon_query(self, body, query, parts):
+        state = self.server_state
+        offset = int(query.get("$skiptoken", 0))
+        rows, more = state.carbon_rows(body or {}, offset, state.page_size)
+        properties = {"columns": CARBON_COLUMNS, "rows": rows}
+        if more:
+            properties["nextLink"] = self._next_link(parts, offset + state.page_size)
+        self._send(200, {"properties": properties})
+
+    def _carbon_insights(self, body, query, parts):
+        self._send(200, {"value": [{"name": "insight-0", "properties": {"totalCarbonEmission": 12.5}}]})
+
+    def _carbon_export_put(self, body, query, parts):
+        state = self.server_state
+        with state.lock:
+            operation_id = f"op-{len(state.operations)}"
+            state.operations[operation_id] = {"polls": 0, "resource": {"name": parts.path.rsplit("/", 1)[-1],
+                                                                      "properties": (body or {}).get("properties", {})}}
+        host = self.headers.get("Host")
+        self._send(202, {}, {"Azure-AsyncOperation": f"http://{host}/providers/Microsoft.Carbon/operations/{operation_id}",
+                             "Retry-After": "0"})
+
+    def _carbon_export_get(self, body, query, parts):
+        state = self.server_state
+        name = parts.path.rsplit("/", 1)[-1].lower()
+        with state.lock:
+            resources = [op["resource"] for op in state.operations.values() if op["resource"]["name"].lower() == name]
+        self._send(200 if resources else 404, resources[-1] if resources else {"error": {"code": "NotFound"}})
+
+    def _carbon_operation(self, body, query, parts):
+        state = self.server_state
+        operation_id = parts.path.rsplit("/", 1)[-1]
+        with state.lock:
+            operation = state.operations.get(operation_id)
+            if operation is not None:
+                operation["polls"] += 1
+        if operation is None:
+            return self._send(404, {"error": {"code": "NotFound"}})
+        status = "Succeeded" if operation["polls"] > 1 else "InProgress"
+        self._send(200, {"status": status}, {"Retry-After": "0"})
+
+
+def _route(method, path):
+    """Name of the stand-in route for a lower-cased request path"""
+    if "/providers/microsoft.costmanagement/query" in path:
+        return "cost_query"
+    if path.endswith("/providers/microsoft.resourcegraph/resources"):
+        return "resource_graph"
+    if "/providers/microsoft.carbon/operations/" in path:
+        return "carbon_operation"
+    if "/providers/microsoft.carbon/exports/" in path:
+        return "carbon_export_put" if method == "PUT" else "carbon_export_get"
+    if path.endswith("/providers/microsoft.carbon/query"):
+        return "carbon_query"
+    if path.endswith("/providers/microsoft.carbon/insights"):
+        return "carbon_insights"
+    if path.endswith("/providers/microsoft.advisor/recommendations"):
+        return "advisor"
+    if path.endswith("/providers/microsoft.resourcehealth/availabilitystatuses"):
+        return "resource_health"
+    if path.endswith("/providers/microsoft.insights/workbooks"):
+        return "workbooks"
+    if path.endswith("/descendants") and "/microsoft.management/managementgroups/" in path:
+        return "management_group"
+    if path.endswith("/resourcegroups"):
+        return "resource_groups"
+    if re.match(r"^/subscriptions/[^/]+/resources$", path):
+        return "resources_list"
+    if path == "/subscriptions":
+        return "subscriptions"
+    return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Azure Resource Manager APIs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--rows-per-day", type=int, default=100, help="Synthetic cost rows per day (default: 100)")
+    parser.add_argument("--page-size", type=int, default=5000, help="Rows per Cost Management page (default: 5000)")
+    parser.add_argument("--resources", type=int, default=200, help="Resources per subscription (default: 200)")
+    parser.add_argument("--subscriptions", help="Comma-separated subscription IDs to serve")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--fixtures", help="Response cache directory to replay recorded responses from")
+    args = parser.parse_args()
+
+    subscriptions = [s.strip() for s in (args.subscriptions or "").split(",") if s.strip()]
+    standin = ArmStandIn(host=args.host, port=args.port, rows_per_day=args.rows_per_day, page_size=args.page_size,
+                         resources=args.resources, subscriptions=subscriptions, latency=args.latency,
+                         throttle_rate=args.throttle_rate, fixtures_dir=args.fixtures)
+    print(f"🧪 ARM stand-in listening on {standin.start()} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        standin.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Tests for incremental EWMA/MAD anomaly detection over daily emissions
+"""
+
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from anomaly_detection import AnomalyDetector
+from arm_standin import DEFAULT_SUBSCRIPTION, ArmStandIn
+from azure_carbon_extractor import AzureCarbonExtractor
+from factor_registry import FactorRegistry
+from http_session import ArmSession
+from rollup_cube import RollupCube
+
+COLUMNS = ["CostUSD", "UsageDate", "ServiceName", "ResourceLocation", "ResourceGroupName"]
+
+
+def _cube(costs, first_day=1):
+    """Cube of one Virtual Machines cost row per day of May 2025"""
+    cube = RollupCube()
+    rows = [[cost, 20250500 + first_day + day, "Virtual Machines", "eastus", "rg-a"]
+            for day, cost in enumerate(costs)]
+    cube.add_page(COLUMNS, rows, "sub-1", FactorRegistry.load())
+    return cube
+
+
+def test_spike_after_warmup_is_flagged():
+    detector = AnomalyDetector()
+    costs = [100.0, 104.0, 98.0, 101.0, 99.0, 103.0, 97.0, 102.0, 400.0, 100.0]
+
+    anomalies = detector.update_cube(_cube(costs))
+
+    assert [(a["date"], a["direction"]) for a in anomalies] == [("2025-05-09", "spike")]
+    assert anomalies[0]["serviceName"] == "Virtual Machines"
+    assert anomalies[0]["expectedCarbonKg"] < anomalies[0]["estimatedCarbonKg"]
+    assert anomalies[0]["score"] >= detector.threshold
+
+
+def test_state_is_bounded_by_the_window():
+    detector = AnomalyDetector(window=5)
+    detector.update_cube(_cube([100.0 + day % 3 for day in range(30)]))
+
+    state = detector.series["sub-1"]["Virtual Machines"]
+    assert len(state["recent"]) == 5
+    assert state["count"] == 30
+    assert state["lastDate"] == "2025-05-30"
+
+
+def test_state_persists_and_days_are_only_consumed_once(tmp_path):
+    path = str(tmp_path / "state.json")
+    detector = AnomalyDetector(path)
+    detector.update_cube(_cube([100.0, 102.0, 98.0, 101.0, 99.0, 103.0, 97.0, 100.0]))
+    detector.save()
+
+    resumed = AnomalyDetector(path)
+    # Restated days already seen are skipped; the spike on a new day is flagged, today's row is left open
+    anomalies = resumed.update_cube(_cube([100.0, 99.0, 500.0, 900.0], first_day=7), closed_through="2025-05-09")
+
+    assert [a["date"] for a in anomalies] == ["2025-05-09"]
+    assert resumed.series["sub-1"]["Virtual Machines"]["count"] == 9
+    assert resumed.series["sub-1"]["Virtual Machines"]["lastDate"] == "2025-05-09"
+
+
+def test_service_that_stops_emitting_is_a_drop():
+    detector = AnomalyDetector()
+    detector.update_cube(_cube([100.0, 102.0, 98.0, 101.0, 99.0, 103.0, 97.0, 100.0]))
+
+    # Another service keeps the cube going, Virtual Machines has no rows on 9-10 May
+    cube = RollupCube()
+    cube.add_page(COLUMNS, [[5.0, 20250509, "Storage", "eastus", "rg-a"],
+                            [5.0, 20250510, "Storage", "eastus", "rg-a"]], "sub-1", FactorRegistry.load())
+    anomalies = detector.update_cube(cube, closed_through="2025-05-10")
+
+    drops = [(a["date"], a["estimatedCarbonKg"], a["direction"])
+             for a in anomalies if a["serviceName"] == "Virtual Machines"]
+    assert drops == [("2025-05-09", 0.0, "drop"), ("2025-05-10", 0.0, "drop")]
+    assert detector.series["sub-1"]["Virtual Machines"]["lastDate"] == "2025-05-10"
+
+
+def test_extraction_exports_anomalies_and_saves_state(tmp_path):
+    with ArmStandIn(rows_per_day=20, page_size=200, resources=10) as standin:
+        extractor = AzureCarbonExtractor(subscription_id=DEFAULT_SUBSCRIPTION, http=ArmSession(max_retries=3))
+        extractor.configure(base_url=standin.url, output_file=str(tmp_path / "out.json"),
+                            csv_file=str(tmp_path / "out.csv"))
+        extractor._cost_period = lambda: (datetime(2025, 5, 1), datetime(2025, 5, 14))
+        assert extractor.run_extraction()
+
+    with open(extractor.output_file) as f:
+        exported = json.load(f)
+    assert exported["summary"]["anomalyCount"] == len(exported["anomalies"])
+    with open(tmp_path / ".anomaly_state.json") as f:
+        state = json.load(f)
+    series = state["series"][DEFAULT_SUBSCRIPTION]
+    assert series and all(s["lastDate"] == "2025-05-14" for s in series.values())
+
+
+def test_recent_days_wait_for_restatements_to_settle(tmp_path):
+    today = datetime.now()
+    days = [(today - timedelta(days=offset)).strftime("%Y%m%d") for offset in range(10, -1, -1)]
+    cube = RollupCube()
+    cube.add_page(COLUMNS, [[100.0, int(day), "Storage", "eastus", "rg-a"] for day in days], "sub-1",
+                  FactorRegistry.load())
+    extractor = AzureCarbonExtractor(subscription_id="sub-1", http=ArmSession())
+    extractor.configure(output_file=str(tmp_path / "out.json"), anomaly_settle_days=3)
+
+    extractor.detect_anomalies(cube)
+
+    state = extractor.anomaly_detector.series["sub-1"]["Storage"]
+    assert state["lastDate"] == (today - timedelta(days=3)).strftime("%Y-%m-%d")
+    assert state["count"] == 8
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+End-to-end tests against the local ARM stand-in server (no network, no Azure credentials)
+"""
+
+import json
+import os
+import sys
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from arm_standin import DEFAULT_SUBSCRIPTION, ArmStandIn
+from azure_carbon_extractor import AzureCarbonExtractor
+from carbon_api_client import CarbonOptimizationClient
+from http_session import ArmSession
+from response_cache import ResponseCache
+
+
+def _extractor(standin, tmp_path, http=None, **settings):
+    extractor = AzureCarbonExtractor(subscription_id=DEFAULT_SUBSCRIPTION, http=http or ArmSession(max_retries=3))
+    extractor.configure(base_url=standin.url, output_file=str(tmp_path / "out.json"),
+                        csv_file=str(tmp_path / "out.csv"), **settings)
+    return extractor
+
+
+def test_full_extraction_pages_through_synthetic_cost_rows(tmp_path):
+    with ArmStandIn(rows_per_day=40, page_size=500, resources=30) as standin:
+        extractor = _extractor(standin, tmp_path, resource_page_size=10)
+        extractor._cost_period = lambda: (datetime(2025, 5, 1), datetime(2025, 5, 30))
+
+        assert extractor.run_extraction()
+
+    with open(tmp_path / "out.json") as f:
+        exported = json.load(f)
+    assert exported["summary"]["dataPointCount"] == 30 * 40
+    assert exported["summary"]["resourceCount"] == 30
+    assert exported["carbonEstimates"][0]["date"] == "2025-05-01"
+    assert exported["resourceEstimates"]
+    assert exported["summary"]["resourceAttribution"]["attributedCostUSD"] > 0
+    assert (tmp_path / "azure_carbon_resources.csv").exists()
+    # 1200 rows in pages of 500, 30 resources in pages of 10
+    assert standin.stats["routes"]["cost_query"] == 3
+    assert standin.stats["routes"]["resource_graph"] == 3
+
+
+def test_injected_throttling_is_retried(tmp_path):
+    with ArmStandIn(rows_per_day=5, page_size=5, throttle_rate=0.3, throttle_retry_after=0) as standin:
+        session = ArmSession(max_retries=10, backoff_factor=0.01)
+        extractor = _extractor(standin, tmp_path, http=session)
+        extractor._cost_period = lambda: (datetime(2025, 5, 1), datetime(2025, 5, 10))
+
+        data = extractor.get_cost_management_data()
+
+    assert len(data["properties"]["rows"]) == 50
+    assert standin.stats["routes"]["cost_query"] > 10
+    assert standin.stats["throttled"] > 0
+    assert session.stats["throttled"] == standin.stats["throttled"]
+
+
+def test_recorded_responses_are_replayed(tmp_path):
+    cache = ResponseCache(str(tmp_path / "fixtures"))
+    recorded = {"properties": {"columns": [{"name": "CostUSD"}, {"name": "ServiceName"}],
+                               "rows": [[4.2, "Recorded Service"]]}}
+
+    class Recorded:
+        status_code = 200
+        headers = {"Content-Type": "application/json"}
+        text = json.dumps(recorded)
+
+    url = (f"https://management.azure.com/subscriptions/{DEFAULT_SUBSCRIPTION}"
+           f"/providers/Microsoft.CostManagement/query?api-version=2023-11-01")
+    extractor = AzureCarbonExtractor(subscription_id=DEFAULT_SUBSCRIPTION, http=ArmSession())
+    body = extractor._cost_query_body(datetime(2025, 5, 1), datetime(2025, 5, 2))
+    cache.store("POST", url, body, Recorded())
+
+    with ArmStandIn(fixtures_dir=str(tmp_path / "fixtures")) as standin:
+        extractor.base_url = standin.url
+        pages = list(extractor.iter_cost_management_pages(body))
+
+    assert pages[0]["rows"] == [[4.2, "Recorded Service"]]
+    assert standin.stats["replayed"] == 1
+
+
+def test_carbon_client_queries_and_exports(tmp_path):
+    with ArmStandIn(resource_groups=4, page_size=10) as standin:
+        client = CarbonOptimizationClient(DEFAULT_SUBSCRIPTION, http=ArmSession(), base_url=standin.url)
+        assert client.authenticate()
+
+        result = client.query_carbon_usage_by_resource_group("2025-05-01", "2025-05-03", chunk_days=1,
+                                                             groups_per_slice=2)
+        export = client.create_export("daily")
+
+    # 3 days x 4 resource groups x 7 resource types
+    assert len(result.rows) == 3 * 4 * 7
+    assert result.pages > result.slices
+    assert export["name"] == "daily"
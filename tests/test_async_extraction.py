@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Tests for the concurrent (asyncio) extraction mode
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from azure_carbon_extractor import AzureCarbonExtractor
+
+
+def _slow(result, delay=0.2):
+    def call(*args):
+        time.sleep(delay)
+        return result
+    return call
+
+
+def test_async_extraction_runs_sources_concurrently(tmp_path, monkeypatch):
+    extractor = AzureCarbonExtractor(subscription_id="00000000-0000-0000-0000-000000000000")
+    extractor.output_file = str(tmp_path / "azure_carbon_data.json")
+    extractor.csv_file = str(tmp_path / "azure_carbon_data.csv")
+
+    monkeypatch.setattr(extractor, "authenticate", lambda: True)
+    monkeypatch.setattr(extractor, "get_cost_management_data", _slow(None))
+    monkeypatch.setattr(extractor, "get_resource_data", _slow([]))
+    monkeypatch.setattr(extractor, "_fetch_sustainability_endpoint", _slow({"value": []}))
+
+    start = time.perf_counter()
+    success = asyncio.run(extractor.run_extraction_async(concurrency=5))
+    elapsed = time.perf_counter() - start
+
+    # 5 calls of 0.2s each: sequential would take ~1s
+    assert success
+    assert elapsed < 0.6
+    assert os.path.exists(extractor.output_file)
+
+
+def test_async_extraction_respects_concurrency_limit(tmp_path, monkeypatch):
+    extractor = AzureCarbonExtractor(subscription_id="00000000-0000-0000-0000-000000000000")
+    extractor.output_file = str(tmp_path / "azure_carbon_data.json")
+    extractor.csv_file = str(tmp_path / "azure_carbon_data.csv")
+
+    in_flight = []
+    peak = []
+
+    def tracked(result):
+        def call(*args):
+            in_flight.append(1)
+            peak.append(len(in_flight))
+            time.sleep(0.05)
+            in_flight.pop()
+            return result
+        return call
+
+    monkeypatch.setattr(extractor, "authenticate", lambda: True)
+    monkeypatch.setattr(extractor, "get_cost_management_data", tracked(None))
+    monkeypatch.setattr(extractor, "get_resource_data", tracked([]))
+    monkeypatch.setattr(extractor, "_fetch_sustainability_endpoint", tracked(None))
+
+    assert asyncio.run(extractor.run_extraction_async(concurrency=2))
+    assert max(peak) <= 2
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Smoke tests for the benchmark suite (tiny sizes only; real runs use benchmarks/run_benchmarks.py)
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
+
+from run_benchmarks import bench_size, compare, load_baselines, save_baselines
+
+
+def test_bench_size_measures_every_stage():
+    results = bench_size(300, ["fetch", "estimate", "export", "pipeline"])
+
+    assert set(results) == {"fetch", "estimate", "export", "pipeline"}
+    for metrics in results.values():
+        assert metrics["rows"] >= 300
+        assert metrics["seconds"] > 0
+        assert metrics["peakRssMb"] > 0
+        assert metrics["allocPeakMb"] is not None
+
+
+def test_compare_flags_only_regressions_beyond_threshold_and_noise():
+    baselines = {
+        "estimate@100000": {"seconds": 1.0, "peakRssMb": 200.0, "allocPeakMb": 40.0},
+        "fetch@1000": {"seconds": 0.01, "peakRssMb": 30.0, "allocPeakMb": 0.5},
+    }
+    results = {
+        "estimate@100000": {"seconds": 1.5, "peakRssMb": 210.0, "allocPeakMb": 41.0},
+        # 3x slower, but by less than the noise floor
+        "fetch@1000": {"seconds": 0.03, "peakRssMb": 30.0, "allocPeakMb": 0.6},
+        "export@1000": {"seconds": 9.0, "peakRssMb": 30.0, "allocPeakMb": None},
+    }
+
+    regressions = compare(results, baselines, threshold=0.25)
+
+    assert regressions == [("estimate@100000", "seconds", 1.0, 1.5)]
+
+
+def test_baselines_round_trip(tmp_path):
+    path = str(tmp_path / "baselines.json")
+    save_baselines({"fetch@1000": {"seconds": 0.1}}, path)
+    save_baselines({"fetch@2000": {"seconds": 0.2}}, path)
+
+    assert load_baselines(path) == {"fetch@1000": {"seconds": 0.1}, "fetch@2000": {"seconds": 0.2}}
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Tests for planned, concurrent Microsoft.Carbon usage queries
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from carbon_api_client import CarbonOptimizationClient
+from carbon_query_planner import CarbonQueryPlanner, CarbonUsageRow, QuerySlice, rows_from_page
+
+RESOURCE_GROUPS = [f"rg-{i}" for i in range(6)]
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload):
+        self.status_code = status_code
+        self.payload = payload
+        self.text = str(payload)
+
+    def json(self):
+        return self.payload
+
+
+class FakeCarbonApi:
+    """Serves one row per (day, resource group) in the body's filter, two rows per page
+
+    Queries filtering on more than `max_groups` resource groups time out.
+    """
+
+    def __init__(self, max_groups=None, use_skip_token=False, status_code=None):
+        self.max_groups = max_groups
+        self.use_skip_token = use_skip_token
+        self.status_code = status_code
+        self.posts = []
+
+    def get(self, url, **kwargs):
+        return FakeResponse(200, {"value": [{"name": name} for name in RESOURCE_GROUPS]})
+
+    def post(self, url, json=None, **kwargs):
+        self.posts.append(json)
+        if self.status_code:
+            return FakeResponse(self.status_code, {"error": {"code": "BadRequest"}})
+        groups = json["dataset"].get("filter", {}).get("dimensions", {}).get("values", RESOURCE_GROUPS)
+        if self.max_groups and len(groups) > self.max_groups:
+            return FakeResponse(504, {"error": {"code": "GatewayTimeout"}})
+
+        start = datetime.strptime(json["timePeriod"]["from"][:10], "%Y-%m-%d")
+        end = datetime.strptime(json["timePeriod"]["to"][:10], "%Y-%m-%d")
+        rows = []
+        day = start
+        while day <= end:
+            for group in groups:
+                rows.append([1.5, int(day.strftime("%Y%m%d")), group, "microsoft.compute/virtualmachines", "eastus"])
+            day += timedelta(days=1)
+
+        if self.use_skip_token:
+            offset = json.get("skipToken", 0)
+        else:
+            offset = int(url.rsplit("offset=", 1)[1]) if "offset=" in url else 0
+        page_rows = rows[offset:offset + 2]
+        more = offset + 2 < len(rows)
+        columns = [{"name": n} for n in ["UsageQuantity", "UsageDate", "ResourceGroupName", "ResourceType", "ResourceLocation"]]
+        payload = {"properties": {"columns": columns, "rows": page_rows}}
+        if more and self.use_skip_token:
+            payload["skipToken"] = offset + 2
+        elif more:
+            payload["properties"]["nextLink"] = f"https://management.azure.com/next?offset={offset + 2}"
+        return FakeResponse(200, payload)
+
+
+def test_plan_crosses_date_windows_with_value_batches():
+    planner = CarbonQueryPlanner(client=None, chunk_days=7, split_dimension="ResourceGroupName",
+                                 split_values=RESOURCE_GROUPS, values_per_slice=4)
+    slices = planner.plan(datetime(2025, 5, 1), datetime(2025, 5, 20))
+
+    assert len(slices) == 3 * 2
+    assert slices[0] == QuerySlice(datetime(2025, 5, 1), datetime(2025, 5, 7), "ResourceGroupName", tuple(RESOURCE_GROUPS[:4]))
+    assert slices[-1].end == datetime(2025, 5, 20)
+
+
+def test_resource_group_query_follows_next_links_and_merges_in_order():
+    api = FakeCarbonApi()
+    client = CarbonOptimizationClient(subscription_id="sub", http=api)
+
+    result = client.query_carbon_usage_by_resource_group("2025-05-01", "2025-05-10", chunk_days=3, groups_per_slice=2)
+
+    assert len(result.rows) == 10 * len(RESOURCE_GROUPS)
+    assert result.rows[0] == CarbonUsageRow("2025-05-01", "rg-0", "microsoft.compute/virtualmachines", "eastus", 1.5)
+    assert result.rows == sorted(result.rows)
+    assert result.total_emissions() == 1.5 * len(result.rows)
+    assert result.failed == []
+    # Every slice needed more than one page
+    assert result.pages > result.slices
+
+
+def test_skip_token_continuation():
+    api = FakeCarbonApi(use_skip_token=True)
+    client = CarbonOptimizationClient(subscription_id="sub", http=api)
+
+    result = client.query_carbon_usage_by_resource_group("2025-05-01", "2025-05-02", chunk_days=None)
+
+    assert len(result.rows) == 2 * len(RESOURCE_GROUPS)
+
+
+def test_timed_out_slices_are_split_until_they_succeed():
+    api = FakeCarbonApi(max_groups=2)
+    client = CarbonOptimizationClient(subscription_id="sub", http=api)
+
+    result = client.query_carbon_usage_by_resource_group("2025-05-01", "2025-05-03", chunk_days=3, groups_per_slice=6)
+
+    assert len(result.rows) == 3 * len(RESOURCE_GROUPS)
+    assert result.failed == []
+    assert len({row.resource_group for row in result.rows}) == len(RESOURCE_GROUPS)
+
+
+def test_client_errors_fail_the_slice_without_splitting():
+    api = FakeCarbonApi(status_code=400)
+    client = CarbonOptimizationClient(subscription_id="sub", http=api)
+
+    result = client.query_carbon_usage_by_resource_group("2025-05-01", "2025-05-14", chunk_days=7, groups_per_slice=3)
+
+    assert len(api.posts) == 2 * 2
+    assert len(result.failed) == 4
+    assert result.rows == []
+
+
+def test_value_list_pages_become_typed_rows():
+    rows = rows_from_page({"value": [
+        {"date": "2025-05-01T00:00:00Z", "resourceGroup": "rg", "location": "westeurope", "latestMonthEmissions": "2.5"}
+    ]})
+    assert rows == [CarbonUsageRow("2025-05-01", "rg", None, "westeurope", 2.5)]
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Tests for the partitioned Parquet export of carbon estimates
+"""
+
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from arm_standin import DEFAULT_SUBSCRIPTION, ArmStandIn
+from azure_carbon_extractor import AzureCarbonExtractor
+from columnar_export import ParquetExport, parquet_available
+from http_session import ArmSession
+
+
+def _estimate(date, service, location, cost):
+    return {"date": date, "serviceName": service, "location": location, "costUSD": cost,
+            "estimatedCarbonKg": cost * 0.1, "carbonIntensityFactor": 0.1, "regionalFactor": 1.0}
+
+
+def _dataset(root):
+    return ds.dataset(str(root), format="parquet", partitioning="hive")
+
+
+def test_partitions_dictionary_columns_and_statistics(tmp_path):
+    pages = [[_estimate("2025-05-11", "Storage", "eastus", 2.0), _estimate("2025-05-10", "Virtual Machines",
+                                                                              "westus", 5.0)],
+             [_estimate("2025-05-10", "Storage", "eastus", 1.0), _estimate(None, "Storage", "eastus", 3.0)]]
+    with ParquetExport(str(tmp_path), "sub-1", row_group_size=1) as export:
+        for page in pages:
+            export.write(page)
+
+    assert export.rows_written == 4
+    assert sorted(os.listdir(tmp_path)) == ["usageDate=2025-05-10", "usageDate=2025-05-11",
+                                            "usageDate=__HIVE_DEFAULT_PARTITION__"]
+    part = tmp_path / "usageDate=2025-05-10" / "subscriptionId=sub-1" / "part-0.parquet"
+    metadata = pq.ParquetFile(str(part)).metadata
+    assert metadata.num_row_groups == 2
+    column = metadata.row_group(0).column(0)
+    assert column.path_in_schema == "serviceName" and column.statistics.has_min_max
+    assert "RLE_DICTIONARY" in column.encodings
+    assert pa.types.is_dictionary(pq.read_table(str(part)).schema.field("serviceName").type)
+
+    table = _dataset(tmp_path).to_table(filter=ds.field("usageDate") == "2025-05-10")
+    assert sorted(table.column("costUSD").to_pylist()) == [1.0, 5.0]
+    assert set(table.column("subscriptionId").to_pylist()) == {"sub-1"}
+
+
+def test_writer_does_not_need_numpy(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, "numpy", None)
+    with ParquetExport(str(tmp_path), "sub-1") as export:
+        export.write([_estimate("2025-05-10", "Storage", "eastus", 1.0), _estimate("2025-05-11", "Storage",
+                                                                                   "westus", 2.0)])
+
+    assert export.rows_written == 2
+    assert parquet_available()
+
+
+def test_rewrite_replaces_only_the_subscriptions_partitions(tmp_path):
+    for subscription, dates in (("sub-1", ["2025-05-10", "2025-05-11"]), ("sub-2", ["2025-05-10"]),
+                                ("sub-1", ["2025-05-12"])):
+        with ParquetExport(str(tmp_path), subscription) as export:
+            export.write([_estimate(date, "Storage", "eastus", 1.0) for date in dates])
+
+    table = _dataset(tmp_path).to_table()
+    rows = sorted(zip(table.column("usageDate").to_pylist(), table.column("subscriptionId").to_pylist()))
+    assert rows == [("2025-05-10", "sub-2"), ("2025-05-12", "sub-1")]
+    assert not [name for name in os.listdir(tmp_path) if name.startswith(".tmp")]
+
+
+def test_failed_export_keeps_the_previous_partitions(tmp_path):
+    with ParquetExport(str(tmp_path), "sub-1") as export:
+        export.write([_estimate("2025-05-10", "Storage", "eastus", 1.0)])
+    with pytest.raises(RuntimeError):
+        with ParquetExport(str(tmp_path), "sub-1") as export:
+            export.write([_estimate("2025-05-11", "Storage", "eastus", 1.0)])
+            raise RuntimeError("stream interrupted")
+
+    assert _dataset(tmp_path).to_table().column("usageDate").to_pylist() == ["2025-05-10"]
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_extraction_writes_the_dataset(tmp_path, streaming):
+    with ArmStandIn(rows_per_day=20, page_size=50, resources=5) as standin:
+        extractor = AzureCarbonExtractor(subscription_id=DEFAULT_SUBSCRIPTION, http=ArmSession(max_retries=3))
+        extractor.configure(base_url=standin.url, parquet=True, streaming=streaming,
+                            output_file=str(tmp_path / "out.json"), csv_file=str(tmp_path / "out.csv"))
+        extractor._cost_period = lambda: (datetime(2025, 5, 1), datetime(2025, 5, 5))
+        assert extractor.run_extraction()
+
+    table = _dataset(tmp_path / "azure_carbon_parquet").to_table()
+    totals = extractor.cube.totals()
+    assert table.num_rows == 100
+    assert sorted(set(table.column("usageDate").to_pylist())) == [f"2025-05-0{day}" for day in range(1, 6)]
+    assert sum(table.column("estimatedCarbonKg").to_pylist()) == pytest.approx(totals["estimatedCarbonKg"])
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Tests for Cost Management nextLink pagination and date-window chunking
+"""
+
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from azure_carbon_extractor import AzureCarbonExtractor
+
+COLUMNS = [{"name": "CostUSD", "type": "Number"}, {"name": "UsageDate", "type": "Number"},
+           {"name": "ServiceName", "type": "String"}, {"name": "ResourceLocation", "type": "String"}]
+
+
+class FakeResponse:
+    def __init__(self, payload, status_code=200):
+        self.payload = payload
+        self.status_code = status_code
+        self.text = str(payload)
+
+    def json(self):
+        return self.payload
+
+
+class PagedHttp:
+    """Serves three pages of two rows each, linked by nextLink"""
+
+    def __init__(self):
+        self.urls = []
+
+    def post(self, url, **kwargs):
+        self.urls.append(url)
+        page = len(self.urls)
+        rows = [[1.0, 20250500 + page, "Storage", "US East"], [2.0, 20250500 + page, "Virtual Machines", "West Europe"]]
+        next_link = f"https://management.azure.com/next?$skiptoken={page}" if page < 3 else None
+        return FakeResponse({"properties": {"columns": COLUMNS, "rows": rows, "nextLink": next_link}})
+
+
+def _extractor(http):
+    extractor = AzureCarbonExtractor(subscription_id="sub", http=http)
+    extractor.token = "token"
+    return extractor
+
+
+def test_pages_follow_next_link():
+    http = PagedHttp()
+    pages = list(_extractor(http).iter_cost_management_pages())
+
+    assert len(pages) == 3
+    assert http.urls[1].endswith("$skiptoken=1")
+
+
+def test_cost_data_contains_all_pages():
+    data = _extractor(PagedHttp()).get_cost_management_data()
+
+    assert len(data["properties"]["rows"]) == 6
+    assert data["properties"]["nextLink"] is None
+
+
+def test_estimates_consume_page_generator():
+    extractor = _extractor(PagedHttp())
+    estimates = extractor.calculate_carbon_estimates(extractor.iter_cost_management_pages(), [])
+
+    assert len(estimates) == 6
+    assert estimates[0]["date"] == "2025-05-01"
+    assert sum(e["costUSD"] for e in estimates) == 9.0
+
+
+class WindowHttp:
+    """Returns one row per day of the requested window, in shuffled order"""
+
+    def __init__(self):
+        self.windows = []
+        self.lock = threading.Lock()
+
+    def post(self, url, json=None, **kwargs):
+        start = datetime.strptime(json["timePeriod"]["from"][:10], "%Y-%m-%d")
+        end = datetime.strptime(json["timePeriod"]["to"][:10], "%Y-%m-%d")
+        with self.lock:
+            self.windows.append((start, end))
+        days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+        random.shuffle(days)
+        time.sleep(0.01)
+        rows = [[1.0, int(day.strftime("%Y%m%d")), "Storage", "US East"] for day in days]
+        return FakeResponse({"properties": {"columns": COLUMNS, "rows": rows, "nextLink": None}})
+
+
+def test_chunked_query_covers_period_in_date_order():
+    http = WindowHttp()
+    extractor = _extractor(http)
+    extractor.configure(cost_chunk_days=7, cost_chunk_autotune=False)
+    extractor._cost_period = lambda: (datetime(2024, 5, 1), datetime(2025, 5, 31))
+
+    data = extractor.get_cost_management_data()
+    dates = [row[1] for row in data["properties"]["rows"]]
+
+    assert len(dates) == 396
+    assert dates == sorted(dates)
+    assert len(set(dates)) == 396
+    assert all((end - start).days < 7 for start, end in http.windows)
+
+
+def test_chunk_size_autotunes_from_observed_rows():
+    extractor = _extractor(WindowHttp())
+    extractor.configure(cost_chunk_target_rows=100, cost_chunk_target_seconds=1000)
+    windows = [(datetime(2025, 1, 1), datetime(2025, 1, 7))]
+
+    # 700 rows/week = 100 rows/day, so the target of 100 rows means 1-day chunks (halving at most)
+    assert extractor._tune_chunk_days(7, windows, [([], [None] * 700, 0.1)]) == 3
+    # Few rows and fast responses let the chunk grow, at most doubling
+    assert extractor._tune_chunk_days(7, windows, [([], [None] * 7, 0.1)]) == 14
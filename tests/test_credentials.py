@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared, token-caching credential provider
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from azure.core.credentials import AccessToken
+
+from credentials import MANAGEMENT_SCOPE, STORAGE_SCOPE, CachedCredential, resolve_subscription_id
+
+
+class CountingCredential:
+    def __init__(self, lifetime):
+        self.lifetime = lifetime
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def get_token(self, *scopes, **kwargs):
+        with self.lock:
+            self.calls.append(scopes)
+            count = len(self.calls)
+        return AccessToken(f"token-{count}", int(time.time() + self.lifetime))
+
+
+def test_tokens_are_cached_per_scope():
+    underlying = CountingCredential(lifetime=3600)
+    credential = CachedCredential(credential_factory=lambda: underlying)
+
+    assert credential.token(MANAGEMENT_SCOPE) == credential.token(MANAGEMENT_SCOPE)
+    credential.get_token(STORAGE_SCOPE)
+    credential.get_token(STORAGE_SCOPE)
+
+    assert underlying.calls == [(MANAGEMENT_SCOPE,), (STORAGE_SCOPE,)]
+    credential.close()
+
+
+def test_credential_chain_is_built_once_for_concurrent_callers():
+    built = []
+    underlying = CountingCredential(lifetime=3600)
+    credential = CachedCredential(credential_factory=lambda: built.append(1) or underlying)
+
+    threads = [threading.Thread(target=credential.token) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(built) == 1
+    assert len(underlying.calls) == 1
+    credential.close()
+
+
+def test_tokens_are_refreshed_in_the_background_before_expiry():
+    # Tokens live 3s and are refreshed 2.5s early, i.e. roughly every 0.5s
+    underlying = CountingCredential(lifetime=3)
+    credential = CachedCredential(refresh_margin=2.5, credential_factory=lambda: underlying)
+
+    first = credential.token(MANAGEMENT_SCOPE)
+    deadline = time.time() + 5
+    while len(underlying.calls) < 2 and time.time() < deadline:
+        time.sleep(0.05)
+
+    assert len(underlying.calls) >= 2
+    assert credential.token(MANAGEMENT_SCOPE) != first
+    credential.close()
+
+
+def test_short_lived_tokens_do_not_spin_the_refresher():
+    # Lifetime below the refresh margin: refreshed at half-life, never in a tight loop
+    underlying = CountingCredential(lifetime=1)
+    credential = CachedCredential(refresh_margin=300, credential_factory=lambda: underlying)
+
+    credential.token(MANAGEMENT_SCOPE)
+    credential.token(MANAGEMENT_SCOPE)
+    time.sleep(1.5)
+
+    assert 2 <= len(underlying.calls) <= 4
+    credential.close()
+
+
+def test_failed_refreshes_back_off():
+    underlying = CountingCredential(lifetime=1)
+    credential = CachedCredential(credential_factory=lambda: underlying, retry_interval=0.2)
+    credential.token(MANAGEMENT_SCOPE)
+
+    def failing_get_token(*scopes, **kwargs):
+        underlying.calls.append(scopes)
+        raise RuntimeError("credential chain unavailable")
+    underlying.get_token = failing_get_token
+    time.sleep(1.5)
+
+    # Refreshes at ~1s, then backed off by 0.2s, 0.4s, ...
+    assert 2 <= len(underlying.calls) <= 4
+    credential.close()
+
+
+def test_claims_and_tenant_requests_bypass_the_cache():
+    underlying = CountingCredential(lifetime=3600)
+    credential = CachedCredential(credential_factory=lambda: underlying)
+
+    default = credential.get_token(MANAGEMENT_SCOPE)
+    other_tenant = credential.get_token(MANAGEMENT_SCOPE, tenant_id="other-tenant")
+    challenged = credential.get_token(MANAGEMENT_SCOPE, claims='{"access_token": {}}')
+
+    assert len({default.token, other_tenant.token, challenged.token}) == 3
+    assert credential.get_token(MANAGEMENT_SCOPE) == default
+    credential.close()
+
+
+def _clear_subscription_env(monkeypatch, config_dir):
+    monkeypatch.delenv("AZURE_SUBSCRIPTION_ID", raising=False)
+    monkeypatch.delenv("ARM_SUBSCRIPTION_ID", raising=False)
+    monkeypatch.setenv("AZURE_CONFIG_DIR", str(config_dir))
+
+
+def test_subscription_resolved_from_environment(tmp_path, monkeypatch):
+    _clear_subscription_env(monkeypatch, tmp_path)
+    monkeypatch.setenv("ARM_SUBSCRIPTION_ID", "arm-sub")
+    assert resolve_subscription_id() == "arm-sub"
+
+    # AZURE_SUBSCRIPTION_ID wins over ARM_SUBSCRIPTION_ID
+    monkeypatch.setenv("AZURE_SUBSCRIPTION_ID", " azure-sub ")
+    assert resolve_subscription_id() == "azure-sub"
+
+
+def test_subscription_resolved_from_cli_profile(tmp_path, monkeypatch):
+    _clear_subscription_env(monkeypatch, tmp_path)
+    profile = {"subscriptions": [
+        {"id": "other-sub", "isDefault": False},
+        {"id": "default-sub", "isDefault": True}
+    ]}
+    # The Azure CLI writes its profile with a byte order mark
+    with open(tmp_path / "azureProfile.json", "w", encoding="utf-8-sig") as f:
+        json.dump(profile, f)
+
+    assert resolve_subscription_id() == "default-sub"
+
+
+def test_subscription_unresolved_without_env_or_profile(tmp_path, monkeypatch):
+    _clear_subscription_env(monkeypatch, tmp_path)
+    assert resolve_subscription_id() is None
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Tests for the carbon estimation kernel (vectorised and per-row paths)
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import estimation
+from estimation import estimate_records, factorize, format_usage_date
+
+COLUMNS = [{"name": "Cost"}, {"name": "CostUSD"}, {"name": "UsageDate"}, {"name": "ServiceName"},
+           {"name": "ResourceLocation"}, {"name": "ResourceGroupName"}, {"name": "Currency"}]
+
+
+def _page(rows, columns=COLUMNS):
+    return {"columns": columns, "rows": rows}
+
+
+def _rows():
+    return [
+        [10.0, 10.0, 20250510, "Microsoft.Compute/virtualMachines", "EastUS", "rg-a", "USD"],
+        [5.5, 5.5, 20250510, "Microsoft.Storage/storageAccounts", "eastus", "rg-b", "USD"],
+        [2.0, 2.0, 20250511, "Bandwidth", "WestEurope", "rg-a", "USD"],
+        [1.25, 1.25, "2025-05-12T00:00:00", "Microsoft.Sql/servers", "brazilsouth", "rg-c", "USD"],
+    ]
+
+
+def test_vectorised_estimates_match_the_per_row_path(monkeypatch):
+    pages = [_page(_rows()), _page([]), _page(_rows()[1:])]
+    vectorised = estimate_records(pages)
+
+    monkeypatch.setattr(estimation, "HAVE_NUMPY", False)
+    per_row = estimate_records(pages)
+
+    assert len(vectorised) == 7
+    assert [{k: v for k, v in e.items() if k != "estimatedCarbonKg"} for e in vectorised] == \
+        [{k: v for k, v in e.items() if k != "estimatedCarbonKg"} for e in per_row]
+    for a, b in zip(vectorised, per_row):
+        assert a["estimatedCarbonKg"] == pytest.approx(b["estimatedCarbonKg"], abs=1e-4)
+
+
+def test_estimates_use_service_and_regional_factors():
+    estimates = estimate_records({"properties": _page(_rows())})
+
+    assert estimates[0] == {
+        "date": "2025-05-10", "serviceName": "Microsoft.Compute/virtualMachines", "location": "eastus",
+        "costUSD": 10.0, "estimatedCarbonKg": 2.025, "carbonIntensityFactor": 0.45, "regionalFactor": 0.45
+    }
+    # Unknown service and region fall back to the defaults
+    assert estimates[2]["carbonIntensityFactor"] == 0.30
+    assert estimates[3]["regionalFactor"] == 0.40
+    assert estimates[3]["date"] == "2025-05-12"
+    assert all(type(e["costUSD"]) is float and type(e["estimatedCarbonKg"]) is float for e in estimates)
+
+
+@pytest.mark.parametrize("have_numpy", [True, False])
+def test_missing_columns_use_defaults(monkeypatch, have_numpy):
+    monkeypatch.setattr(estimation, "HAVE_NUMPY", have_numpy)
+    page = _page([[3.0, 20250510]], columns=[{"name": "Cost"}, {"name": "Date"}])
+
+    assert estimate_records([page]) == [{
+        "date": "2025-05-10", "serviceName": "Unknown", "location": "unknown", "costUSD": 0.0,
+        "estimatedCarbonKg": 0.0, "carbonIntensityFactor": 0.30, "regionalFactor": 0.40
+    }]
+
+
+def test_factorize_and_date_formatting():
+    codes, uniques = factorize(["b", "a", "b", "c"])
+
+    assert codes.tolist() == [0, 1, 0, 2]
+    assert uniques == ["b", "a", "c"]
+    assert format_usage_date(20250510) == "2025-05-10"
+    assert format_usage_date(None) == ""
+
+
+def test_display_names_resolve_through_the_factor_registry():
+    page = _page([[4.0, 4.0, 20250510, "Azure App Service", "US East", "rg-a", "USD"],
+                  [4.0, 4.0, 20250510, "Azure App Service", "eastus", "rg-a", "USD"]])
+
+    estimates = estimate_records([page])
+
+    assert [e["location"] for e in estimates] == ["eastus", "eastus"]
+    assert estimates[0]["carbonIntensityFactor"] == 0.35
+    assert estimates[0]["regionalFactor"] == 0.45
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Tests for the carbon factor registry (alias normalisation, memoisation, swapping files)
+"""
+
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import factor_registry
+from estimation import estimate_records
+from factor_registry import FactorRegistry, get_registry, normalize_name
+
+
+def _write(path, data):
+    with open(path, "w") as f:
+        json.dump(data, f)
+    return str(path)
+
+
+def test_bundled_registry_resolves_display_names():
+    registry = FactorRegistry.load()
+
+    assert registry.version
+    assert registry.region_key("US East") == "eastus"
+    assert registry.region_key("us east") == "eastus"
+    assert registry.region_key("EU West") == "westeurope"
+    assert registry.region_key("ZA North") == "za north"
+    assert registry.service_key("Azure App Service") == "Microsoft.Web/serverFarms"
+    assert registry.service_key("microsoft.compute/virtualmachines") == "Microsoft.Compute/virtualMachines"
+    assert registry.service_factor("Virtual Machines") == 0.45
+    assert registry.service_factor("Azure DNS") == registry.carbon_factors["default"]
+    assert registry.regional_factor("Southeast Asia") == 0.55
+    assert registry.regional_factor("unknown") == registry.regional_factors["default"]
+
+
+def test_lookups_are_memoised_per_distinct_string(monkeypatch):
+    registry = FactorRegistry.load()
+    calls = []
+    monkeypatch.setattr(factor_registry, "normalize_name", lambda value: calls.append(value) or normalize_name(value))
+
+    for _ in range(100):
+        registry.service_factor("Storage")
+        registry.regional_factor("US West")
+
+    assert sorted(calls) == ["Storage", "US West"]
+
+
+def test_registry_file_can_be_swapped(tmp_path, monkeypatch):
+    path = _write(tmp_path / "factors.json", {
+        "version": "test-1",
+        "services": {"default": 1.0, "Bandwidth": {"factor": 2.0, "aliases": ["Data Transfer"]}},
+        "regions": {"default": {"factor": 1.0}, "brazilsouth": {"factor": 0.1, "aliases": ["BR South"]}}
+    })
+    monkeypatch.setenv("CARBON_FACTORS_FILE", path)
+
+    registry = get_registry()
+    estimates = estimate_records({"properties": {
+        "columns": [{"name": "CostUSD"}, {"name": "ServiceName"}, {"name": "ResourceLocation"}],
+        "rows": [[10.0, "Data Transfer", "BR South"]]
+    }}, registry)
+
+    assert registry.describe() == {"version": "test-1", "source": "factors.json"}
+    assert estimates[0]["location"] == "brazilsouth"
+    assert estimates[0]["estimatedCarbonKg"] == 2.0
+
+
+def test_invalid_registries_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        FactorRegistry({"Storage": 1.0}, {"default": 1.0})
+    with pytest.raises(ValueError):
+        FactorRegistry({"default": 1.0, "a": {"factor": 1, "aliases": ["Shared"]},
+                        "b": {"factor": 2, "aliases": ["shared"]}}, {"default": 1.0})
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Tests for hourly grid intensity series and the as-of join against usage rows
+"""
+
+import json
+import os
+import sys
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from arm_standin import DEFAULT_SUBSCRIPTION, ArmStandIn
+from azure_carbon_extractor import AzureCarbonExtractor
+from estimation import estimate_records
+from factor_registry import FactorRegistry, get_registry
+from grid_intensity import GridIntensity, parse_timestamps
+from http_session import ArmSession
+
+COLUMNS = [{"name": "CostUSD"}, {"name": "UsageDate"}, {"name": "ServiceName"}, {"name": "ResourceLocation"}]
+
+
+def _hours(day, values):
+    return [f"{day}T{hour:02d}:00:00Z" for hour in range(len(values))], values
+
+
+def _registry(series, max_age_hours=24):
+    registry = FactorRegistry.load()
+    registry.grid_intensity = GridIntensity.from_series(series, max_age_hours)
+    return registry
+
+
+def test_parse_timestamps():
+    seconds = parse_timestamps(["2025-05-10T01:00:00Z", "2025-05-10 01:00:00+00:00", "20250510", "not a date"])
+    assert seconds.tolist() == [1746838800, 1746838800, 1746835200, -1]
+
+
+def test_as_of_join_takes_the_latest_reading_within_max_age():
+    grid = GridIntensity.from_series({
+        "eastus": (["2025-05-10T00:00:00", "2025-05-10T02:00:00"], [400.0, 200.0]),
+        "westeurope": (["2025-05-10T00:00:00"], [100.0]),
+    }, max_age_hours=2)
+    seconds = parse_timestamps(["2025-05-10T01:30:00", "2025-05-10T02:00:00", "2025-05-09T23:00:00",
+                                "2025-05-10T01:00:00", "2025-05-10T05:00:00"])
+    values, found = grid.lookup([0, 0, 0, 1, 1], seconds)
+
+    assert found.tolist() == [True, True, False, True, False]
+    assert values[found].tolist() == [0.4, 0.2, 0.1]
+    # Readings of one region never leak into another
+    assert not grid.lookup([1], parse_timestamps(["2025-05-11T00:00:00"]))[1][0]
+
+
+def test_daily_usage_is_joined_to_the_daily_mean():
+    registry = _registry({"eastus": _hours("2025-05-10", [300.0] * 12 + [500.0] * 12)})
+    rows = [[10.0, 20250510, "Storage", "US East"], [10.0, 20250510, "Storage", "westus"],
+            [10.0, 20250512, "Storage", "eastus"]]
+
+    estimates = estimate_records([{"columns": COLUMNS, "rows": rows}], registry)
+
+    assert [e["regionalFactor"] for e in estimates] == [pytest.approx(0.4), 0.35, 0.45]
+    assert estimates[0]["estimatedCarbonKg"] == pytest.approx(10.0 * 0.15 * 0.4)
+
+
+def test_hourly_usage_is_joined_to_the_hourly_series():
+    registry = _registry({"eastus": _hours("2025-05-10", [300.0, 600.0])})
+    rows = [[1.0, "2025-05-10T00:30:00", "Storage", "eastus"], [1.0, "2025-05-10T01:59:00", "Storage", "eastus"]]
+
+    estimates = estimate_records([{"columns": COLUMNS, "rows": rows}], registry)
+
+    assert [e["regionalFactor"] for e in estimates] == [0.3, 0.6]
+
+
+def test_grid_intensity_without_numpy_is_an_error(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, "grid_intensity", None)
+    with pytest.raises(ImportError, match="need NumPy"):
+        get_registry(None, str(tmp_path / "grid.npz"))
+
+
+@pytest.mark.parametrize("layout", ["directory", "csv", "npz"])
+def test_load_file_layouts(tmp_path, layout):
+    registry = FactorRegistry.load()
+    timestamps, values = _hours("2025-05-10", [250.0, 350.0])
+    if layout == "directory":
+        path = tmp_path / "grid"
+        path.mkdir()
+        (path / "East US.csv").write_text("timestamp,carbonIntensity\n" +
+                                          "".join(f"{t},{v}\n" for t, v in zip(timestamps, values)))
+    else:
+        path = tmp_path / "grid.csv"
+        path.write_text("region,timestamp,carbonIntensity\n" +
+                        "".join(f"US East,{t},{v}\n" for t, v in zip(timestamps, values)))
+        if layout == "npz":
+            GridIntensity.load(str(path), registry).save(str(tmp_path / "grid.npz"))
+            path = tmp_path / "grid.npz"
+
+    grid = GridIntensity.load(str(path), registry)
+
+    assert grid.regions == ["eastus"]
+    assert grid.describe()["readings"] == 2
+    values, found = grid.daily().lookup([0], parse_timestamps(["20250510"]))
+    assert found[0] and values[0] == pytest.approx(0.3)
+
+
+def test_extraction_uses_the_series_for_estimates_cube_and_attribution(tmp_path):
+    start = np.datetime64("2025-05-01T00:00:00")
+    hours = start + np.arange(10 * 24).astype("timedelta64[h]")
+    series = {region: (hours.astype(np.int64), np.full(len(hours), 900.0))
+              for region in ("eastus", "westus", "northeurope", "westeurope")}
+    GridIntensity.from_series(series).save(str(tmp_path / "grid.npz"))
+
+    summaries = {}
+    with ArmStandIn(rows_per_day=20, page_size=200, resources=20) as standin:
+        for mode, grid_file in (("static", None), ("grid", str(tmp_path / "grid.npz"))):
+            extractor = AzureCarbonExtractor(subscription_id=DEFAULT_SUBSCRIPTION, http=ArmSession(max_retries=3))
+            extractor.configure(base_url=standin.url, grid_intensity_file=grid_file,
+                                output_file=str(tmp_path / f"{mode}.json"), csv_file=str(tmp_path / f"{mode}.csv"))
+            extractor._cost_period = lambda: (datetime(2025, 5, 1), datetime(2025, 5, 10))
+            assert extractor.run_extraction()
+            with open(extractor.output_file) as f:
+                summaries[mode] = json.load(f)
+
+    grid = summaries["grid"]
+    assert grid["metadata"]["carbonFactors"]["gridIntensity"]["regions"] == 4
+    assert all(e["regionalFactor"] == pytest.approx(0.9) for e in grid["carbonEstimates"] if e["location"] in series)
+    assert grid["summary"]["totalCostUSD"] == pytest.approx(summaries["static"]["summary"]["totalCostUSD"])
+    assert grid["summary"]["totalEstimatedCarbonKg"] > summaries["static"]["summary"]["totalEstimatedCarbonKg"]
+    assert grid["summary"]["resourceAttribution"]["attributedCarbonKg"] + \
+        grid["summary"]["resourceAttribution"]["unattributedCarbonKg"] == \
+        pytest.approx(grid["summary"]["totalEstimatedCarbonKg"], abs=0.01)
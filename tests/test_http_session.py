@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared ARM HTTP session (retry/backoff and header parsing)
+"""
+
+import io
+import os
+import sys
+import threading
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import http_session
+from http_session import ArmSession, BudgetedSession, parse_retry_after
+
+
+def _response(status, headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    response._content = b"{}"
+    response.raw = io.BytesIO(b"")
+    return response
+
+
+def test_parse_retry_after_variants():
+    assert parse_retry_after({"Retry-After": "7"}) == 7.0
+    assert parse_retry_after({"retry-after-ms": "1500"}) == 1.5
+    assert parse_retry_after({"x-ms-ratelimit-microsoft.costmanagement-qpu-retry-after": "12"}) == 12.0
+    assert parse_retry_after({"x-ms-user-quota-remaining": "0",
+                              "x-ms-user-quota-resets-after": "00:00:05"}) == 5.0
+    assert parse_retry_after({"Content-Type": "application/json"}) is None
+
+
+def test_retries_throttled_requests_then_succeeds(monkeypatch):
+    session = ArmSession(max_retries=3)
+    responses = [_response(429, {"Retry-After": "2"}), _response(503), _response(200)]
+    sleeps = []
+    monkeypatch.setattr(session.session, "request", lambda *a, **k: responses.pop(0))
+    monkeypatch.setattr(http_session.time, "sleep", sleeps.append)
+
+    response = session.get("https://management.azure.com/subscriptions/x")
+
+    assert response.status_code == 200
+    assert len(sleeps) == 2
+    assert sleeps[0] >= 2.0
+    assert session.stats["retries"] == 2
+    assert session.stats["throttled"] == 1
+
+
+def test_gives_up_after_max_retries(monkeypatch):
+    session = ArmSession(max_retries=2, backoff_factor=0.01)
+    monkeypatch.setattr(session.session, "request", lambda *a, **k: _response(503))
+    monkeypatch.setattr(http_session.time, "sleep", lambda s: None)
+
+    response = session.post("https://management.azure.com/providers/x")
+
+    assert response.status_code == 503
+    assert session.stats["requests"] == 3
+    assert session.stats["failures"] == 1
+
+
+def test_backoff_is_bounded():
+    session = ArmSession(backoff_factor=1.0, backoff_max=8.0)
+    for attempt in range(10):
+        assert 0 <= session.backoff_delay(attempt) <= 8.0
+
+
+def test_budget_is_released_while_waiting_to_retry(monkeypatch):
+    session = ArmSession(max_retries=3)
+    semaphore = threading.Semaphore(1)
+    responses = [_response(429, {"Retry-After": "5"}), _response(200)]
+    held_while_sleeping = []
+    monkeypatch.setattr(session.session, "request", lambda *a, **k: responses.pop(0))
+    monkeypatch.setattr(http_session.time, "sleep", lambda s: held_while_sleeping.append(not semaphore.acquire(False))
+                        or semaphore.release())
+
+    response = BudgetedSession(session, semaphore).get("https://management.azure.com/subscriptions/x")
+
+    assert response.status_code == 200
+    assert held_while_sleeping == [False]
+    assert semaphore.acquire(False)
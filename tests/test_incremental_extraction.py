@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Tests for incremental extraction driven by the persisted watermark
+"""
+
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from azure_carbon_extractor import AzureCarbonExtractor
+from extraction_state import ExtractionState
+
+COLUMNS = [{"name": "CostUSD", "type": "Number"}, {"name": "UsageDate", "type": "Number"},
+           {"name": "ServiceName", "type": "String"}, {"name": "ResourceLocation", "type": "String"}]
+
+
+class FakeResponse:
+    def __init__(self, payload, status_code=200):
+        self.payload = payload
+        self.status_code = status_code
+        self.text = str(payload)
+
+    def json(self):
+        return self.payload
+
+
+class DailyCostHttp:
+    """One row per day in the requested window; every other endpoint is empty"""
+
+    def __init__(self, cost=1.0):
+        self.cost = cost
+        self.periods = []
+
+    def post(self, url, json=None, **kwargs):
+        if "Microsoft.CostManagement" not in url:
+            return FakeResponse({"data": []})
+        start = datetime.strptime(json["timePeriod"]["from"][:10], "%Y-%m-%d")
+        end = datetime.strptime(json["timePeriod"]["to"][:10], "%Y-%m-%d")
+        self.periods.append((start.date(), end.date()))
+        rows = [[self.cost, int((start + timedelta(days=i)).strftime("%Y%m%d")), "Storage", "US East"]
+                for i in range((end - start).days + 1)]
+        return FakeResponse({"properties": {"columns": COLUMNS, "rows": rows}})
+
+    def get(self, url, **kwargs):
+        return FakeResponse({"value": []})
+
+
+def _run(tmp_path, http):
+    extractor = AzureCarbonExtractor(subscription_id="sub", http=http)
+    extractor.output_file = str(tmp_path / "azure_carbon_data.json")
+    extractor.csv_file = str(tmp_path / "azure_carbon_data.csv")
+    extractor.configure(incremental=True, restatement_days=3, cost_days=30)
+    extractor.authenticate = lambda: True
+    assert extractor.run_extraction()
+    return json.load(open(extractor.output_file))
+
+
+def test_second_run_only_queries_new_days_and_merges(tmp_path):
+    first = _run(tmp_path, DailyCostHttp(cost=1.0))
+    yesterday = (datetime.now() - timedelta(days=1)).date()
+    state = ExtractionState(str(tmp_path / ".extraction_state.json"))
+    assert state.get_watermark("sub") == yesterday
+
+    http = DailyCostHttp(cost=2.0)
+    second = _run(tmp_path, http)
+
+    start, end = http.periods[0]
+    assert start == yesterday - timedelta(days=2)
+    assert end == datetime.now().date()
+
+    dates = [e["date"] for e in second["carbonEstimates"]]
+    assert len(dates) == len(set(dates)) == len(first["carbonEstimates"])
+    assert dates == sorted(dates)
+    # Restated days carry the new cost, older days the original one
+    by_date = {e["date"]: e["costUSD"] for e in second["carbonEstimates"]}
+    assert by_date[start.strftime("%Y-%m-%d")] == 2.0
+    assert by_date[dates[0]] == 1.0
+    assert len(second["costManagementData"]["properties"]["rows"]) == len(dates)
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Tests for the long-running-operation poller and asynchronous exports
+"""
+
+import json
+import os
+import sys
+import threading
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from carbon_api_client import CarbonOptimizationClient, create_exports
+from lro_poller import LroPoller
+
+
+def _response(status, body=None, headers=None, url=""):
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    response._content = json.dumps(body).encode() if body is not None else b""
+    response.url = url
+    return response
+
+
+class ScriptedHttp:
+    """Answers GETs from a per-URL script of responses; the last one repeats"""
+
+    def __init__(self, scripts=None):
+        self.scripts = scripts or {}
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def get(self, url, **kwargs):
+        with self.lock:
+            self.calls.append(url)
+            script = self.scripts[url.split("?", 1)[0]]
+            return script.pop(0) if len(script) > 1 else script[0]
+
+    def put(self, url, **kwargs):
+        subscription_id = url.split("/subscriptions/")[1].split("/")[0]
+        return _response(202, headers={
+            "Azure-AsyncOperation": f"https://arm/operations/{subscription_id}",
+            "Retry-After": "0"
+        })
+
+
+def test_location_polling_until_result():
+    http = ScriptedHttp({"https://arm/poll": [
+        _response(202, headers={"Retry-After": "0"}),
+        _response(202, headers={"Retry-After": "0"}),
+        _response(200, {"rows": [[1]]})
+    ]})
+    poller = LroPoller(http, default_interval=0.01)
+    operation = poller.add("query", _response(202, headers={"Location": "https://arm/poll", "Retry-After": "0"}),
+                           method="POST", url="https://arm/query")
+
+    poller.run()
+
+    assert operation.succeeded
+    assert operation.result == {"rows": [[1]]}
+    assert operation.polls == 3
+
+
+def test_async_operation_failure_is_reported():
+    http = ScriptedHttp({"https://arm/op": [
+        _response(200, {"status": "InProgress"}, {"Retry-After": "0"}),
+        _response(200, {"status": "Failed", "error": {"code": "QuotaExceeded"}})
+    ]})
+    poller = LroPoller(http, default_interval=0.01)
+    operation = poller.add("export", _response(201, headers={"Azure-AsyncOperation": "https://arm/op"}))
+
+    poller.run()
+
+    assert operation.status == "Failed"
+    assert operation.error == {"code": "QuotaExceeded"}
+
+
+def test_immediate_responses_resolve_without_polling():
+    http = ScriptedHttp()
+    poller = LroPoller(http)
+    done = poller.add("sync", _response(200, {"id": "x"}))
+    failed = poller.add("bad", _response(400, {"error": {"code": "BadRequest"}}))
+
+    poller.run()
+
+    assert done.result == {"id": "x"}
+    assert failed.status == "Failed"
+    assert http.calls == []
+
+
+def test_operation_times_out():
+    http = ScriptedHttp({"https://arm/slow": [_response(202, headers={"Retry-After": "0"})]})
+    poller = LroPoller(http, default_interval=0.01, timeout=0.05)
+    operation = poller.add("slow", _response(202, headers={"Location": "https://arm/slow", "Retry-After": "0"}))
+
+    poller.run()
+
+    assert operation.status == "TimedOut"
+
+
+def test_exports_for_many_subscriptions_are_collected_in_one_pass():
+    subscription_ids = [f"sub-{i}" for i in range(50)]
+    scripts = {}
+    for subscription_id in subscription_ids:
+        scripts[f"https://arm/operations/{subscription_id}"] = [
+            _response(200, {"status": "Running"}, {"Retry-After": "0"}),
+            _response(200, {"status": "Succeeded"})
+        ]
+        export_url = (f"https://management.azure.com/subscriptions/{subscription_id}"
+                      f"/providers/Microsoft.Carbon/exports/carbon-export")
+        scripts[export_url] = [_response(200, {"name": "carbon-export", "subscription": subscription_id})]
+    http = ScriptedHttp(scripts)
+    http.replay = True
+
+    operations = create_exports(subscription_ids, http=http)
+
+    assert len(operations) == 50
+    assert all(operation.succeeded for operation in operations.values())
+    assert operations["sub-7"].result["subscription"] == "sub-7"
+
+
+def test_create_export_waits_for_async_acceptance():
+    http = ScriptedHttp({
+        "https://arm/operations/sub": [_response(200, {"status": "Succeeded"})],
+        "https://management.azure.com/subscriptions/sub/providers/Microsoft.Carbon/exports/daily": [
+            _response(200, {"name": "daily"})
+        ]
+    })
+    client = CarbonOptimizationClient(subscription_id="sub", http=http)
+
+    assert client.create_export("daily") == {"name": "daily"}
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Tests for the region migration what-if simulator
+"""
+
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from factor_registry import FactorRegistry
+from grid_intensity import GridIntensity
+from migration_simulator import MigrationSimulator
+from rollup_cube import RollupCube
+
+COLUMNS = ["CostUSD", "UsageDate", "ServiceName", "ResourceLocation", "ResourceGroupName"]
+
+ROWS = [
+    [100.0, 20250510, "Virtual Machines", "southeastasia", "rg-a"],
+    [50.0, 20250511, "Storage", "southeastasia", "rg-b"],
+    [80.0, 20250510, "Virtual Machines", "eastus", "rg-a"],
+]
+
+
+def _cube(registry):
+    cube = RollupCube()
+    cube.add_page(COLUMNS, ROWS, "sub-1", registry)
+    return cube
+
+
+def test_every_region_pair_matches_re_estimating_with_the_target_factor():
+    registry = FactorRegistry.load()
+    simulator = MigrationSimulator(_cube(registry), registry)
+
+    assert simulator.projected.shape == (2, len(simulator.targets))
+    assert set(simulator.targets) >= {"eastus", "westus", "northeurope", "westeurope", "southeastasia"}
+    for (_, source), current in zip(simulator.workloads, simulator.current):
+        for target in simulator.targets:
+            moved = [[cost, date, service, target, group] for cost, date, service, location, group in ROWS
+                     if location == source]
+            expected = RollupCube()
+            expected.add_page(COLUMNS, moved, "sub-1", registry)
+            scenario = simulator.scenario(source, target)
+            assert scenario["projectedCarbonKg"] == pytest.approx(expected.totals()["estimatedCarbonKg"], abs=1e-3)
+            assert scenario["currentCarbonKg"] == pytest.approx(current, abs=1e-4)
+
+
+def test_ranked_savings_per_service():
+    registry = FactorRegistry.load()
+    simulator = MigrationSimulator(_cube(registry), registry, group_by="serviceName", location="southeastasia")
+
+    ranked = simulator.ranked()
+
+    assert ranked[0] == {"serviceName": "Virtual Machines", "source": "southeastasia", "target": "northeurope",
+                         "costUSD": 100.0, "currentCarbonKg": 24.75, "projectedCarbonKg": 11.25,
+                         "savingsKg": 13.5, "savingsPercent": 54.55}
+    assert [s["savingsKg"] for s in ranked] == sorted((s["savingsKg"] for s in ranked), reverse=True)
+    assert all(s["savingsKg"] > 0 and s["source"] != s["target"] for s in ranked)
+    assert [(s["serviceName"], s["target"]) for s in simulator.ranked(top=2, targets=["westus", "eastus"])] == \
+        [("Virtual Machines", "westus"), ("Virtual Machines", "eastus")]
+
+
+def test_target_factors_follow_the_grid_intensity_series():
+    registry = FactorRegistry.load()
+    registry.grid_intensity = GridIntensity.from_series({
+        "northeurope": (["2025-05-10T00:00:00", "2025-05-11T00:00:00"], [1000.0, 50.0])})
+    simulator = MigrationSimulator(_cube(registry), registry, targets=["northeurope", "westus"])
+
+    factors = simulator.target_factors()
+    assert simulator.dates == ["2025-05-10", "2025-05-11"]
+    np.testing.assert_allclose(factors, [[1.0, 0.05], [0.35, 0.35]])
+
+    move = simulator.scenario("southeastasia", "northeurope")
+    assert move["projectedCarbonKg"] == pytest.approx(100 * 0.45 * 1.0 + 50 * 0.15 * 0.05)
+
+
+def test_baseline_uses_the_simulation_factors_not_the_cube_carbon():
+    # Cube estimated with a grid series, simulation with the static factors only
+    cube_registry = FactorRegistry.load()
+    cube_registry.grid_intensity = GridIntensity.from_series({"southeastasia": (["2025-05-10T00:00:00"], [2000.0])})
+    registry = FactorRegistry.load()
+    simulator = MigrationSimulator(_cube(cube_registry), registry)
+
+    no_op = simulator.scenario("southeastasia", "southeastasia")
+    assert no_op["savingsKg"] == 0.0
+    assert no_op["currentCarbonKg"] == \
+        pytest.approx((100 * 0.45 + 50 * 0.15) * registry.regional_factor("southeastasia"))
+    assert simulator.scenario("eastus", "eastus")["savingsKg"] == 0.0
+
+
+def test_unknown_grouping_is_rejected():
+    with pytest.raises(ValueError):
+        MigrationSimulator(RollupCube(), FactorRegistry.load(), group_by="location")
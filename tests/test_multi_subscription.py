@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Tests for the multi-subscription fan-out extractor
+"""
+
+import csv
+import json
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from multi_subscription import MultiSubscriptionExtractor
+from streaming_export import ESTIMATE_FIELDS
+
+COLUMNS = [{"name": "CostUSD", "type": "Number"}, {"name": "UsageDate", "type": "Number"},
+           {"name": "ServiceName", "type": "String"}, {"name": "ResourceLocation", "type": "String"}]
+
+
+class FakeResponse:
+    def __init__(self, payload, status_code=200):
+        self.payload = payload
+        self.status_code = status_code
+        self.text = str(payload)
+
+    def json(self):
+        return self.payload
+
+
+class FakeArm:
+    """Minimal stand-in for the ARM endpoints the fan-out touches"""
+
+    def __init__(self, tenants):
+        self.tenants = tenants
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+
+    def request(self, method, url, json=None, **kwargs):
+        with self.lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        try:
+            time.sleep(0.01)
+            return self._route(method, url, json)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def _route(self, method, url, body):
+        if "/descendants" in url:
+            return FakeResponse({"value": [
+                {"name": "sub-c", "type": "Microsoft.Management/managementGroups/subscriptions"},
+                {"name": "child-mg", "type": "Microsoft.Management/managementGroups"}
+            ]})
+        if url.split("?")[0].endswith("/subscriptions"):
+            return FakeResponse({"value": [{"subscriptionId": s, "tenantId": t} for s, t in self.tenants.items()]})
+        if "Microsoft.ResourceGraph" in url:
+            return FakeResponse({"data": [{"id": f"/subscriptions/{s}/vm", "subscriptionId": s}
+                                          for s in body["subscriptions"]]})
+        if "Microsoft.CostManagement" in url:
+            subscription = url.split("/subscriptions/")[1].split("/")[0]
+            rows = [[1.5, 20250601, "Storage", "US East"]] * (2 if subscription == "sub-a" else 1)
+            return FakeResponse({"properties": {"columns": COLUMNS, "rows": rows}})
+        return FakeResponse({"value": []})
+
+
+def test_fan_out_writes_partitions_and_merged_output(tmp_path, monkeypatch):
+    http = FakeArm({"sub-a": "t1", "sub-b": "t1", "sub-c": "t2"})
+    extractor = MultiSubscriptionExtractor(["sub-a", "sub-b"], management_group="mg", max_workers=3,
+                                           tenant_budget=1, output_dir=str(tmp_path), http=http)
+    monkeypatch.setattr(extractor, "authenticate", lambda: True)
+
+    assert extractor.run_extraction()
+
+    merged = json.load(open(extractor.output_file))
+    assert merged["metadata"]["subscriptionIds"] == ["sub-a", "sub-b", "sub-c"]
+    assert merged["summary"]["dataPointCount"] == 4
+    assert merged["summary"]["bySubscription"]["sub-a"]["resourceCount"] == 1
+    assert {e["subscriptionId"] for e in merged["carbonEstimates"]} == {"sub-a", "sub-b", "sub-c"}
+    for subscription_id in ("sub-a", "sub-b", "sub-c"):
+        assert os.path.exists(tmp_path / "subscriptions" / subscription_id / "azure_carbon_data.json")
+    with open(extractor.csv_file, newline='') as f:
+        reader = csv.DictReader(f)
+        assert reader.fieldnames == ["subscriptionId"] + ESTIMATE_FIELDS
+        assert len(list(reader)) == 4
+
+    # Two tenants with a budget of one request each
+    assert http.peak <= 2
+
+
+def test_streaming_fan_out_writes_partitions_row_by_row(tmp_path, monkeypatch):
+    from azure_carbon_extractor import AzureCarbonExtractor
+
+    http = FakeArm({"sub-a": "t1", "sub-b": "t1"})
+    extractor = MultiSubscriptionExtractor(["sub-a", "sub-b"], output_dir=str(tmp_path), http=http,
+                                           extractor_settings={"streaming": True})
+    monkeypatch.setattr(extractor, "authenticate", lambda: True)
+    monkeypatch.setattr(AzureCarbonExtractor, "get_cost_management_data", lambda self: pytest.fail("not streamed"))
+
+    assert extractor.run_extraction()
+
+    merged = json.load(open(extractor.output_file))
+    assert merged["carbonEstimates"] == []
+    assert merged["metadata"]["carbonEstimatesFile"] == "azure_carbon_data.csv"
+    assert merged["summary"]["dataPointCount"] == 3
+    with open(extractor.csv_file, newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert [row["subscriptionId"] for row in rows] == ["sub-a", "sub-a", "sub-b"]
+    assert os.path.exists(tmp_path / "subscriptions" / "sub-a" / "azure_carbon_data.ndjson")
+
+
+def test_failed_export_does_not_advance_the_watermark(tmp_path, monkeypatch):
+    from azure_carbon_extractor import AzureCarbonExtractor
+
+    http = FakeArm({"sub-a": "t1", "sub-b": "t1"})
+    extractor = MultiSubscriptionExtractor(["sub-a", "sub-b"], output_dir=str(tmp_path), http=http,
+                                           extractor_settings={"incremental": True})
+    monkeypatch.setattr(extractor, "authenticate", lambda: True)
+    export_data = AzureCarbonExtractor.export_data
+    monkeypatch.setattr(AzureCarbonExtractor, "export_data", lambda self, *a, **k:
+                        self.subscription_id != "sub-b" and export_data(self, *a, **k))
+
+    assert extractor.run_extraction()
+
+    merged = json.load(open(extractor.output_file))
+    assert merged["metadata"]["failedSubscriptions"] == ["sub-b"]
+    state = extractor.extractor_settings["state"]
+    assert state.get_watermark("sub-a") is not None
+    assert state.get_watermark("sub-b") is None
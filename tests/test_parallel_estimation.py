@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Tests for multi-process estimation and aggregation of raw Cost Management pages
+"""
+
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import estimation
+from arm_standin import DEFAULT_SUBSCRIPTION, ArmStandIn
+from azure_carbon_extractor import AzureCarbonExtractor
+from factor_registry import FactorRegistry
+from grid_intensity import GridIntensity
+from http_session import ArmSession
+from multi_subscription import MultiSubscriptionExtractor
+from parallel_estimation import ParallelEstimator, PartialAggregates, aggregate_page
+
+COLUMNS = [{"name": "CostUSD"}, {"name": "UsageDate"}, {"name": "ServiceName"},
+           {"name": "ResourceLocation"}, {"name": "ResourceGroupName"}]
+
+
+def _payload(rows, next_link=None):
+    return json.dumps({"properties": {"nextLink": next_link, "columns": COLUMNS, "rows": rows}}).encode()
+
+
+ROWS = [
+    [10.0, 20250510, "Virtual Machines", "US East", "rg-a"],
+    [5.0, 20250510, "Virtual Machines", "eastus", "rg-b"],
+    [2.0, 20250511, "Storage", "westeurope", "rg-a"],
+    [1.0, 20250511, "Storage", "westeurope", "rg-a"],
+]
+
+
+@pytest.mark.parametrize("have_numpy", [True, False])
+def test_page_is_estimated_and_pre_aggregated(monkeypatch, have_numpy):
+    monkeypatch.setattr(estimation, "HAVE_NUMPY", have_numpy)
+    monkeypatch.setattr(sys.modules["rollup_cube"], "HAVE_NUMPY", have_numpy)
+
+    rows, cells = aggregate_page(_payload(ROWS))
+
+    assert rows == 4
+    assert sorted(cells) == [
+        ("2025-05-10", "Virtual Machines", "eastus", "rg-a", 10.0, pytest.approx(2.025), 1),
+        ("2025-05-10", "Virtual Machines", "eastus", "rg-b", 5.0, pytest.approx(1.0125), 1),
+        ("2025-05-11", "Storage", "westeurope", "rg-a", 3.0, pytest.approx(0.135), 2),
+    ]
+
+
+def test_partial_aggregates_merge_to_the_batch_totals():
+    aggregates = PartialAggregates()
+    aggregates.merge(aggregate_page(_payload(ROWS[:2])))
+    aggregates.merge(aggregate_page(_payload(ROWS[2:])))
+    aggregates.merge(aggregate_page(_payload([])))
+
+    batch = estimation.estimate_records([{"columns": COLUMNS, "rows": ROWS}])
+    records = aggregates.records()
+
+    assert aggregates.rows == 4 and aggregates.pages == 3
+    assert [(r["date"], r["serviceName"], r["location"]) for r in records] == \
+        [("2025-05-10", "Virtual Machines", "eastus"), ("2025-05-11", "Storage", "westeurope")]
+    assert sum(r["costUSD"] for r in records) == sum(e["costUSD"] for e in batch)
+    assert sum(r["estimatedCarbonKg"] for r in records) == pytest.approx(sum(e["estimatedCarbonKg"] for e in batch))
+
+
+def test_records_carry_the_grid_factor_behind_their_carbon():
+    registry = FactorRegistry.load()
+    registry.grid_intensity = GridIntensity.from_series({
+        "eastus": (["2025-05-10T00:00:00", "2025-05-10T12:00:00"], [200.0, 600.0])})
+    aggregates = PartialAggregates(registry)
+    aggregates.cube.add_page([c["name"] for c in COLUMNS], ROWS, None, registry)
+
+    records = aggregates.records()
+    batch = estimation.estimate_records([{"columns": COLUMNS, "rows": ROWS}], registry)
+
+    assert records[0]["regionalFactor"] == pytest.approx(0.4) == batch[0]["regionalFactor"]
+    assert records[1]["regionalFactor"] == registry.regional_factor("westeurope")
+    for record in records:
+        assert record["estimatedCarbonKg"] == pytest.approx(
+            record["costUSD"] * record["carbonIntensityFactor"] * record["regionalFactor"], abs=1e-4)
+
+
+def test_worker_processes_give_the_same_aggregates():
+    payloads = [_payload([row]) for row in ROWS * 5]
+    sequential = PartialAggregates()
+    for payload in payloads:
+        sequential.merge(aggregate_page(payload))
+
+    with ParallelEstimator(processes=2) as estimator:
+        parallel = estimator.aggregate(iter(payloads))
+
+    assert parallel.records() == sequential.records()
+    assert parallel.cube.rollup("resourceGroup") == sequential.cube.rollup("resourceGroup")
+
+
+def test_pages_in_flight_are_bounded_across_callers():
+    payloads = [_payload([row]) for row in ROWS * 10]
+    lock = threading.Lock()
+    futures = []
+    peak = 0
+
+    with ParallelEstimator(processes=1) as estimator:
+        assert estimator._pool._mp_context.get_start_method() != "fork"
+        submit = estimator._pool.submit
+
+        def tracked_submit(*args):
+            nonlocal peak
+            future = submit(*args)
+            with lock:
+                futures.append(future)
+                peak = max(peak, sum(not f.done() for f in futures))
+            return future
+
+        estimator._pool.submit = tracked_submit
+        with ThreadPoolExecutor(max_workers=4) as threads:
+            results = list(threads.map(lambda _: estimator.aggregate(iter(payloads)), range(4)))
+
+    # Two pages per worker process, however many threads feed the pool
+    assert peak <= 2
+    assert all(result.rows == len(payloads) for result in results)
+
+
+def test_parallel_extraction_matches_the_batch_pipeline(tmp_path):
+    totals = {}
+    with ArmStandIn(rows_per_day=60, page_size=250, resources=30) as standin:
+        for mode, processes in (("batch", None), ("parallel", 2)):
+            extractor = AzureCarbonExtractor(subscription_id=DEFAULT_SUBSCRIPTION, http=ArmSession(max_retries=3))
+            extractor.configure(base_url=standin.url, estimation_processes=processes, cost_chunk_days=10,
+                                output_file=str(tmp_path / f"{mode}.json"), csv_file=str(tmp_path / f"{mode}.csv"))
+            extractor._cost_period = lambda: (datetime(2025, 5, 1), datetime(2025, 5, 30))
+            assert extractor.run_extraction()
+            with open(extractor.output_file) as f:
+                totals[mode] = json.load(f)["summary"]
+
+    assert totals["parallel"]["totalCostUSD"] == pytest.approx(totals["batch"]["totalCostUSD"])
+    assert totals["parallel"]["totalEstimatedCarbonKg"] == pytest.approx(totals["batch"]["totalEstimatedCarbonKg"])
+    assert totals["parallel"]["dataPointCount"] < totals["batch"]["dataPointCount"]
+    assert totals["parallel"]["resourceAttribution"]["attributedCostUSD"] == \
+        pytest.approx(totals["batch"]["resourceAttribution"]["attributedCostUSD"])
+
+
+def test_subscriptions_are_partitions_on_a_shared_pool(tmp_path):
+    subscriptions = [DEFAULT_SUBSCRIPTION, "00000000-0000-0000-0000-000000000002"]
+    with ArmStandIn(rows_per_day=20, page_size=200, subscriptions=subscriptions) as standin:
+        extractor = MultiSubscriptionExtractor(subscription_ids=subscriptions, output_dir=str(tmp_path),
+                                               http=ArmSession(max_retries=3),
+                                               extractor_settings={"base_url": standin.url, "cost_days": 5,
+                                                                   "estimation_processes": 2})
+        assert extractor.run_extraction()
+
+    with open(extractor.output_file) as f:
+        merged = json.load(f)
+    assert sorted(merged["summary"]["bySubscription"]) == subscriptions
+    assert all(s["dataPointCount"] > 0 for s in merged["summary"]["bySubscription"].values())
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Tests for the adaptive per-endpoint-family rate limiter
+"""
+
+import io
+import os
+import sys
+import threading
+import time
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import http_session
+import rate_limiter
+from http_session import ArmSession, parse_quota, run_metrics
+from rate_limiter import AdaptiveRateLimiter, endpoint_family
+
+COST_URL = "https://management.azure.com/subscriptions/x/providers/Microsoft.CostManagement/query"
+GRAPH_URL = "https://management.azure.com/providers/Microsoft.ResourceGraph/resources"
+INSIGHTS_URL = "https://management.azure.com/subscriptions/x/providers/Microsoft.Insights/metrics"
+
+
+def test_endpoint_families():
+    assert endpoint_family(COST_URL + "?api-version=2023-03-01") == "microsoft.costmanagement"
+    assert endpoint_family(GRAPH_URL) == "microsoft.resourcegraph"
+    assert endpoint_family("https://management.azure.com/subscriptions/x/resources") == "arm"
+    assert endpoint_family("https://management.azure.com/subscriptions/x/resourceGroups/rg/providers/"
+                           "Microsoft.Compute/virtualMachines/vm/providers/Microsoft.Carbon/x") == "microsoft.carbon"
+
+
+def test_parse_quota_takes_tightest_quota():
+    remaining, resets_after = parse_quota({
+        "x-ms-ratelimit-remaining-subscription-reads": "11999",
+        "x-ms-ratelimit-remaining-tenant-reads": "40",
+        "x-ms-user-quota-remaining": "7",
+        "x-ms-user-quota-resets-after": "00:00:05"
+    })
+    assert remaining == 7.0
+    assert resets_after == 5.0
+    assert parse_quota({"Content-Type": "application/json"}) == (None, None)
+
+
+def test_quota_window_sets_the_pace():
+    limiter = AdaptiveRateLimiter()
+    limiter.observe(GRAPH_URL, 200, remaining=10, resets_after=5)
+    assert limiter.snapshot()["microsoft.resourcegraph"]["ratePerSecond"] == 2.0
+
+
+def test_rate_rises_while_quota_is_plentiful_and_falls_when_low():
+    limiter = AdaptiveRateLimiter(initial_rate=4.0, increase_step=1.0, rates={})
+    limiter.observe(COST_URL, 200, remaining=100)
+    assert limiter.snapshot()["microsoft.costmanagement"]["ratePerSecond"] == 5.0
+
+    limiter.observe(COST_URL, 200, remaining=10)
+    assert limiter.snapshot()["microsoft.costmanagement"]["ratePerSecond"] == 2.5
+
+
+def test_throttling_halves_rate_and_holds_the_family():
+    limiter = AdaptiveRateLimiter(initial_rate=8.0, rates={})
+    limiter.observe(COST_URL, 429, retry_after=3)
+
+    state = limiter.snapshot()["microsoft.costmanagement"]
+    assert state["ratePerSecond"] == 4.0
+    assert state["throttled"] == 1
+    # Every caller in the family now waits out Retry-After, spaced at the new rate
+    bucket = limiter.families["microsoft.costmanagement"]["bucket"]
+    assert 3.0 <= bucket.reserve() <= 3.5
+    # Other families are unaffected
+    assert limiter.families.get("microsoft.resourcegraph") is None
+
+
+def test_fresh_family_is_capped_at_max_rate(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(rate_limiter, "time", type("FakeTime", (), {
+        "monotonic": staticmethod(lambda: clock[0]),
+        "sleep": staticmethod(lambda seconds: clock.__setitem__(0, clock[0] + seconds))}))
+    limiter = AdaptiveRateLimiter(max_rate=2.0)
+
+    sent = []
+    for _ in range(20):
+        limiter.acquire(INSIGHTS_URL)
+        sent.append(clock[0])
+
+    assert limiter.snapshot()["microsoft.insights"]["ratePerSecond"] == 2.0
+    # The initial burst is capped too: by time t at most 2 + 2t requests have gone out
+    assert limiter.burst <= 2
+    assert all(i + 1 <= 2 + 2 * t for i, t in enumerate(sent))
+    assert sent[-1] >= 9.0
+    assert AdaptiveRateLimiter(max_rate=0.5).initial_rate == 0.5
+
+
+def test_limiter_is_shared_across_threads():
+    limiter = AdaptiveRateLimiter(initial_rate=50.0, burst=5, rates={})
+    start = time.monotonic()
+    threads = [threading.Thread(target=limiter.acquire, args=(GRAPH_URL,)) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # 5 requests go out immediately, the other 15 at 50/s
+    assert time.monotonic() - start >= 0.25
+    assert limiter.snapshot()["microsoft.resourcegraph"]["requests"] == 20
+
+
+def test_session_feeds_responses_to_the_limiter(monkeypatch):
+    limiter = AdaptiveRateLimiter()
+    session = ArmSession(max_retries=1, rate_limiter=limiter)
+
+    def respond(*args, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        response.headers.update({"x-ms-user-quota-remaining": "6", "x-ms-user-quota-resets-after": "00:00:02"})
+        response._content = b"{}"
+        response.raw = io.BytesIO(b"")
+        return response
+
+    monkeypatch.setattr(session.session, "request", respond)
+    monkeypatch.setattr(rate_limiter.time, "sleep", lambda s: None)
+    monkeypatch.setattr(http_session.time, "sleep", lambda s: None)
+
+    session.post(GRAPH_URL)
+    metrics = run_metrics(session)
+
+    assert metrics["requests"]["requests"] == 1
+    assert metrics["rateLimits"]["microsoft.resourcegraph"]["ratePerSecond"] == 3.0
+    assert metrics["rateLimits"]["microsoft.resourcegraph"]["remainingQuota"] == 6.0
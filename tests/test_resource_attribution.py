@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Tests for the hash-indexed join of cost rows to the Resource Graph inventory
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from resource_attribution import ResourceAttributor, attribute_to_resources
+
+COLUMNS = [{"name": "CostUSD"}, {"name": "UsageDate"}, {"name": "ServiceName"},
+           {"name": "ResourceLocation"}, {"name": "ResourceGroupName"}]
+
+
+def _resource(name, resource_type, group, location):
+    return {"id": f"/subscriptions/s/resourceGroups/{group}/providers/{resource_type}/{name}", "name": name,
+            "type": resource_type.lower(), "resourceGroup": group, "location": location, "subscriptionId": "s"}
+
+
+INVENTORY = [
+    _resource("vm-1", "Microsoft.Compute/virtualMachines", "rg-app", "eastus"),
+    _resource("vm-2", "Microsoft.Compute/virtualMachines", "rg-app", "eastus"),
+    _resource("vm-3", "Microsoft.Compute/virtualMachines", "rg-app", "westeurope"),
+    _resource("st-1", "Microsoft.Storage/storageAccounts", "rg-app", "eastus"),
+    _resource("plan-1", "Microsoft.Web/serverFarms", "rg-web", "westus"),
+]
+
+
+def _by_name(result):
+    return {r["name"]: r for r in result["resources"]}
+
+
+def test_cost_is_split_across_the_most_specific_matching_resources():
+    pages = [
+        {"columns": COLUMNS, "rows": [
+            [10.0, 20250510, "Virtual Machines", "US East", "RG-APP"],
+            [10.0, 20250511, "Virtual Machines", "US East", "rg-app"],
+            [6.0, 20250510, "Storage", "eastus", "rg-app"],
+        ]},
+        {"columns": COLUMNS, "rows": [
+            [4.0, 20250510, "Azure App Service", "Central US", "rg-web"],
+            [3.0, 20250510, "Bandwidth", "westeurope", "rg-app"],
+            [5.0, 20250510, "Virtual Machines", "eastus", "rg-gone"],
+        ]},
+    ]
+
+    result = attribute_to_resources(pages, INVENTORY)
+    resources = _by_name(result)
+    summary = result["summary"]
+
+    # 20 USD of VMs in eastus split over vm-1 and vm-2; vm-3 only gets the westeurope bandwidth
+    assert resources["vm-1"]["costUSD"] == 10.0
+    assert resources["vm-1"]["estimatedCarbonKg"] == pytest.approx(10.0 * 0.45 * 0.45, abs=1e-4)
+    assert resources["vm-3"]["costUSD"] == 3.0
+    assert resources["st-1"]["costUSD"] == 6.0
+    # No web plan in centralus: falls back to the group and type
+    assert resources["plan-1"]["costUSD"] == 4.0
+    assert summary["unattributedCostUSD"] == 5.0
+    assert summary["attributedCostUSD"] == 33.0
+    assert summary["costRows"] == 6
+    assert summary["costUSDByMatch"] == {"groupLocationType": 26.0, "groupType": 4.0,
+                                         "groupLocation": 3.0, "group": 0.0}
+    assert result["resources"][0]["name"] in ("vm-1", "vm-2")
+
+
+def test_rows_without_resource_groups_stay_unattributed():
+    attributor = ResourceAttributor(INVENTORY)
+    attributor.add_page(["CostUSD", "ServiceName"], [[2.0, "Virtual Machines"]])
+
+    result = attributor.results()
+
+    assert result["resources"] == []
+    assert result["summary"]["unattributedCostUSD"] == 2.0
+
+
+def test_join_scales_linearly_with_inventory_and_rows():
+    inventory = [_resource(f"vm-{i}", "Microsoft.Compute/virtualMachines", f"rg-{i % 1000}", "eastus")
+                 for i in range(100_000)]
+    rows = [[1.0, 20250510, "Virtual Machines", "US East", f"rg-{i % 1000}"] for i in range(200_000)]
+
+    started = time.perf_counter()
+    result = attribute_to_resources([{"columns": COLUMNS, "rows": rows}], inventory)
+    elapsed = time.perf_counter() - started
+
+    assert result["summary"]["attributedResources"] == 100_000
+    assert result["summary"]["attributedCostUSD"] == pytest.approx(200_000.0)
+    assert elapsed < 10
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Tests for Resource Graph $skipToken paging and sharded inventory queries
+"""
+
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from azure_carbon_extractor import AzureCarbonExtractor, CARBON_RESOURCE_GRAPH_TYPES
+
+
+class FakeResponse:
+    def __init__(self, payload, status_code=200):
+        self.payload = payload
+        self.status_code = status_code
+        self.text = str(payload)
+
+    def json(self):
+        return self.payload
+
+
+class GraphHttp:
+    """Pages `total` resources per shard in pages of `$top`"""
+
+    def __init__(self, total):
+        self.total = total
+        self.bodies = []
+        self.lock = threading.Lock()
+
+    def post(self, url, json=None, **kwargs):
+        with self.lock:
+            self.bodies.append(json)
+        options = json["options"]
+        offset = int(options.get("$skipToken") or 0)
+        top = options["$top"]
+        rows = [{"id": f"r{i}", "type": "x"} for i in range(offset, min(offset + top, self.total))]
+        payload = {"data": rows}
+        if offset + top < self.total:
+            payload["$skipToken"] = str(offset + top)
+        return FakeResponse(payload)
+
+
+def _extractor(http):
+    extractor = AzureCarbonExtractor(subscription_id="sub", http=http)
+    extractor.token = "token"
+    return extractor
+
+
+def test_follows_skip_token_past_first_page():
+    http = GraphHttp(total=2500)
+    resources = _extractor(http).get_resource_data()
+
+    assert len(resources) == 2500
+    assert len(http.bodies) == 3
+    assert "limit" not in http.bodies[0]["query"]
+
+
+def test_type_shards_are_merged():
+    http = GraphHttp(total=10)
+    resources = _extractor(http).get_resource_data(shard_by="type")
+
+    assert len(resources) == 10 * len(CARBON_RESOURCE_GRAPH_TYPES)
+    assert len(http.bodies) == len(CARBON_RESOURCE_GRAPH_TYPES)
+
+
+def test_subscription_shards_batch_subscriptions():
+    http = GraphHttp(total=5)
+    extractor = _extractor(http)
+    extractor.resource_subscription_batch = 2
+
+    resources = extractor.get_resource_data(subscriptions=["a", "b", "c", "d", "e"], shard_by="subscription")
+
+    assert len(resources) == 15
+    assert sorted(len(body["subscriptions"]) for body in http.bodies) == [1, 2, 2]
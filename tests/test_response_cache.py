@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Tests for the on-disk ARM response cache and replay mode
+"""
+
+import io
+import os
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from http_session import ArmSession
+from response_cache import ResponseCache
+
+SUBSCRIPTION = "00000000-0000-0000-0000-000000000001"
+COST_URL = f"https://management.azure.com/subscriptions/{SUBSCRIPTION}/providers/Microsoft.CostManagement/query?api-version=2023-11-01"
+ADVISOR_URL = f"https://management.azure.com/subscriptions/{SUBSCRIPTION}/providers/Microsoft.Advisor/recommendations?api-version=2020-01-01"
+
+
+def _response(status=200, body='{"value": []}'):
+    response = requests.Response()
+    response.status_code = status
+    response._content = body.encode()
+    response.raw = io.BytesIO(b"")
+    return response
+
+
+def _counting_session(monkeypatch, cache):
+    session = ArmSession(cache=cache)
+    calls = []
+
+    def send(method, url, **kwargs):
+        calls.append((method, url))
+        return _response(body=f'{{"call": {len(calls)}}}')
+
+    monkeypatch.setattr(session.session, "request", send)
+    return session, calls
+
+
+def test_repeated_requests_are_served_from_cache(tmp_path, monkeypatch):
+    session, calls = _counting_session(monkeypatch, ResponseCache(str(tmp_path)))
+
+    first = session.post(COST_URL, json={"timeframe": "Custom"})
+    second = session.post(COST_URL, json={"timeframe": "Custom"})
+    other_body = session.post(COST_URL, json={"timeframe": "MonthToDate"})
+
+    assert first.json() == second.json() == {"call": 1}
+    assert getattr(second, "from_cache", False)
+    assert other_body.json() == {"call": 2}
+    assert len(calls) == 2
+
+
+def test_expired_entries_are_refetched(tmp_path, monkeypatch):
+    cache = ResponseCache(str(tmp_path), ttls=[("microsoft.advisor/", 0)])
+    session, calls = _counting_session(monkeypatch, cache)
+
+    session.get(ADVISOR_URL)
+    time.sleep(0.01)
+    session.get(ADVISOR_URL)
+
+    assert len(calls) == 2
+
+
+def test_writes_and_errors_are_not_cached(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    cache.store("PUT", COST_URL, {}, _response())
+    cache.store("GET", ADVISOR_URL, None, _response(status=500))
+
+    assert cache.lookup("PUT", COST_URL, {}) is None
+    assert cache.lookup("GET", ADVISOR_URL) is None
+
+
+def test_operation_status_polls_are_not_cached(tmp_path, monkeypatch):
+    session, calls = _counting_session(monkeypatch, ResponseCache(str(tmp_path)))
+    status_urls = [
+        f"https://management.azure.com/subscriptions/{SUBSCRIPTION}/providers/Microsoft.Carbon/operations/op-1",
+        f"https://management.azure.com/subscriptions/{SUBSCRIPTION}/providers/Microsoft.CostManagement"
+        f"/operationResults/op-2?api-version=2023-11-01"
+    ]
+
+    for url in status_urls:
+        session.get(url)
+        session.get(url)
+
+    assert len(calls) == 4
+
+
+def test_lru_eviction_keeps_cache_under_limit(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_bytes=4000)
+    body = '{"value": "' + "x" * 900 + '"}'
+    for i in range(10):
+        cache.store("GET", f"{ADVISOR_URL}&page={i}", None, _response(body=body))
+
+    assert cache.total_bytes <= 4000
+    assert cache.stats["evictions"] > 0
+    assert cache.lookup("GET", f"{ADVISOR_URL}&page=9") is not None
+    assert cache.lookup("GET", f"{ADVISOR_URL}&page=0") is None
+
+
+def test_replay_never_touches_the_network(tmp_path, monkeypatch):
+    recorder, _ = _counting_session(monkeypatch, ResponseCache(str(tmp_path)))
+    recorder.post(COST_URL, json={"timePeriod": "yesterday"})
+
+    replayer, calls = _counting_session(monkeypatch, ResponseCache(str(tmp_path), replay=True))
+    assert replayer.replay
+
+    # A different body (e.g. a later day's time period) falls back to the latest response for the URL
+    assert replayer.post(COST_URL, json={"timePeriod": "today"}).json() == {"call": 1}
+    assert replayer.get(ADVISOR_URL).status_code == 404
+    assert calls == []
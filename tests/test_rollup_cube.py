@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Tests for the rollup cube of cost and carbon
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import estimation
+import rollup_cube
+from arm_standin import DEFAULT_SUBSCRIPTION, ArmStandIn
+from azure_carbon_extractor import AzureCarbonExtractor
+from http_session import ArmSession
+from rollup_cube import RollupCube, page_cells
+
+COLUMNS = ["CostUSD", "UsageDate", "ServiceName", "ResourceLocation", "ResourceGroupName"]
+
+ROWS = [
+    [10.0, 20250510, "Virtual Machines", "US East", "rg-a"],
+    [5.0, 20250510, "Virtual Machines", "eastus", "rg-b"],
+    [2.0, 20250511, "Storage", "westeurope", "rg-a"],
+    [1.0, 20250511, "Storage", "westeurope", "rg-a"],
+    [4.0, 20250512, "Storage", "eastus", "rg-b"],
+]
+
+
+def _cube(rows=ROWS, subscription_id="sub-1"):
+    cube = RollupCube()
+    cube.add_page(COLUMNS, rows, subscription_id)
+    return cube
+
+
+def test_numpy_and_fallback_cells_agree(monkeypatch):
+    vectorised = sorted(page_cells(COLUMNS, ROWS))
+    monkeypatch.setattr(rollup_cube, "HAVE_NUMPY", False)
+    monkeypatch.setattr(estimation, "HAVE_NUMPY", False)
+    fallback = sorted(page_cells(COLUMNS, ROWS))
+
+    assert [cell[:4] + cell[6:] for cell in vectorised] == [cell[:4] + cell[6:] for cell in fallback]
+    assert [cell[4:6] for cell in vectorised] == [pytest.approx(cell[4:6]) for cell in fallback]
+    assert len(vectorised) == 4
+
+
+def test_rollup_and_drill_down():
+    cube = _cube()
+    cube.merge(_cube([[3.0, 20250512, "Storage", "eastus", "rg-c"]], "sub-2"))
+
+    by_service = cube.rollup("serviceName")
+    assert by_service[("Virtual Machines",)]["costUSD"] == 15.0
+    assert by_service[("Storage",)]["rows"] == 4
+
+    eastus = cube.rollup("resourceGroup", location="eastus")
+    assert {group: totals["costUSD"] for (group,), totals in eastus.items()} == \
+        {"rg-a": 10.0, "rg-b": 9.0, "rg-c": 3.0}
+    assert cube.totals(subscriptionId="sub-2")["costUSD"] == 3.0
+    assert cube.totals()["costUSD"] == 25.0
+
+    with pytest.raises(ValueError):
+        cube.rollup("meterCategory")
+
+
+def test_where_filters_are_validated(capsys):
+    assert rollup_cube.parse_filter("location=east=us") == ("location", "east=us")
+    for value in ("location", "=eastus"):
+        with pytest.raises(argparse.ArgumentTypeError, match="DIMENSION=VALUE expected"):
+            rollup_cube.parse_filter(value)
+
+    rollup_cube.print_rollup(_cube(), "resourceGroup", [rollup_cube.parse_filter("location=eastus")])
+    assert "rg-a" in capsys.readouterr().out
+
+
+def test_cli_rolls_up_the_cube_extraction_saved(tmp_path):
+    main_py = os.path.join(os.path.dirname(__file__), '..', 'main.py')
+    os.makedirs(tmp_path / "output")
+    os.makedirs(tmp_path / "work")
+    _cube().save(str(tmp_path / "output" / "azure_carbon_cube.json"))
+
+    # Extraction writes to ../output relative to the working directory
+    result = subprocess.run([sys.executable, main_py, "--rollup", "serviceName"], cwd=str(tmp_path / "work"),
+                            capture_output=True, text=True)
+
+    assert result.returncode == 0, result.stdout
+    assert "Virtual Machines" in result.stdout
+
+
+def test_incremental_update_replaces_only_the_requeried_dates():
+    cube = _cube()
+    cube.drop_since("2025-05-11", "sub-1")
+    cube.merge(_cube([[2.5, 20250511, "Storage", "westeurope", "rg-a"]]))
+
+    assert sorted(date for (date,) in cube.rollup("date")) == ["2025-05-10", "2025-05-11"]
+    assert cube.totals()["costUSD"] == 17.5
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "cube.json")
+    cube = _cube()
+    cube.save(path)
+
+    assert RollupCube.load(path).cells == cube.cells
+    assert RollupCube.load(str(tmp_path / "missing.json")).cells == {}
+
+    with open(path, "w") as f:
+        json.dump({"version": 0, "cells": []}, f)
+    assert RollupCube.load(path).cells == {}
+
+
+def test_extraction_persists_a_cube_matching_the_summary(tmp_path):
+    with ArmStandIn(rows_per_day=20, page_size=200, resources=10) as standin:
+        extractor = AzureCarbonExtractor(subscription_id=DEFAULT_SUBSCRIPTION, http=ArmSession(max_retries=3))
+        extractor.configure(base_url=standin.url, output_file=str(tmp_path / "out.json"),
+                            csv_file=str(tmp_path / "out.csv"))
+        extractor._cost_period = lambda: (datetime(2025, 5, 1), datetime(2025, 5, 10))
+        assert extractor.run_extraction()
+
+    with open(extractor.output_file) as f:
+        summary = json.load(f)["summary"]
+    cube = RollupCube.load(str(tmp_path / "azure_carbon_cube.json"))
+
+    assert cube.totals()["rows"] == 10 * 20
+    assert cube.totals()["costUSD"] == pytest.approx(summary["totalCostUSD"])
+    assert cube.totals(subscriptionId=DEFAULT_SUBSCRIPTION)["estimatedCarbonKg"] == \
+        pytest.approx(summary["totalEstimatedCarbonKg"])
+    assert set(summary["rollups"]["serviceName"]) == {service for (service,) in cube.rollup("serviceName")}
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Startup budget: the CLI must come up without spawning `az` or importing the Azure SDK
+"""
+
+import os
+import subprocess
+import sys
+
+REPO_ROOT = os.path.join(os.path.dirname(__file__), '..')
+
+SDK_MODULES = ("azure.identity", "azure.storage", "azure.core")
+
+
+def _loaded_modules(code):
+    """Run code in a fresh interpreter and return the modules it ended up importing"""
+    script = code + "\nimport sys\nprint('\\n'.join(sorted(sys.modules)))"
+    result = subprocess.run([sys.executable, "-c", script], cwd=REPO_ROOT,
+                            capture_output=True, text=True, check=True)
+    return set(result.stdout.split())
+
+
+def test_status_imports_neither_azure_nor_numpy():
+    modules = _loaded_modules(
+        "import sys; sys.argv = ['main.py', '--status']\n"
+        "import runpy; runpy.run_path('main.py', run_name='__main__')"
+    )
+
+    loaded = [m for m in modules if m == "azure" or m.startswith("azure.") or m == "numpy"]
+    assert loaded == []
+
+
+def test_extraction_modules_import_without_azure_sdk():
+    modules = _loaded_modules(
+        "import sys; sys.path.insert(0, 'src')\n"
+        "import azure_carbon_extractor, carbon_api_client, multi_subscription, direct_upload, upload_to_storage"
+    )
+
+    loaded = [m for m in modules if m.startswith(SDK_MODULES)]
+    assert loaded == []
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Tests for the streaming extraction (pages -> estimation -> CSV/NDJSON writers)
+"""
+
+import csv
+import json
+import os
+import sys
+import tracemalloc
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from arm_standin import DEFAULT_SUBSCRIPTION, ArmStandIn
+from azure_carbon_extractor import AzureCarbonExtractor
+from http_session import ArmSession
+from streaming_export import StreamingExport
+
+
+def _estimate(date, cost, carbon):
+    return {"date": date, "serviceName": "Storage", "location": "eastus", "costUSD": cost,
+            "estimatedCarbonKg": carbon, "carbonIntensityFactor": 0.15, "regionalFactor": 0.45}
+
+
+def test_writes_pages_incrementally_and_keeps_totals(tmp_path):
+    csv_path, ndjson_path = str(tmp_path / "e.csv"), str(tmp_path / "e.ndjson")
+
+    with StreamingExport(csv_path, ndjson_path) as export:
+        export.write([_estimate("2025-05-02", 2.0, 0.5), _estimate("2025-05-01", 1.0, 0.25)])
+        export.write([])
+        export.write([_estimate("2025-05-03", 4.0, 1.0)])
+
+    with open(csv_path) as f:
+        assert [row["date"] for row in csv.DictReader(f)] == ["2025-05-02", "2025-05-01", "2025-05-03"]
+    with open(ndjson_path) as f:
+        assert json.loads(f.readlines()[-1])["costUSD"] == 4.0
+    assert export.totals == {"totalEstimatedCarbonKg": 1.75, "totalCostUSD": 7.0, "dataPointCount": 3,
+                             "pageCount": 2, "firstDate": "2025-05-01", "lastDate": "2025-05-03"}
+
+
+def test_failed_stream_keeps_the_previous_output(tmp_path):
+    csv_path, ndjson_path = str(tmp_path / "e.csv"), str(tmp_path / "e.ndjson")
+    with open(csv_path, "w") as f:
+        f.write("previous\n")
+
+    with pytest.raises(RuntimeError):
+        with StreamingExport(csv_path, ndjson_path) as export:
+            export.write([_estimate("2025-05-01", 1.0, 0.25)])
+            raise RuntimeError("page 2 failed")
+
+    with open(csv_path) as f:
+        assert f.read() == "previous\n"
+    assert sorted(os.listdir(tmp_path)) == ["e.csv"]
+
+
+def _run_streaming(tmp_path, rows_per_day):
+    with ArmStandIn(rows_per_day=rows_per_day, page_size=500, resources=20) as standin:
+        extractor = AzureCarbonExtractor(subscription_id=DEFAULT_SUBSCRIPTION, http=ArmSession(max_retries=3))
+        extractor.configure(base_url=standin.url, streaming=True, output_file=str(tmp_path / "out.json"),
+                            csv_file=str(tmp_path / "out.csv"))
+        extractor._cost_period = lambda: (datetime(2025, 5, 1), datetime(2025, 5, 30))
+
+        tracemalloc.start()
+        assert extractor.run_extraction()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return extractor, peak
+
+
+def test_streaming_extraction_matches_batch_totals_with_flat_memory(tmp_path):
+    small, small_peak = _run_streaming(tmp_path, 100)
+    large, large_peak = _run_streaming(tmp_path, 500)
+
+    with open(large.output_file) as f:
+        exported = json.load(f)
+    with open(tmp_path / "out.ndjson") as f:
+        estimates = [json.loads(line) for line in f]
+
+    assert exported["metadata"]["streaming"] is True
+    assert "carbonEstimates" not in exported
+    assert exported["summary"]["dataPointCount"] == len(estimates) == 30 * 500
+    assert exported["summary"]["totalCostUSD"] == pytest.approx(sum(e["costUSD"] for e in estimates))
+    assert exported["resourceEstimates"]
+    # 5x the rows, roughly the same peak: only one page is in memory at a time
+    assert large_peak < small_peak * 2